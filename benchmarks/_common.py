@@ -0,0 +1,142 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks are run from the repository root, e.g. ``python benchmarks/bench_rowlstm.py``.
+"""
+import ctypes
+import gc
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+import traceback
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def time_fn(fn, warmup=2, iters=10):
+    """Median wall time of ``fn()`` in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iters):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident set size in MB."""
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def rss_mb():
+    """Current resident set size in MB (the high-water mark where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+
+def _reset_peak_rss():
+    """Reset the RSS high-water mark to the current RSS (Linux only); False where unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _hwm_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return peak_rss_mb()
+
+
+def _release_memory():
+    # Collect garbage and hand freed heap pages back to the OS, so the baseline is only what is live.
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def step_memory_mb(step, device, warmup=0):
+    """Peak memory growth in MB while running ``step()`` once.
+
+    ``warmup`` steps run first, so one-off costs such as lazy imports and
+    allocator caches are not counted. Uses the CUDA allocator's peak on GPUs
+    and the process RSS high-water mark on CPU. Where that mark cannot be
+    reset (outside Linux) call it with ``warmup=0`` before anything else
+    large has run.
+    """
+    import torch
+
+    for _ in range(warmup):
+        step()
+    _release_memory()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+        baseline = torch.cuda.memory_allocated()
+        step()
+        torch.cuda.synchronize()
+        return (torch.cuda.max_memory_allocated() - baseline) / 2**20
+    if _reset_peak_rss():
+        baseline = rss_mb()
+        step()
+        return _hwm_mb() - baseline
+    baseline = peak_rss_mb()
+    step()
+    return peak_rss_mb() - baseline
+
+
+def _call(conn, fn, args):
+    try:
+        conn.send((True, fn(*args)))
+    except BaseException:
+        conn.send((False, traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def run_isolated(fn, *args):
+    """Run ``fn(*args)`` in a fresh process and return its result.
+
+    Peak RSS only ever grows within a process, so memory measurements that
+    should not see each other's high-water marks each get their own process.
+    ``fn`` must be a module-level function. The process is not a daemon, so
+    ``fn`` may start DataLoader workers.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_call, args=(sender, fn, args))
+    process.start()
+    sender.close()
+    try:
+        ok, value = receiver.recv()
+    except EOFError:
+        ok, value = False, f"process exited with code {process.join() or process.exitcode}"
+    process.join()
+    if not ok:
+        raise RuntimeError(f"{fn.__name__} failed in an isolated process:\n{value}")
+    return value
+
+
+def print_table(headers, rows):
+    """Print rows as a Markdown table so results can be pasted into PRs."""
+    print("| " + " | ".join(headers) + " |")
+    print("|" + "|".join("---" for _ in headers) + "|")
+    for row in rows:
+        print("| " + " | ".join(str(v) for v in row) + " |")
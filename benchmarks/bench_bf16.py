@@ -0,0 +1,123 @@
+"""fp32 vs. bfloat16 autocast: throughput and reconstruction quality.
+
+    python benchmarks/bench_bf16.py [--model unet|pixelrnn] [--checkpoint PATH]
+        [--data-root dataset_A2] [--num-images 32] [--vgg-weights PATH]
+
+Runs the same checkpoint (random weights if none is given or found) with and
+without ``torch.autocast(dtype=torch.bfloat16)`` and prints inference and
+training-step throughput, then MSE/PSNR of each mode against the original
+images and of the bf16 output against the fp32 output. Images come from
+``<data-root>/train``; without a dataset, random smooth images occluded by
+BatchOccluder stand in. The training step includes PerceptualLoss when VGG16
+weights are available (``--vgg-weights`` or a cached torchvision download).
+"""
+import argparse
+import os
+
+import _common
+import torch
+import torch.nn.functional as F
+
+from pixelrnn_core.datasets import OccludedDataset
+from pixelrnn_core.loading import MODEL_SPECS, load_model
+from pixelrnn_core.losses import PerceptualLoss
+from pixelrnn_core.occlusion import BatchOccluder
+from pixelrnn_core.quality import mse, psnr
+
+
+def _images(data_root, num_images, image_size):
+    """(masked, original) float batches of ``num_images`` from the dataset or synthetic."""
+    if os.path.isdir(os.path.join(data_root, "train")):
+        dataset = OccludedDataset(data_root, "train", image_size)
+        pairs = [dataset[i] for i in range(min(num_images, len(dataset)))]
+        return torch.stack([p[0] for p in pairs]), torch.stack([p[1] for p in pairs])
+    print(f"{data_root}/train not found, using synthetic images")
+    generator = torch.Generator().manual_seed(0)
+    coarse = torch.rand(num_images, 3, image_size // 8, image_size // 8, generator=generator)
+    original = F.interpolate(coarse, size=image_size, mode="bilinear", align_corners=False)
+    masked, _ = BatchOccluder(seed=0)(original)
+    return masked, original
+
+
+def _perceptual_loss(weights_path):
+    try:
+        return PerceptualLoss(weights_path)
+    except Exception as e:  # no local weights and no network
+        print(f"PerceptualLoss unavailable ({e}); training step uses the pixel loss only")
+        return None
+
+
+def _run(model, masked, batch_size, bf16):
+    outputs = []
+    with torch.no_grad(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=bf16):
+        for batch in masked.split(batch_size):
+            outputs.append(model(batch).clamp(0, 1))
+    return torch.cat(outputs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", choices=sorted(MODEL_SPECS), default="unet")
+    parser.add_argument("--checkpoint", default=None, help="Defaults to the model's pixelrnn_best_model.pth.")
+    parser.add_argument("--data-root", default="dataset_A2")
+    parser.add_argument("--num-images", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--vgg-weights", default=None)
+    parser.add_argument("--iters", type=int, default=5)
+    args = parser.parse_args()
+
+    spec = MODEL_SPECS[args.model]
+    checkpoint = args.checkpoint or os.path.join(_common.ROOT, spec["checkpoint"])
+    if not os.path.exists(checkpoint):
+        print(f"{checkpoint} not found, using random weights")
+        checkpoint = None
+    torch.manual_seed(0)
+    model, _ = load_model(args.model, checkpoint)
+    masked, original = _images(args.data_root, args.num_images, spec["image_size"])
+    perceptual = _perceptual_loss(args.vgg_weights)
+
+    x, target = masked[:args.batch_size], original[:args.batch_size]
+    params = [p for p in model.parameters() if p.requires_grad]
+
+    def train_step(bf16):
+        model.zero_grad(set_to_none=True)
+        with torch.autocast("cpu", dtype=torch.bfloat16, enabled=bf16):
+            output = model(x)
+            loss = F.mse_loss(output, target)
+            if perceptual is not None:
+                loss = loss + 0.1 * perceptual(output, target)
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(params, 1.0)
+
+    speed_rows = []
+    for name, bf16 in (("fp32", False), ("bf16", True)):
+        model.eval()
+        infer_ms = _common.time_fn(lambda: _run(model, x, args.batch_size, bf16), iters=args.iters)
+        model.train()
+        step_ms = _common.time_fn(lambda: train_step(bf16), iters=args.iters)
+        speed_rows.append([name, f"{infer_ms:.1f}", f"{1000 * len(x) / infer_ms:.1f}",
+                           f"{step_ms:.1f}", f"{1000 * len(x) / step_ms:.1f}"])
+    for row in speed_rows[1:]:
+        row.append(f"{float(speed_rows[0][1]) / float(row[1]):.2f}x / {float(speed_rows[0][3]) / float(row[3]):.2f}x")
+    speed_rows[0].append("1.00x / 1.00x")
+
+    model.eval()
+    fp32_out = _run(model, masked, args.batch_size, bf16=False)
+    bf16_out = _run(model, masked, args.batch_size, bf16=True)
+    quality_rows = [
+        ["fp32 vs original", f"{mse(fp32_out, original).mean():.6f}", f"{psnr(fp32_out, original).mean():.2f}"],
+        ["bf16 vs original", f"{mse(bf16_out, original).mean():.6f}", f"{psnr(bf16_out, original).mean():.2f}"],
+        ["bf16 vs fp32", f"{mse(bf16_out, fp32_out).mean():.2e}", f"{psnr(bf16_out, fp32_out).mean():.2f}"],
+    ]
+
+    print(f"\nmodel={args.model}, checkpoint={checkpoint or 'random'}, batch={args.batch_size}, "
+          f"images={len(masked)}, threads={torch.get_num_threads()}")
+    print("\nThroughput")
+    _common.print_table(["mode", "inference ms/batch", "inference img/s", "train step ms", "train img/s",
+                         "speedup (infer / train)"], speed_rows)
+    print(f"\nReconstruction quality over {len(masked)} images")
+    _common.print_table(["comparison", "MSE", "PSNR dB"], quality_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Data-parallel training throughput on CPU (gloo) for 1, 2, 4 and 8 local processes.
+
+    python benchmarks/bench_ddp.py [--models unet pixelrnn] [--processes 1 2 4 8] [--batch-size 4]
+
+Each row starts that many processes on this machine the way torchrun
+would (RANK/WORLD_SIZE/LOCAL_WORLD_SIZE plus a local rendezvous), joins
+them through ``pixelrnn_core.distributed.init_distributed``, and trains the
+model wrapped in DistributedDataParallel on synthetic data: forward, MSE
+loss, backward with the gradient all-reduce, and an Adam step. Every process
+runs ``--batch-size`` images per step, as in the training scripts, with the
+cores split evenly between processes. Reports images/sec over all
+processes, the speedup over one process and the scaling efficiency.
+"""
+import argparse
+import os
+import socket
+import time
+
+import _common
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _worker(rank, world_size, port, kind, image_size, batch_size, warmup, steps, results):
+    os.environ.update(RANK=str(rank), LOCAL_RANK=str(rank), WORLD_SIZE=str(world_size),
+                      LOCAL_WORLD_SIZE=str(world_size), MASTER_ADDR="127.0.0.1", MASTER_PORT=str(port))
+    import torch
+    import torch.nn.functional as F
+    from torch.nn.parallel import DistributedDataParallel
+
+    from pixelrnn_core.distributed import barrier, cleanup, init_distributed
+    from pixelrnn_core.loading import build_model
+
+    init_distributed()
+    torch.manual_seed(rank)
+    model = build_model(kind).train()
+    train_model = DistributedDataParallel(model) if world_size > 1 else model
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+    x = torch.rand(batch_size, 3, image_size, image_size)
+    target = torch.rand(batch_size, 3, image_size, image_size)
+
+    def step():
+        optimizer.zero_grad(set_to_none=True)
+        F.mse_loss(train_model(x), target).backward()
+        optimizer.step()
+
+    for _ in range(warmup):
+        step()
+    barrier()
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    barrier()
+    if rank == 0:
+        results.put((time.perf_counter() - start, torch.get_num_threads()))
+    cleanup()
+
+
+def _measure(kind, processes, image_size, batch_size, warmup, steps):
+    import torch.multiprocessing as mp
+
+    results = mp.get_context("spawn").SimpleQueue()
+    mp.spawn(_worker, args=(processes, _free_port(), kind, image_size, batch_size, warmup, steps, results),
+             nprocs=processes)
+    seconds, threads = results.get()
+    return processes * batch_size * steps / seconds, threads
+
+
+def main():
+    from pixelrnn_core.loading import MODEL_SPECS
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", choices=sorted(MODEL_SPECS), default=["pixelrnn", "unet"])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--image-size", type=int, default=None, help="Defaults to each model's IMAGE_SIZE.")
+    parser.add_argument("--batch-size", type=int, default=4, help="Images per process per step.")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--steps", type=int, default=10)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    rows = []
+    for kind in args.models:
+        image_size = args.image_size or MODEL_SPECS[kind]["image_size"]
+        base = None
+        for processes in args.processes:
+            if processes > cores:
+                print(f"Note: {processes} processes on {cores} cores; they share cores, so expect no speedup.")
+            img_s, threads = _measure(kind, processes, image_size, args.batch_size, args.warmup, args.steps)
+            base = base or img_s / processes
+            rows.append((kind, image_size, processes, threads, f"{img_s:.1f}", f"{img_s / base:.2f}x",
+                         f"{100 * img_s / (base * processes):.0f}%"))
+            print(f"{kind} {processes} processes: {img_s:.1f} img/s", flush=True)
+
+    _common.print_table(["model", "image size", "processes", "threads/process", "img/s", "speedup",
+                         "efficiency"], rows)
+
+
+if __name__ == "__main__":
+    main()
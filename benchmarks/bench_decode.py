@@ -0,0 +1,85 @@
+"""Decode time and peak memory of large uploads: full decode vs. pixelrnn_core.image_io.
+
+    python benchmarks/bench_decode.py [--megapixels 12 50] [--formats jpg png]
+
+Writes a synthetic photo-like image of each size and format to a temporary
+directory, then decodes it in a fresh process per variant:
+
+- full: ``Image.open(...).convert("RGB")`` then resize to 128x128 (the old path),
+- model 128: ``image_io.load_resized`` to 128x128 (datasets, batch_infer, server),
+- preview 350: ``image_io.decode(min_size=(350, 350))`` (the apps' default path),
+- full res: ``image_io.decode()`` capped at MAX_PIXELS (tiled / ROI mode).
+
+Reports median decode time, RSS growth over the first decode and PSNR of the
+128x128 result against the old path.
+"""
+import argparse
+import os
+import tempfile
+
+import _common
+import numpy as np
+from PIL import Image
+
+VARIANTS = ("full", "model 128", "preview 350", "full res")
+
+
+def _write(path, megapixels):
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    coarse = np.random.default_rng(0).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    Image.fromarray(coarse).resize((width, height), Image.BICUBIC).save(path, quality=90)
+    return width, height
+
+
+def _measure(variant, path, iters):
+    import torch
+
+    from pixelrnn_core import image_io
+
+    def run():
+        if variant == "full":
+            with Image.open(path) as img:
+                return img.convert("RGB").resize((128, 128), Image.BILINEAR)
+        if variant == "model 128":
+            return image_io.load_resized(path, (128, 128))[0]
+        if variant == "preview 350":
+            return image_io.decode(path, min_size=(350, 350))[0].resize((128, 128), Image.BILINEAR)
+        return image_io.decode(path)[0].resize((128, 128), Image.BILINEAR)
+
+    result = []
+    peak = _common.step_memory_mb(lambda: result.append(run()), torch.device("cpu"))
+    ms = _common.time_fn(run, warmup=0, iters=iters)
+    return ms, peak, np.asarray(result[0])
+
+
+def _psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[12, 50])
+    parser.add_argument("--formats", nargs="+", choices=["jpg", "png"], default=["jpg", "png"])
+    parser.add_argument("--iters", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for megapixels in args.megapixels:
+            for fmt in args.formats:
+                path = os.path.join(tmp, f"{megapixels:g}mp.{fmt}")
+                width, height = _write(path, megapixels)
+                reference = None
+                for variant in VARIANTS:
+                    ms, peak, pixels = _common.run_isolated(_measure, variant, path, args.iters)
+                    reference = pixels if reference is None else reference
+                    rows.append((f"{width}x{height}", fmt, f"{os.path.getsize(path) / 2**20:.1f}", variant,
+                                 f"{ms:.0f}", f"{peak:.0f}", f"{_psnr(pixels, reference):.1f}"))
+
+    _common.print_table(["image", "format", "file MB", "decode", "ms", "peak RSS MB", "PSNR vs full dB"], rows)
+
+
+if __name__ == "__main__":
+    main()
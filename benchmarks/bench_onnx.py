@@ -0,0 +1,70 @@
+"""Eager PyTorch vs. ONNX Runtime: parity and latency for both models.
+
+    python benchmarks/bench_onnx.py [--models unet pixelrnn] [--batch-sizes 1 4 8]
+
+Each model is loaded from its pixelrnn_best_model.pth (random weights if the
+checkpoint is missing), exported to a temporary ONNX file with
+pixelrnn_core.onnx_export, and both backends are run on the same random
+batches. Prints load time, max |diff| and median latency per batch size. The
+script exits non-zero if any output differs by more than --atol.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import _common
+import torch
+
+from pixelrnn_core.backends import OnnxBackend, TorchBackend
+from pixelrnn_core.loading import MODEL_SPECS, load_model
+from pixelrnn_core.onnx_export import export_onnx
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", choices=sorted(MODEL_SPECS), default=sorted(MODEL_SPECS))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--iters", type=int, default=10)
+    parser.add_argument("--atol", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    rows, ok = [], True
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.models:
+            spec = MODEL_SPECS[kind]
+            checkpoint = os.path.join(_common.ROOT, spec["checkpoint"])
+            if not os.path.exists(checkpoint):
+                checkpoint = None
+            torch.manual_seed(0)
+            start = time.perf_counter()
+            model, _ = load_model(kind, checkpoint)
+            torch_load_ms = (time.perf_counter() - start) * 1000
+            path = export_onnx(model, os.path.join(tmp, f"{kind}.onnx"), spec["image_size"])
+
+            start = time.perf_counter()
+            backends = {"torch": TorchBackend(model), "onnx": OnnxBackend(path)}
+            onnx_load_ms = (time.perf_counter() - start) * 1000
+
+            for batch_size in args.batch_sizes:
+                S = spec["image_size"]
+                x = torch.rand(batch_size, 3, S, S, generator=torch.Generator().manual_seed(batch_size))
+                diff = (backends["torch"](x) - backends["onnx"](x)).abs().max().item()
+                ok &= diff <= args.atol
+                torch_ms = _common.time_fn(lambda: backends["torch"](x), iters=args.iters)
+                onnx_ms = _common.time_fn(lambda: backends["onnx"](x), iters=args.iters)
+                rows.append((kind if batch_size == args.batch_sizes[0] else "", batch_size,
+                             f"{torch_ms:.1f}", f"{onnx_ms:.1f}", f"{torch_ms / onnx_ms:.2f}x", f"{diff:.2e}"))
+            print(f"{kind}: checkpoint={checkpoint or 'random'}, torch load {torch_load_ms:.0f} ms "
+                  f"(incl. import), onnx session {onnx_load_ms:.0f} ms")
+
+    print(f"\nthreads={torch.get_num_threads()}")
+    _common.print_table(["model", "batch", "torch ms", "onnx ms", "speedup", "max |diff|"], rows)
+    if not ok:
+        print(f"Parity check FAILED (atol={args.atol})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
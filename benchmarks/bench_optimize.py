@@ -0,0 +1,60 @@
+"""PixelRNNishUNet inference before vs. after optimize_for_inference.
+
+    python benchmarks/bench_optimize.py [--batch-sizes 1 4] [--modes eager compile freeze]
+
+Compares the plain eval-mode U-Net against BN folding + Dropout removal,
+with and without channels-last, and the compiled / frozen variants. For each
+it reports the setup time (including warmup, i.e. what load_model() pays),
+median latency per batch size and max |diff| against the original model.
+"""
+import argparse
+import os
+import time
+
+import _common
+import torch
+
+from pixelrnn_core.loading import MODEL_SPECS, load_model
+from pixelrnn_core.optimize import optimize_for_inference
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--modes", nargs="+", default=["eager", "compile", "freeze"])
+    parser.add_argument("--iters", type=int, default=10)
+    args = parser.parse_args()
+
+    S = MODEL_SPECS["unet"]["image_size"]
+    checkpoint = os.path.join(_common.ROOT, MODEL_SPECS["unet"]["checkpoint"])
+    checkpoint = checkpoint if os.path.exists(checkpoint) else None
+    torch.manual_seed(0)
+    baseline, _ = load_model("unet", checkpoint)
+
+    variants = [("baseline", 0.0, baseline)]
+    settings = [("folded", False, "eager")] + [(f"folded+CL {m}", True, m) for m in args.modes]
+    for name, channels_last, mode in settings:
+        start = time.perf_counter()
+        model = optimize_for_inference(baseline, channels_last, mode, example_shape=(1, 3, S, S))
+        variants.append((name, (time.perf_counter() - start) * 1000, model))
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        x = torch.rand(batch_size, 3, S, S, generator=torch.Generator().manual_seed(batch_size))
+        with torch.no_grad():
+            expected = baseline(x)
+            base_ms = None
+            for name, setup_ms, model in variants:
+                model(x)  # per-shape warmup (compile specialises on the batch size)
+                diff = (model(x) - expected).abs().max().item()
+                ms = _common.time_fn(lambda: model(x), iters=args.iters)
+                base_ms = base_ms or ms
+                rows.append((batch_size, name, f"{setup_ms:.0f}", f"{ms:.1f}", f"{base_ms / ms:.2f}x",
+                             f"{diff:.2e}"))
+
+    print(f"\ncheckpoint={checkpoint or 'random'}, threads={torch.get_num_threads()}")
+    _common.print_table(["batch", "variant", "setup+warmup ms", "latency ms", "speedup", "max |diff|"], rows)
+
+
+if __name__ == "__main__":
+    main()
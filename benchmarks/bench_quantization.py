@@ -0,0 +1,126 @@
+"""int8 vs. fp32 report: checkpoint size, latency and PSNR for both models.
+
+    python benchmarks/bench_quantization.py [--data-root dataset_A2] [--num-images 32]
+
+Quantizes each model's pixelrnn_best_model.pth (random weights if missing)
+with pixelrnn_core.quantization: static int8 for the U-Net, calibrated on
+``--calibration-images`` training inputs, and dynamic int8 for PixelRNN's
+RowLSTM gates. Reports saved checkpoint size, median batch latency and:
+
+- PSNR of the int8 output against the fp32 output on ``occluded_test``
+  (the test set has no ground truth, so this is the quantization error);
+- PSNR against the originals for fp32 and int8 on a training sample, and
+  the drop between them.
+
+Without the dataset, random smooth images occluded by BatchOccluder stand in.
+"""
+import argparse
+import copy
+import os
+import tempfile
+
+import _common
+import torch
+import torch.nn.functional as F
+
+from pixelrnn_core.image_io import load_resized, to_tensor
+from pixelrnn_core.loading import MODEL_SPECS, load_model
+from pixelrnn_core.occlusion import BatchOccluder
+from pixelrnn_core.quality import psnr
+from pixelrnn_core.quantization import quantize_pixelrnn, quantize_unet
+
+
+def _load_images(paths, image_size):
+    return torch.stack([to_tensor(load_resized(p, (image_size, image_size))[0]) for p in paths])
+
+
+def _sample(directory, num_images):
+    """Evenly spaced files from ``directory`` in sorted order (how the datasets pair them)."""
+    names = sorted(os.listdir(directory))
+    step = max(1, len(names) // num_images)
+    return [os.path.join(directory, n) for n in names[::step][:num_images]]
+
+
+def _data(data_root, image_size, num_images):
+    """(test inputs, train inputs, train originals); synthetic if the dataset is missing."""
+    train = os.path.join(data_root, "train")
+    if os.path.isdir(train):
+        return tuple(_load_images(_sample(d, num_images), image_size) for d in (
+            os.path.join(data_root, "occluded_test"),
+            os.path.join(train, "occluded_images"),
+            os.path.join(train, "original_images"),
+        ))
+    print(f"{train} not found, using synthetic images")
+    generator = torch.Generator().manual_seed(0)
+    coarse = torch.rand(2 * num_images, 3, image_size // 8, image_size // 8, generator=generator)
+    original = F.interpolate(coarse, size=image_size, mode="bilinear", align_corners=False)
+    masked, _ = BatchOccluder(seed=0)(original)
+    return masked[:num_images], masked[num_images:], original[num_images:]
+
+
+def _run(model, x, batch_size):
+    with torch.no_grad():
+        return torch.cat([model(b).float().clamp(0, 1) for b in x.split(batch_size)])
+
+
+def _size_mb(model, tmp, name):
+    path = os.path.join(tmp, name)
+    torch.save({"model_state": model.state_dict()}, path)
+    return os.path.getsize(path) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", choices=sorted(MODEL_SPECS), default=sorted(MODEL_SPECS))
+    parser.add_argument("--data-root", default="dataset_A2")
+    parser.add_argument("--num-images", type=int, default=32)
+    parser.add_argument("--calibration-images", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--iters", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.models:
+            spec = MODEL_SPECS[kind]
+            S = spec["image_size"]
+            checkpoint = os.path.join(_common.ROOT, spec["checkpoint"])
+            checkpoint = checkpoint if os.path.exists(checkpoint) else None
+            torch.manual_seed(0)
+            fp32, _ = load_model(kind, checkpoint)
+            int8 = copy.deepcopy(fp32)
+            test, masked, original = _data(args.data_root, S, args.num_images)
+
+            if kind == "unet":
+                calibration = masked
+                if os.path.isdir(os.path.join(args.data_root, "train")):
+                    calibration = _load_images(_sample(os.path.join(args.data_root, "train", "occluded_images"),
+                                                       args.calibration_images), S)
+                int8 = quantize_unet(int8, calibration.split(args.batch_size))
+            else:
+                int8 = quantize_pixelrnn(int8)
+
+            x = test[:args.batch_size]
+            results = {}
+            for name, model in (("fp32", fp32), ("int8", int8)):
+                results[name] = {
+                    "size": _size_mb(model, tmp, f"{kind}-{name}.pth"),
+                    "ms": _common.time_fn(lambda: _run(model, x, args.batch_size), iters=args.iters),
+                    "test": _run(model, test, args.batch_size),
+                    "psnr": psnr(_run(model, masked, args.batch_size), original).mean().item(),
+                }
+            fp, q = results["fp32"], results["int8"]
+            rows.append((kind, checkpoint or "random",
+                         f"{fp['size']:.1f} -> {q['size']:.1f}", f"{fp['size'] / q['size']:.1f}x",
+                         f"{fp['ms']:.1f} -> {q['ms']:.1f}", f"{fp['ms'] / q['ms']:.2f}x",
+                         f"{psnr(q['test'], fp['test']).mean().item():.2f}",
+                         f"{fp['psnr']:.2f} -> {q['psnr']:.2f}", f"{fp['psnr'] - q['psnr']:.3f}"))
+
+    print(f"\nbatch={args.batch_size}, images={args.num_images}, threads={torch.get_num_threads()}, "
+          f"engine={torch.backends.quantized.engine}")
+    _common.print_table(["model", "checkpoint", "size MB", "smaller", "latency ms", "speedup",
+                         "int8 vs fp32 PSNR (test)", "PSNR vs original", "PSNR drop dB"], rows)
+
+
+if __name__ == "__main__":
+    main()
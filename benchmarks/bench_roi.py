@@ -0,0 +1,93 @@
+"""Full-image vs. region-of-interest inference on full-resolution uploads.
+
+    python benchmarks/bench_roi.py [--height 480 --width 640] [--hole-fractions 0.02 0.1 0.3]
+
+For each model and hole size, a synthetic smooth image gets a black
+rectangle covering ``hole_fraction`` of its area. The full path is what the
+apps do by default: resize to IMAGE_SIZE, run the model, resize the output
+back. The ROI paths use pixelrnn_core.roi.reconstruct_roi with the mask
+given and with automatic detection. Reported: median latency, model input
+size, the largest change outside the (1 px dilated) hole, which must be 0
+for ROI, and PSNR against the unoccluded image.
+"""
+import argparse
+import os
+
+import _common
+import torch
+import torch.nn.functional as F
+
+from pixelrnn_core.backends import TorchBackend
+from pixelrnn_core.loading import MODEL_SPECS, load_model
+from pixelrnn_core.quality import psnr
+from pixelrnn_core.roi import _dilate, reconstruct_roi
+
+
+def _image(height, width, hole_fraction, seed=0):
+    """(original, occluded, mask) with a centred hole covering ``hole_fraction`` of the image."""
+    generator = torch.Generator().manual_seed(seed)
+    coarse = torch.rand(1, 3, height // 32, width // 32, generator=generator)
+    original = F.interpolate(coarse, size=(height, width), mode="bilinear", align_corners=False)[0]
+    original = original * 0.8 + 0.1  # keep clear of the black fill
+    h, w = round(height * hole_fraction ** 0.5), round(width * hole_fraction ** 0.5)
+    top, left = (height - h) // 2, (width - w) // 2
+    mask = torch.zeros(1, height, width, dtype=torch.bool)
+    mask[:, top:top + h, left:left + w] = True
+    return original, original.masked_fill(mask, 0.0), mask
+
+
+def _full(model, image, image_size):
+    x = F.interpolate(image[None], size=(image_size, image_size), mode="bilinear", align_corners=False,
+                      antialias=True)
+    y = model(x).float().clamp(0, 1)
+    return F.interpolate(y, size=image.shape[-2:], mode="bilinear", align_corners=False)[0]
+
+
+def _roi(model, image, image_size, mask):
+    output, info = reconstruct_roi(model, image, image_size, mask=mask)
+    return output, info["input_size"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", choices=sorted(MODEL_SPECS), default=sorted(MODEL_SPECS))
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--hole-fractions", type=float, nargs="+", default=[0.02, 0.1, 0.3])
+    parser.add_argument("--iters", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for kind in args.models:
+        spec = MODEL_SPECS[kind]
+        S = spec["image_size"]
+        checkpoint = os.path.join(_common.ROOT, spec["checkpoint"])
+        checkpoint = checkpoint if os.path.exists(checkpoint) else None
+        torch.manual_seed(0)
+        model = TorchBackend(load_model(kind, checkpoint)[0])
+
+        for fraction in args.hole_fractions:
+            original, occluded, mask = _image(args.height, args.width, fraction)
+            replaced = _dilate(mask, 1)  # reconstruct_roi's default dilate=1 also replaces the fill's border
+            variants = (
+                ("full", lambda: (_full(model, occluded, S), (S, S))),
+                ("roi (mask)", lambda: _roi(model, occluded, S, mask)),
+                ("roi (detect)", lambda: _roi(model, occluded, S, None)),
+            )
+            base_ms = None
+            for name, fn in variants:
+                output, input_size = fn()
+                ms = _common.time_fn(fn, iters=args.iters)
+                base_ms = base_ms or ms
+                outside = (output - occluded).abs().masked_fill(replaced, 0).max().item()
+                rows.append((kind, f"{fraction:.0%}", name, "x".join(map(str, input_size)), f"{ms:.1f}",
+                             f"{base_ms / ms:.2f}x", f"{outside:.3f}",
+                             f"{psnr(output[None], original[None]).item():.2f}"))
+
+    print(f"\nimage={args.height}x{args.width}, threads={torch.get_num_threads()}")
+    _common.print_table(["model", "hole", "path", "model input", "latency ms", "speedup",
+                         "max change outside hole", "PSNR dB"], rows)
+
+
+if __name__ == "__main__":
+    main()
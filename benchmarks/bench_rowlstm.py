@@ -0,0 +1,56 @@
+"""RowLSTM engine and fused-cell benchmarks at 64x64 and 128x128.
+
+    python benchmarks/bench_rowlstm.py [--batch-size 4] [--hidden-dim 128]
+
+Prints per-forward latency of the "reference" and "fast" engines, then the
+forward+backward step time of the fast engine with and without FusedLSTMCell.
+The gradient checks of FusedLSTMCell live in tests/test_pixelrnn.py.
+"""
+import argparse
+
+import _common
+import torch
+
+from pixelrnn_core.pixelrnn import RowLSTM
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--hidden-dim", type=int, default=128)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 128])
+    parser.add_argument("--iters", type=int, default=10)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    reference = RowLSTM(args.hidden_dim, args.hidden_dim, engine="reference").eval()
+    fast = RowLSTM(args.hidden_dim, args.hidden_dim, engine="fast").eval()
+    fused = RowLSTM(args.hidden_dim, args.hidden_dim, engine="fast", fused_cell=True)
+    fast.load_state_dict(reference.state_dict())
+    fused.load_state_dict(reference.state_dict())
+
+    forward_rows, step_rows = [], []
+    for size in args.sizes:
+        x = torch.randn(args.batch_size, args.hidden_dim, size, size)
+        with torch.no_grad():
+            max_diff = (reference(x) - fast(x)).abs().max().item()
+            ref_ms = _common.time_fn(lambda: reference(x), iters=args.iters)
+            fast_ms = _common.time_fn(lambda: fast(x), iters=args.iters)
+        forward_rows.append((f"{size}x{size}", f"{ref_ms:.1f}", f"{fast_ms:.1f}",
+                             f"{ref_ms / fast_ms:.2f}x", f"{max_diff:.2e}"))
+
+        x.requires_grad_(True)
+        plain_ms = _common.time_fn(lambda: fast.train()(x).sum().backward(), iters=args.iters)
+        fused_ms = _common.time_fn(lambda: fused.train()(x).sum().backward(), iters=args.iters)
+        step_rows.append((f"{size}x{size}", f"{plain_ms:.1f}", f"{fused_ms:.1f}",
+                          f"{plain_ms / fused_ms:.2f}x"))
+
+    print(f"\nbatch={args.batch_size}, hidden_dim={args.hidden_dim}, threads={torch.get_num_threads()}")
+    print("\nRowLSTM forward")
+    _common.print_table(["size", "reference ms", "fast ms", "speedup", "max |diff|"], forward_rows)
+    print("\nRowLSTM forward+backward (fast engine)")
+    _common.print_table(["size", "unfused ms", "fused cell ms", "speedup"], step_rows)
+
+
+if __name__ == "__main__":
+    main()
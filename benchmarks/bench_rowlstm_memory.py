@@ -0,0 +1,57 @@
+"""Peak memory and step time of PixelRNN training with RowLSTM row-chunk checkpointing.
+
+    python benchmarks/bench_rowlstm_memory.py [--image-size 64] [--batch-size 4] [--chunks 0 32 16 8]
+
+Each setting runs one forward+backward step of PixelRNN(hidden_dim=128,
+n_layers=2) in a fresh process, after two warmup steps, and reports the RSS
+growth over the step (or peak CUDA memory when a GPU is available). Chunk 0 stores every row.
+"""
+import argparse
+
+import _common
+import torch
+
+
+def _measure(chunk, image_size, batch_size, hidden_dim, n_layers, iters):
+    from pixelrnn_core.pixelrnn import PixelRNN
+
+    torch.manual_seed(0)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = PixelRNN(hidden_dim=hidden_dim, n_layers=n_layers, checkpoint_chunk=chunk or None).to(device)
+    x = torch.rand(batch_size, 3, image_size, image_size, device=device)
+
+    def step():
+        model.zero_grad(set_to_none=True)
+        model(x).square().mean().backward()
+
+    # Warm up first: the first checkpointed step imports torch._dynamo (~170 MB RSS)
+    peak = _common.step_memory_mb(step, device, warmup=2)
+    step_ms = _common.time_fn(step, warmup=1, iters=iters)
+    return peak, step_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image-size", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--hidden-dim", type=int, default=128)
+    parser.add_argument("--n-layers", type=int, default=2)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[0, 32, 16, 8])
+    parser.add_argument("--iters", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {chunk: _common.run_isolated(_measure, chunk, args.image_size, args.batch_size,
+                                           args.hidden_dim, args.n_layers, args.iters)
+               for chunk in args.chunks}
+    base_mem, base_ms = results.get(0, next(iter(results.values())))
+
+    rows = []
+    for chunk, (mem, ms) in results.items():
+        rows.append((chunk or "off", f"{mem:.0f}", f"{base_mem - mem:.0f}", f"{ms:.0f}", f"{ms / base_ms:.2f}x"))
+    print(f"PixelRNN step, {args.image_size}x{args.image_size}, batch={args.batch_size}, "
+          f"hidden_dim={args.hidden_dim}, n_layers={args.n_layers}")
+    _common.print_table(["checkpoint_chunk", "step peak MB", "saved MB", "step ms", "relative time"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Cold start of a serving process: import, checkpoint load and first inference.
+
+    python benchmarks/bench_startup.py [--models unet pixelrnn] [--repeats 3]
+
+Each run is a fresh interpreter that either goes through the model registry
+(``pixelrnn_core.loading.load_model``, what the apps and server do) or
+repeats what the apps used to do: import ``torchvision.transforms`` and
+the training script, then build the model from it. That "old app" path runs
+against the tree from before the models moved into ``pixelrnn_core``
+(extracted with ``git archive``; ``--baseline-rev`` picks another
+revision), since today's training scripts no longer define the models. It
+is skipped outside a git checkout. The registry is also
+timed on the checkpoint's ``.safetensors`` export (pixelrnn_core.weights),
+which is memory-mapped instead of unpickled. Reports the median
+import and load time, the first forward pass, the peak RSS and which heavy
+optional modules ended up imported.
+Uses the trained checkpoint when present, otherwise a random-init one.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+import _common
+
+SCRIPTS = {"unet": ("training1", "pixelrnn_train"), "pixelrnn": ("training2", "pixelrnn")}
+HEAVY_MODULES = ("torchvision", "matplotlib", "onnxruntime")
+REFACTOR_MARKER = ("class PixelRNNishUNet(", "training1/pixelrnn_train.py")  # removed when the models moved
+
+_CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import torch
+if {script!r}:
+    sys.path.insert(0, {script_dir!r})
+    import importlib
+    from torchvision import transforms
+    cls = getattr(importlib.import_module({script!r}), {cls!r})
+    imported = time.perf_counter()
+    model = cls()
+    model.load_state_dict(torch.load({checkpoint!r}, map_location="cpu", weights_only=False)["model_state"])
+    model.eval()
+else:
+    from pixelrnn_core.loading import load_model
+    imported = time.perf_counter()
+    model, _ = load_model({kind!r}, {checkpoint!r})
+loaded = time.perf_counter()
+with torch.no_grad():
+    model(torch.rand(1, 3, {size}, {size}))
+done = time.perf_counter()
+print(json.dumps({{"import": imported - start, "load": loaded - imported, "first": done - loaded,
+                  "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _git(*args):
+    return subprocess.run(["git", *args], cwd=_common.ROOT, check=True, capture_output=True).stdout
+
+
+def extract_baseline(dest, rev=None):
+    """Extract the training scripts and package at ``rev`` (default: just before the refactor) into ``dest``."""
+    if rev is None:
+        marker, path = REFACTOR_MARKER
+        rev = _git("log", "-1", "-S", marker, "--format=%H", "--", path).decode().strip() + "^"
+    archive = _git("archive", "--format=tar", rev, "training1", "training2", "pixelrnn_core")
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(dest, filter="data")
+    return dest
+
+
+def _run(kind, path, checkpoint, cwd, baseline_root=None):
+    from pixelrnn_core.loading import MODEL_SPECS
+
+    spec = MODEL_SPECS[kind]
+    script_dir, script = SCRIPTS[kind] if path == "old app" else (None, None)
+    root = baseline_root if path == "old app" else _common.ROOT
+    code = _CHILD.format(root=root, script=script, kind=kind, cls=spec["class"],
+                         script_dir=script_dir and os.path.join(root, script_dir),
+                         checkpoint=checkpoint, size=spec["image_size"], heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=cwd, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", choices=sorted(SCRIPTS), default=sorted(SCRIPTS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--baseline-rev", default=None,
+                        help="Git revision for the old app path (default: the commit before the models moved).")
+    args = parser.parse_args()
+
+    import torch
+
+    from pixelrnn_core.loading import MODEL_SPECS, build_model
+    from pixelrnn_core.weights import export_checkpoint
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            baseline_root = extract_baseline(os.path.join(tmp, "baseline"), args.baseline_rev)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Skipping the old app path: cannot extract the pre-refactor tree ({e})")
+            baseline_root = None
+        paths = [("registry", ".pth"), ("registry", ".safetensors")]
+        if baseline_root is not None:
+            paths.insert(0, ("old app", ".pth"))
+        for kind in args.models:
+            checkpoint = os.path.join(_common.ROOT, MODEL_SPECS[kind]["checkpoint"])
+            if not os.path.exists(checkpoint):
+                checkpoint = os.path.join(tmp, f"{kind}.pth")
+                torch.save({"model_state": build_model(kind).state_dict()}, checkpoint)
+            weights = os.path.join(tmp, f"{kind}.safetensors")
+            export_checkpoint(kind, torch.load(checkpoint, map_location="cpu", weights_only=False), weights)
+            for path, ext in paths:
+                file = weights if ext == ".safetensors" else checkpoint
+                runs = [_run(kind, path, file, tmp, baseline_root) for _ in range(args.repeats)]
+
+                def median(key):
+                    return statistics.median(r[key] for r in runs)
+
+                rows.append((kind, path, os.path.splitext(file)[1], f"{median('import'):.2f}", f"{median('load'):.2f}",
+                             f"{median('import') + median('load'):.2f}", f"{median('first') * 1000:.0f}",
+                             f"{median('rss'):.0f}", ", ".join(runs[0]["heavy"]) or "-"))
+
+    _common.print_table(["model", "path", "checkpoint", "import s", "load s", "ready s", "first forward ms", "peak RSS MB",
+                         "heavy modules"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Training/inference throughput suite with JSON results and regression checks.
+
+    python benchmarks/bench_suite.py run [--output results.json] [--quick]
+        [--models unet pixelrnn] [--image-sizes 64 128] [--batch-sizes 1 4] [--threads 1 8] [--workers 0 2]
+    python benchmarks/bench_suite.py compare baseline.json results.json [--threshold 0.10]
+    python benchmarks/bench_suite.py run --baseline baseline.json   # run, then compare
+
+``run`` measures every cell of the grid in a fresh process with fixed seeds
+on synthetic data, so no dataset is needed:
+
+- model cells (model x image size x batch size x threads): eval forward
+  latency, train step time (forward, MSE loss, backward, Adam step; the VGG
+  perceptual loss is left out so no weights download is needed), images/sec
+  for both and the process's peak RSS,
+- pipeline cells (image size x batch size x DataLoader workers): pairs/sec
+  of ``pixelrnn_core.datasets.OccludedDataset`` over generated 256x256 PNG
+  pairs, read through ``pixelrnn_core.pipeline.build_loader``.
+
+Results are written as JSON together with the torch/Python versions, CPU
+count and git commit. ``compare`` matches cells by their parameters and
+flags every metric that got worse by more than ``--threshold`` (relative),
+exiting non-zero if any did. Timings are only comparable between runs on
+the same machine.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+import _common
+
+SCHEMA_VERSION = 1
+# Metric -> which direction is better.
+METRICS = {
+    "forward_ms": "lower", "infer_img_s": "higher", "step_ms": "lower", "train_img_s": "higher",
+    "pipeline_img_s": "higher", "peak_rss_mb": "lower",
+}
+# Grid and repetition defaults of ``run``, and the smaller ones of ``run --quick``.
+# Flags given on the command line override either.
+GRID_DEFAULTS = {
+    "image_sizes": [64, 128], "batch_sizes": [1, 4], "threads": sorted({1, os.cpu_count() or 1}),
+    "workers": [0, 2], "iters": 10, "pipeline_epochs": 3,
+}
+QUICK_DEFAULTS = {"image_sizes": [64], "batch_sizes": [1], "threads": [1], "workers": [0], "iters": 3,
+                  "pipeline_epochs": 1}
+PIPELINE_IMAGES = 64
+PIPELINE_SOURCE_SIZE = 256
+
+
+def _model_cell(kind, image_size, batch_size, threads, warmup, iters):
+    import torch
+    import torch.nn.functional as F
+
+    from pixelrnn_core.loading import build_model
+
+    torch.set_num_threads(threads)
+    torch.manual_seed(0)
+    model = build_model(kind)
+    x = torch.rand(batch_size, 3, image_size, image_size)
+    target = torch.rand(batch_size, 3, image_size, image_size)
+
+    model.eval()
+    with torch.no_grad():
+        forward_ms = _common.time_fn(lambda: model(x), warmup=warmup, iters=iters)
+
+    model.train()
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+
+    def step():
+        optimizer.zero_grad(set_to_none=True)
+        F.mse_loss(model(x), target).backward()
+        optimizer.step()
+
+    step_ms = _common.time_fn(step, warmup=warmup, iters=iters)
+    return {
+        "forward_ms": forward_ms, "infer_img_s": batch_size * 1000 / forward_ms,
+        "step_ms": step_ms, "train_img_s": batch_size * 1000 / step_ms,
+        "peak_rss_mb": _common.peak_rss_mb(),
+    }
+
+
+def _pipeline_cell(root, image_size, batch_size, workers, warmup, iters):
+    import torch
+
+    from pixelrnn_core.datasets import OccludedDataset
+    from pixelrnn_core.pipeline import build_loader
+
+    torch.manual_seed(0)
+    dataset = OccludedDataset(root, "train", image_size)
+    loader = build_loader(dataset, batch_size, shuffle=True, num_workers=workers)
+
+    def epoch():
+        for _ in loader:
+            pass
+
+    ms = _common.time_fn(epoch, warmup=warmup, iters=iters)  # warmup also starts the persistent workers
+    return {"pipeline_img_s": len(dataset) * 1000 / ms, "peak_rss_mb": _common.peak_rss_mb()}
+
+
+def _write_dataset(root):
+    """PIPELINE_IMAGES smooth random originals and copies with a black box, as PNG."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    dirs = [os.path.join(root, "train", d) for d in ("occluded_images", "original_images")]
+    for d in dirs:
+        os.makedirs(d, exist_ok=True)
+    for i in range(PIPELINE_IMAGES):
+        coarse = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+        original = np.asarray(Image.fromarray(coarse).resize((PIPELINE_SOURCE_SIZE,) * 2, Image.BICUBIC))
+        occluded = original.copy()
+        y, x = rng.integers(0, PIPELINE_SOURCE_SIZE // 2, 2)
+        occluded[y:y + PIPELINE_SOURCE_SIZE // 4, x:x + PIPELINE_SOURCE_SIZE // 4] = 0
+        Image.fromarray(occluded).save(os.path.join(dirs[0], f"{i:04d}.png"))
+        Image.fromarray(original).save(os.path.join(dirs[1], f"{i:04d}.png"))
+
+
+def _environment():
+    import torch
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_common.ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit, "python": platform.python_version(), "torch": torch.__version__,
+        "platform": platform.platform(), "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def cell_key(result):
+    """Stable identifier of a cell, e.g. ``model model=unet image_size=64 batch_size=1 threads=1``."""
+    params = " ".join(f"{k}={v}" for k, v in result.items() if k not in ("benchmark", "metrics"))
+    return f"{result['benchmark']} {params}"
+
+
+def run(args):
+    results = []
+    for kind in args.models:
+        for image_size in args.image_sizes:
+            for batch_size in args.batch_sizes:
+                for threads in args.threads:
+                    metrics = _common.run_isolated(_model_cell, kind, image_size, batch_size, threads,
+                                                   args.warmup, args.iters)
+                    results.append({"benchmark": "model", "model": kind, "image_size": image_size,
+                                    "batch_size": batch_size, "threads": threads, "metrics": metrics})
+                    print(f"{cell_key(results[-1])}: {metrics['step_ms']:.1f} ms/step, "
+                          f"{metrics['infer_img_s']:.1f} img/s inference", flush=True)
+
+    with tempfile.TemporaryDirectory() as root:
+        _write_dataset(root)
+        for image_size in args.image_sizes:
+            for batch_size in args.batch_sizes:
+                for workers in args.workers:
+                    metrics = _common.run_isolated(_pipeline_cell, root, image_size, batch_size, workers,
+                                                   1, args.pipeline_epochs)
+                    results.append({"benchmark": "pipeline", "image_size": image_size, "batch_size": batch_size,
+                                    "workers": workers, "metrics": metrics})
+                    print(f"{cell_key(results[-1])}: {metrics['pipeline_img_s']:.0f} pairs/s", flush=True)
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "environment": _environment(),
+        "config": {"warmup": args.warmup, "iters": args.iters, "pipeline_epochs": args.pipeline_epochs,
+                   "pipeline_images": PIPELINE_IMAGES, "pipeline_source_size": PIPELINE_SOURCE_SIZE},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+    return report
+
+
+def compare(baseline, current, threshold):
+    """Table rows comparing two reports and whether any metric regressed by more than ``threshold``."""
+    base = {cell_key(r): r["metrics"] for r in baseline["results"]}
+    rows, regressed = [], False
+    for result in current["results"]:
+        key = cell_key(result)
+        if key not in base:
+            rows.append((key, "", "", "", "", "new"))
+            continue
+        for metric, value in result["metrics"].items():
+            if metric not in base[key]:
+                continue
+            before = base[key][metric]
+            change = (value - before) / before if before else 0.0
+            worse = -change if METRICS.get(metric) == "higher" else change
+            status = "REGRESSION" if worse > threshold else "improved" if worse < -threshold else "ok"
+            regressed |= status == "REGRESSION"
+            rows.append((key, metric, f"{before:.2f}", f"{value:.2f}", f"{change:+.1%}", status))
+    current_keys = {cell_key(r) for r in current["results"]}
+    rows += [(key, "", "", "", "", "missing") for key in base if key not in current_keys]
+    return rows, regressed
+
+
+def _load(path):
+    with open(path) as f:
+        report = json.load(f)
+    if report.get("schema") != SCHEMA_VERSION:
+        raise SystemExit(f"{path}: unsupported schema {report.get('schema')!r}, expected {SCHEMA_VERSION}")
+    return report
+
+
+def _report_comparison(baseline_path, baseline, current, threshold):
+    for name in ("torch", "cpu_count", "processor"):
+        if baseline["environment"].get(name) != current["environment"].get(name):
+            print(f"Warning: {name} differs from the baseline "
+                  f"({baseline['environment'].get(name)} vs {current['environment'].get(name)})")
+    rows, regressed = compare(baseline, current, threshold)
+    print(f"\nAgainst {baseline_path} (commit {baseline['environment'].get('git_commit')}), "
+          f"threshold {threshold:.0%}:")
+    _common.print_table(["cell", "metric", "baseline", "current", "change", "status"], rows)
+    if regressed:
+        print("Regressions found.")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the grid and write JSON results.")
+    run_parser.add_argument("--output", default="bench_results.json")
+    run_parser.add_argument("--models", nargs="+", choices=["pixelrnn", "unet"], default=["pixelrnn", "unet"])
+    run_parser.add_argument("--image-sizes", type=int, nargs="+", help="Default: 64 128.")
+    run_parser.add_argument("--batch-sizes", type=int, nargs="+", help="Default: 1 4.")
+    run_parser.add_argument("--threads", type=int, nargs="+", help="Default: 1 and the CPU count.")
+    run_parser.add_argument("--workers", type=int, nargs="+", help="DataLoader workers. Default: 0 2.")
+    run_parser.add_argument("--warmup", type=int, default=2)
+    run_parser.add_argument("--iters", type=int, help="Default: 10.")
+    run_parser.add_argument("--pipeline-epochs", type=int, help="Timed passes over the dataset. Default: 3.")
+    run_parser.add_argument("--quick", action="store_true",
+                            help="Default to the smallest grid (64px, batch 1, 1 thread, 0 workers), 3 iterations "
+                                 "and 1 pipeline epoch; grid flags given explicitly still apply.")
+    run_parser.add_argument("--baseline", default=None, help="Compare against this results file afterwards.")
+    run_parser.add_argument("--threshold", type=float, default=0.10)
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions of one results file against another.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="Relative change that counts as a regression (default 0.10 = 10%%).")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        _report_comparison(args.baseline, _load(args.baseline), _load(args.current), args.threshold)
+        return
+
+    for name, value in (QUICK_DEFAULTS if args.quick else GRID_DEFAULTS).items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+    report = run(args)
+    if args.baseline:
+        _report_comparison(args.baseline, _load(args.baseline), report, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Tiled full-resolution inference: latency and working memory vs. image size.
+
+    python benchmarks/bench_tiling.py [--sizes 384x512 1536x512 768x1024] [--batch-size 16]
+
+Each model and image size runs pixelrnn_core.tiling.TiledInference once in a
+fresh process and reports tiles, latency, tiles/sec and the RSS growth over
+the call minus the uint8 output array. Same-width images of different
+heights should show the same working memory, since only one band of tile
+rows per image is ever held in float. The resize-to-model-size path the
+apps use by default is timed for reference.
+"""
+import argparse
+import os
+import time
+
+import _common
+import torch
+import torch.nn.functional as F
+
+from pixelrnn_core.loading import MODEL_SPECS
+
+
+def _measure(kind, height, width, batch_size, overlap):
+    import numpy as np
+
+    from pixelrnn_core.backends import TorchBackend
+    from pixelrnn_core.loading import load_model
+    from pixelrnn_core.tiling import TiledInference, tile_origins
+
+    spec = MODEL_SPECS[kind]
+    S = spec["image_size"]
+    checkpoint = os.path.join(_common.ROOT, spec["checkpoint"])
+    torch.manual_seed(0)
+    model = TorchBackend(load_model(kind, checkpoint if os.path.exists(checkpoint) else None)[0])
+    tiler = TiledInference(model, S, overlap, batch_size)
+    image = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    tiler(image[:S, :S])  # warm up the allocator and the model
+
+    elapsed = []
+
+    def step():
+        start = time.perf_counter()
+        tiler(image)
+        elapsed.append((time.perf_counter() - start) * 1000)
+
+    working_mb = _common.step_memory_mb(step, torch.device("cpu")) - image.nbytes / 2**20
+    tiles = len(tile_origins(max(height, S), S, tiler.overlap)) * len(tile_origins(max(width, S), S, tiler.overlap))
+
+    x = torch.from_numpy(image).permute(2, 0, 1)[None].float().div_(255)
+
+    def resize_path():
+        small = F.interpolate(x, size=(S, S), mode="bilinear", antialias=True)
+        return F.interpolate(model(small), size=(height, width), mode="bilinear")
+
+    resize_ms = _common.time_fn(resize_path, warmup=1, iters=3)
+    return tiles, elapsed[0], max(0.0, working_mb), resize_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", choices=sorted(MODEL_SPECS), default=sorted(MODEL_SPECS))
+    parser.add_argument("--sizes", nargs="+", default=["384x512", "1536x512", "768x1024"],
+                        help="HEIGHTxWIDTH")
+    parser.add_argument("--batch-size", type=int, default=16, help="Tiles per forward pass.")
+    parser.add_argument("--overlap", type=int, default=None, help="Default: a quarter of the tile.")
+    args = parser.parse_args()
+
+    rows = []
+    for kind in args.models:
+        for size in args.sizes:
+            height, width = map(int, size.lower().split("x"))
+            tiles, ms, working_mb, resize_ms = _common.run_isolated(_measure, kind, height, width,
+                                                                    args.batch_size, args.overlap)
+            rows.append((kind, f"{height}x{width}", tiles, f"{ms:.0f}", f"{tiles / ms * 1000:.1f}",
+                         f"{working_mb:.0f}", f"{resize_ms:.0f}"))
+
+    print(f"\nbatch={args.batch_size} tiles, threads={torch.get_num_threads()}")
+    _common.print_table(["model", "image", "tiles", "tiled ms", "tiles/sec", "working MB",
+                         "resize path ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Peak memory vs. step time for PixelRNNishUNet ConvBlock checkpointing levels.
+
+    python benchmarks/bench_unet_checkpoint.py [--image-size 128] [--batch-size 4]
+
+Each setting runs forward+backward of PixelRNNishUNet in a fresh process and,
+after two warmup steps, reports the memory growth over one step (RSS on CPU,
+allocator peak on CUDA) and the median step time. Level 1 is enc1/dec1, 4 is
+the center block.
+"""
+import argparse
+
+import _common
+import torch
+
+SETTINGS = {
+    "off": (),
+    "1": (1,),
+    "1,2": (1, 2),
+    "1,4": (1, 4),
+    "1,2,3": (1, 2, 3),
+    "all": (1, 2, 3, 4),
+}
+
+
+def _measure(levels, image_size, batch_size, iters):
+    from pixelrnn_core.unet import PixelRNNishUNet
+
+    torch.manual_seed(0)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = PixelRNNishUNet(checkpoint_levels=levels).to(device).train()
+    x = torch.rand(batch_size, 3, image_size, image_size, device=device)
+
+    def step():
+        model.zero_grad(set_to_none=True)
+        model(x).square().mean().backward()
+
+    # Warm up first: the first checkpointed step imports torch._dynamo (~170 MB RSS)
+    peak = _common.step_memory_mb(step, device, warmup=2)
+    step_ms = _common.time_fn(step, warmup=1, iters=iters)
+    return peak, step_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image-size", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--settings", nargs="+", default=list(SETTINGS), choices=list(SETTINGS))
+    parser.add_argument("--iters", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {name: _common.run_isolated(_measure, SETTINGS[name], args.image_size, args.batch_size, args.iters)
+               for name in args.settings}
+    base_mem, base_ms = results.get("off", next(iter(results.values())))
+
+    rows = [(name, f"{mem:.0f}", f"{100 * (1 - mem / base_mem):.0f}%", f"{ms:.0f}", f"{ms / base_ms:.2f}x")
+            for name, (mem, ms) in results.items()]
+    print(f"PixelRNNishUNet step, {args.image_size}x{args.image_size}, batch={args.batch_size}")
+    _common.print_table(["checkpoint levels", "step peak MB", "memory saved", "step ms", "relative time"], rows)
+
+
+if __name__ == "__main__":
+    main()
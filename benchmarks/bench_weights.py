@@ -0,0 +1,102 @@
+"""Checkpoint load: pickled .pth vs. memory-mapped .safetensors (fp32 and fp16).
+
+    python benchmarks/bench_weights.py [--models unet pixelrnn] [--repeats 3]
+
+Exports each model's pixelrnn_best_model.pth (random weights if missing) with
+pixelrnn_core.weights, then loads every format with ``load_model`` in a
+fresh process after evicting the file from the page cache. Reports file
+size, load time, the growth of the current RSS over the load and over load
+plus the first forward pass, and the max |diff| of the output against the
+.pth. Mapped pages count towards RSS once they are read.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+
+import _common
+
+FORMATS = ("pth (pickle)", "safetensors fp32", "safetensors fp16")
+
+
+def _evict(path):
+    # Drop the file's cached pages so the load reads from disk, like a cold start.
+    if hasattr(os, "posix_fadvise"):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def _input(kind):
+    import torch
+
+    from pixelrnn_core.loading import MODEL_SPECS
+
+    size = MODEL_SPECS[kind]["image_size"]
+    return torch.rand(1, 3, size, size, generator=torch.Generator().manual_seed(0))
+
+
+def _measure(kind, path, reference):
+    import time
+
+    import torch
+
+    from pixelrnn_core.loading import load_model
+
+    x = _input(kind)
+    _evict(path)
+
+    baseline = _common.rss_mb()
+    start = time.perf_counter()
+    model, _ = load_model(kind, path)
+    load_ms = (time.perf_counter() - start) * 1000
+    load_mb = _common.rss_mb() - baseline
+    with torch.no_grad():
+        output = model(x)
+    return load_ms, load_mb, _common.rss_mb() - baseline, (output - reference).abs().max().item()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", choices=["pixelrnn", "unet"], default=["pixelrnn", "unet"])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    import torch
+
+    from pixelrnn_core.loading import MODEL_SPECS, build_model, load_model
+    from pixelrnn_core.weights import export_checkpoint
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.models:
+            pth = os.path.join(_common.ROOT, MODEL_SPECS[kind]["checkpoint"])
+            if os.path.exists(pth):
+                ckpt = torch.load(pth, map_location="cpu", weights_only=False)
+            else:
+                torch.manual_seed(0)
+                ckpt = {"model_state": build_model(kind).state_dict(), "epoch": 0}
+                pth = os.path.join(tmp, f"{kind}.pth")
+                torch.save(ckpt, pth)
+            paths = {FORMATS[0]: pth}
+            for fmt, fp16 in zip(FORMATS[1:], (False, True)):
+                paths[fmt] = os.path.join(tmp, f"{kind}_{'fp16' if fp16 else 'fp32'}.safetensors")
+                export_checkpoint(kind, ckpt, paths[fmt], fp16)
+
+            with torch.no_grad():
+                reference = load_model(kind, pth)[0](_input(kind))
+            for fmt, path in paths.items():
+                runs = [_common.run_isolated(_measure, kind, path, reference) for _ in range(args.repeats)]
+                ms, load_mb, first_mb, diff = (statistics.median(r[i] for r in runs) for i in range(4))
+                rows.append((kind, fmt, f"{os.path.getsize(path) / 2**20:.1f}", f"{ms:.1f}",
+                             f"{load_mb:.0f}", f"{first_mb:.0f}", f"{diff:.1e}"))
+
+    _common.print_table(["model", "format", "file MB", "load ms", "load RSS MB", "load + forward RSS MB",
+                         "max |diff|"], rows)
+
+
+if __name__ == "__main__":
+    main()
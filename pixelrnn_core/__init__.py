@@ -0,0 +1 @@
+"""Shared utilities for the PixelRNN image completion training scripts and apps."""
@@ -0,0 +1,85 @@
+"""Interchangeable inference backends: eager PyTorch or ONNX Runtime.
+
+Every backend is called with a float (B, 3, S, S) CPU or device tensor in
+[0, 1] and returns the (B, 3, S, S) float32 reconstruction on the CPU, so
+the Streamlit apps, ``batch_infer`` and ``server`` can switch between them
+without other changes. ``load_backend`` builds one by name.
+"""
+import os
+
+import numpy as np
+import torch
+
+from pixelrnn_core.loading import MODEL_SPECS, ROOT, load_model
+from pixelrnn_core.profiling import profiler_from_env
+from pixelrnn_core.weights import preferred_checkpoint
+
+BACKENDS = ("torch", "onnx")
+
+
+class TorchBackend:
+    """Eager PyTorch, optionally under bfloat16 autocast.
+
+    With ``PIXELRNN_PROFILE=1`` every call is profiled per module
+    (pixelrnn_core.profiling); the summary is printed at exit.
+    """
+    name = "torch"
+
+    def __init__(self, model, device="cpu", bf16=False, metadata=None):
+        self.model = model.eval()
+        self.device = torch.device(device)
+        self.bf16 = bf16
+        self.metadata = metadata or {}
+        self.profiler = profiler_from_env(self.device, **{self.metadata.get("model", "model"): self.model})
+
+    def __call__(self, x):
+        if self.profiler is not None:
+            self.profiler.begin()  # leave out the time between requests
+        with torch.no_grad(), torch.autocast(self.device.type, dtype=torch.bfloat16, enabled=self.bf16):
+            output = self.model(x.to(self.device)).float().cpu()
+        if self.profiler is not None:
+            self.profiler.step()
+        return output
+
+
+class OnnxBackend:
+    """ONNX Runtime on the CPU execution provider.
+
+    ``metadata`` holds what ``onnx_export`` stored (model, image_size,
+    checkpoint, epoch).
+    """
+    name = "onnx"
+
+    def __init__(self, path, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The ONNX backend needs onnxruntime: pip install onnxruntime") from e
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.metadata = dict(self.session.get_modelmeta().custom_metadata_map)
+
+    def __call__(self, x):
+        x = np.ascontiguousarray(x.detach().cpu().float().numpy())
+        return torch.from_numpy(self.session.run(None, {self.input_name: x})[0])
+
+
+def load_backend(kind, backend="torch", checkpoint_path=None, onnx_path=None, device="cpu", bf16=False):
+    """Backend for model ``kind``; paths default to the model's checkpoint (and its .onnx).
+
+    The default checkpoint is replaced by its ``.safetensors`` export when
+    that exists and is not older.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    checkpoint_path = checkpoint_path or preferred_checkpoint(os.path.join(ROOT, MODEL_SPECS[kind]["checkpoint"]))
+    if backend == "onnx":
+        return OnnxBackend(onnx_path or os.path.splitext(checkpoint_path)[0] + ".onnx")
+    model, ckpt = load_model(kind, checkpoint_path, device)
+    metadata = {"model": kind, "image_size": MODEL_SPECS[kind]["image_size"],
+                "checkpoint": os.path.abspath(checkpoint_path), "epoch": ckpt.get("epoch")}
+    return TorchBackend(model, device, bf16, metadata)
@@ -0,0 +1,252 @@
+"""Headless batch inference over directories or lists of occluded images.
+
+    python -m pixelrnn_core.batch_infer dataset_A2/occluded_test --model unet \\
+        --output-dir outputs/reconstructions --batch-size 16 --restore-size
+
+Inputs are image files, directories of images, or ``--file-list`` text files
+with one path per line. Decoding/resizing and PNG encoding run in a process
+pool: decodes are queued a few batches ahead and encodes are handed off as
+soon as a batch is reconstructed, so both overlap the model's forward pass.
+Each reconstruction is written as a PNG under ``--output-dir`` at the input's
+path relative to the inputs' common directory, so ``a/x.jpg`` and ``b/x.jpg``
+become ``a/x.png`` and ``b/x.png``. Inputs that would still share an output
+file (``x.jpg`` next to ``x.png``) are rejected before the run starts. Files
+that cannot be decoded are reported and skipped. Outputs are at the model's
+resolution or, with ``--restore-size``, resized back to the input's size.
+With ``--tiled`` images are instead reconstructed at their own resolution in
+overlapping model-sized tiles (``pixelrnn_core.tiling``), batched across
+images.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image
+
+from pixelrnn_core.backends import BACKENDS, load_backend
+from pixelrnn_core.image_io import decode, load_resized
+from pixelrnn_core.loading import MODEL_SPECS
+from pixelrnn_core.tiling import TiledInference
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+
+def collect_inputs(paths, file_lists=()):
+    """Expand files, directories (sorted, non-recursive) and list files into image paths."""
+    for list_path in file_lists:
+        with open(list_path) as f:
+            paths = list(paths) + [line.strip() for line in f if line.strip()]
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                          if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            images.append(path)
+    return images
+
+
+def output_names(paths):
+    """Output file of each input, relative to the output directory.
+
+    Names keep each input's path below the inputs' common directory, with a
+    .png extension. Raises ValueError if two inputs would share a name.
+    """
+    if not paths:
+        return []
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    names, seen = [], {}
+    for path in paths:
+        name = os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0] + ".png"
+        if name in seen:
+            raise ValueError(f"{seen[name]} and {path} would both be written to {name}")
+        seen[name] = path
+        names.append(name)
+    return names
+
+
+def _result_or_skip(path, future):
+    """The decode result for ``path``, or None (reported) if the file cannot be decoded."""
+    try:
+        return future.result()
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+        print(f"Skipping {path}: {type(e).__name__}: {e}")
+        return None
+
+
+def _decode(path, image_size):
+    """Resized (S, S, 3) uint8 pixels and the original (width, height)."""
+    # Same bilinear resize as transforms.Resize in the training datasets.
+    img, size = load_resized(path, (image_size, image_size))
+    return np.asarray(img), size
+
+
+def _decode_full(path):
+    """(H, W, 3) uint8 pixels at the file's own resolution (up to image_io.MAX_PIXELS)."""
+    return np.asarray(decode(path)[0])
+
+
+def _encode(pixels, out_path, size=None):
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    img = Image.fromarray(pixels)
+    if size is not None and size != img.size:
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    img.save(out_path, format="PNG")
+    return out_path
+
+
+def run(backend, paths, output_dir, image_size, batch_size=16, workers=None, restore_size=False,
+        prefetch_batches=2):
+    """Reconstruct every image in ``paths`` with a ``pixelrnn_core.backends`` backend.
+
+    Returns ``(num_images, seconds, compute_seconds)``, counting the images
+    written; files that fail to decode are skipped.
+    """
+    names = dict(zip(paths, output_names(paths)))
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or min(4, os.cpu_count() or 1)
+    start = time.perf_counter()
+    compute = 0.0
+
+    # spawn rather than fork: the parent already runs torch's thread pools.
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = iter(paths)
+        decodes = deque()
+        encodes = []
+
+        def fill():
+            while len(decodes) < batch_size * (prefetch_batches + 1):
+                path = next(pending, None)
+                if path is None:
+                    return
+                decodes.append((path, pool.submit(_decode, path, image_size)))
+
+        fill()
+        while decodes:
+            batch = [decodes.popleft() for _ in range(min(batch_size, len(decodes)))]
+            fill()
+            batch = [(path, result) for path, future in batch
+                     for result in [_result_or_skip(path, future)] if result is not None]
+            if not batch:
+                continue
+            decoded = [result for _, result in batch]
+            pixels = torch.from_numpy(np.stack([d[0] for d in decoded]))
+
+            compute_start = time.perf_counter()
+            x = pixels.permute(0, 3, 1, 2).float().div_(255)
+            output = backend(x).clamp_(0, 1).mul_(255).round_().to(torch.uint8)
+            output = output.permute(0, 2, 3, 1).numpy()
+            compute += time.perf_counter() - compute_start
+
+            for (path, (_, size)), pixels_out in zip(batch, output):
+                encodes.append(pool.submit(_encode, pixels_out, os.path.join(output_dir, names[path]),
+                                           size if restore_size else None))
+        for future in encodes:
+            future.result()
+
+    return len(encodes), time.perf_counter() - start, compute
+
+
+def run_tiled(backend, paths, output_dir, tile_size, overlap=None, batch_size=16, workers=None,
+              prefetch_images=4):
+    """Like ``run``, but reconstruct each image at full resolution with ``TiledInference``.
+
+    ``batch_size`` counts tiles; at most ``prefetch_images`` decoded images wait ahead of the model.
+    """
+    names = dict(zip(paths, output_names(paths)))
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or min(4, os.cpu_count() or 1)
+    start = time.perf_counter()
+    compute = 0.0
+
+    def model_fn(x):
+        nonlocal compute
+        compute_start = time.perf_counter()
+        output = backend(x)
+        compute += time.perf_counter() - compute_start
+        return output
+
+    tiler = TiledInference(model_fn, tile_size, overlap, batch_size)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = iter(paths)
+        decodes = deque()
+        decoded_paths = deque()  # paths of the images handed to the tiler, in order
+
+        def fill():
+            while len(decodes) < prefetch_images:
+                path = next(pending, None)
+                if path is None:
+                    return
+                decodes.append((path, pool.submit(_decode_full, path)))
+
+        def decoded():
+            fill()
+            while decodes:
+                path, future = decodes.popleft()
+                fill()
+                pixels = _result_or_skip(path, future)
+                if pixels is not None:
+                    decoded_paths.append(path)
+                    yield pixels
+
+        encodes = []
+        for pixels_out in tiler.run(decoded()):
+            path = decoded_paths.popleft()
+            encodes.append(pool.submit(_encode, pixels_out, os.path.join(output_dir, names[path])))
+        for future in encodes:
+            future.result()
+
+    return len(encodes), time.perf_counter() - start, compute
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruct occluded images in batches.")
+    parser.add_argument("inputs", nargs="*", help="Image files or directories of images.")
+    parser.add_argument("--file-list", action="append", default=[], help="Text file with one image path per line.")
+    parser.add_argument("--model", choices=sorted(MODEL_SPECS), default="unet")
+    parser.add_argument("--checkpoint", default=None, help="Defaults to the model's pixelrnn_best_model.pth.")
+    parser.add_argument("--output-dir", default="reconstructions")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=None, help="Decode/encode processes (default: min(4, CPUs)).")
+    parser.add_argument("--restore-size", action="store_true",
+                        help="Resize outputs back to each input's size (--tiled outputs already have it).")
+    parser.add_argument("--tiled", action="store_true",
+                        help="Reconstruct at full resolution in overlapping tiles (--batch-size counts tiles).")
+    parser.add_argument("--tile-overlap", type=int, default=None, help="Tile overlap in pixels (default: tile/4).")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch")
+    parser.add_argument("--onnx", default=None, help="ONNX file for --backend onnx (default: checkpoint with .onnx).")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--bf16", action="store_true", help="Run the model under bfloat16 autocast (torch backend).")
+    args = parser.parse_args()
+
+    paths = collect_inputs(args.inputs, args.file_list)
+    if not paths:
+        parser.error("no input images")
+    if args.tiled and args.restore_size:
+        parser.error("--restore-size cannot be combined with --tiled, whose outputs are already at the input's size")
+    try:
+        output_names(paths)
+    except ValueError as e:
+        parser.error(f"output name collision: {e}")
+    backend = load_backend(args.model, args.backend, args.checkpoint, args.onnx, args.device, args.bf16)
+    meta = backend.metadata
+    print(f"Loaded {args.model} ({backend.name}) from {meta.get('checkpoint')} (epoch {meta.get('epoch', '?')})")
+
+    image_size = MODEL_SPECS[args.model]["image_size"]
+    if args.tiled:
+        count, seconds, compute = run_tiled(backend, paths, args.output_dir, image_size, args.tile_overlap,
+                                            args.batch_size, args.workers)
+    else:
+        count, seconds, compute = run(backend, paths, args.output_dir, image_size, args.batch_size, args.workers,
+                                      args.restore_size)
+    print(f"Wrote {count} images to {args.output_dir} in {seconds:.1f}s "
+          f"({count / seconds:.1f} images/sec, model compute {compute:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Background checkpoint writing with retention, and resuming from it.
+
+``CheckpointWriter.save`` copies the training state to the CPU on the
+training thread. That copy is the only part the training loop waits for.
+A background thread then serializes the copy, writes it to a temporary
+file, fsyncs it and renames it over the target, so a crash never leaves a
+truncated checkpoint. Epoch checkpoints (``pixelrnn_epoch_{n}.pth``) hold
+the full training state: model, optimizer, scheduler, epoch, best loss,
+early-stopping counter, occluder and RNG state, including the data
+loader's shuffle generator. Only the newest
+``keep_last`` of them are kept. The best model is kept separately in the
+usual ``pixelrnn_best_model.pth`` layout (``model_state``, ``val_loss``,
+``epoch``) that the apps load.
+
+``latest_checkpoint`` finds the newest epoch checkpoint, and
+``restore_training_state`` loads one back for ``--resume``.
+"""
+import os
+import queue
+import re
+import threading
+
+import torch
+
+EPOCH_PATTERN = re.compile(r"^pixelrnn_epoch_(\d+)\.pth$")
+
+
+def _to_cpu(value):
+    """Deep copy of ``value`` with every tensor cloned to the CPU."""
+    if isinstance(value, torch.Tensor):
+        return value.detach().to("cpu", copy=True)
+    if isinstance(value, dict):
+        return {k: _to_cpu(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_cpu(v) for v in value)
+    return value
+
+
+def atomic_save(obj, path):
+    """``torch.save`` to a temporary file, fsync, then rename over ``path``."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def epoch_checkpoints(directory):
+    """``[(epoch, path)]`` of the epoch checkpoints in ``directory``, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    found = [(int(m.group(1)), os.path.join(directory, name))
+             for name in os.listdir(directory) for m in [EPOCH_PATTERN.match(name)] if m]
+    return sorted(found)
+
+
+def latest_checkpoint(directory):
+    """Path of the newest epoch checkpoint in ``directory``, or None."""
+    found = epoch_checkpoints(directory)
+    return found[-1][1] if found else None
+
+
+def _loader_generators(loader):
+    # The loader's own generator (worker seeds) and its sampler's (shuffle order), see build_loader(seed=...)
+    return {"loader": loader.generator, "sampler": getattr(loader.sampler, "generator", None)}
+
+
+def rng_state(loader=None):
+    """Global torch/CUDA RNG state, plus the generator states of ``loader`` if given."""
+    state = {"torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    if loader is not None:
+        state["loader"] = {k: g.get_state() for k, g in _loader_generators(loader).items() if g is not None}
+    return state
+
+
+def set_rng_state(state, loader=None):
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+    if loader is not None and "loader" in state:
+        for k, g in _loader_generators(loader).items():
+            if g is not None and k in state["loader"]:
+                g.set_state(state["loader"][k])
+
+
+class CheckpointWriter:
+    """Write checkpoints into ``directory`` on a background thread.
+
+    At most ``max_pending`` snapshots wait in the queue; beyond that ``save``
+    blocks, so a slow disk bounds memory use instead of growing it.
+    ``on_best(checkpoint, path)`` runs on the writer thread after a new best
+    model is written, e.g. to export it as .safetensors. An exception on the
+    writer thread is re-raised by the next ``save`` or by ``close``.
+    """
+    _STOP = object()
+
+    def __init__(self, directory, best_filename="pixelrnn_best_model.pth", keep_last=2, on_best=None,
+                 max_pending=1):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.best_path = os.path.join(directory, best_filename)
+        self.keep_last = keep_last
+        self.on_best = on_best
+        self.error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def _check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("Writing a checkpoint failed") from error
+
+    def save(self, state, epoch, is_best=False):
+        """Snapshot ``state`` (a dict with at least ``model_state`` and ``val_loss``) and queue its writes."""
+        self._check()
+        self._queue.put((_to_cpu(state), epoch, is_best))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._STOP:
+                    return
+                state, epoch, is_best = item
+                atomic_save(state, os.path.join(self.directory, f"pixelrnn_epoch_{epoch}.pth"))
+                if is_best:
+                    best = {"model_state": state["model_state"], "val_loss": state["val_loss"], "epoch": epoch}
+                    atomic_save(best, self.best_path)
+                self._prune()
+                if is_best and self.on_best is not None:
+                    self.on_best(best, self.best_path)
+            except Exception as e:  # surfaced on the training thread
+                self.error = e
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        if self.keep_last is None:
+            return
+        for _, path in epoch_checkpoints(self.directory)[:-self.keep_last or None]:
+            os.remove(path)
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk."""
+        self._queue.join()
+        self._check()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+        self._check()
+
+
+def _for_rank(state, rank):
+    # Distributed runs store one occluder/RNG state per rank, in rank order.
+    if isinstance(state, list):
+        return state[rank] if rank < len(state) else None
+    return state
+
+
+def restore_training_state(path, model, optimizer, scheduler=None, occluder=None, rank=0, loader=None):
+    """Load an epoch checkpoint into the given objects and return the checkpoint dict.
+
+    The caller takes ``epoch``, ``best_loss``, ``patience_counter`` and
+    ``global_step`` from the returned dict. Tensors are loaded on the CPU and
+    copied to the model's and optimizer's devices by ``load_state_dict``.
+    The occluder and RNG states saved by ``rank`` are restored; ranks beyond
+    the saved ones keep their fresh state. With ``loader``, the generators of
+    a loader built with ``build_loader(seed=...)`` are restored too, so the
+    resumed epochs see the batches in the same order as an uninterrupted run.
+    Random state inside worker processes is not saved; no dataset here uses it.
+    """
+    ckpt = torch.load(path, map_location="cpu", weights_only=False)
+    if "optimizer_state" not in ckpt:
+        raise ValueError(f"{path} holds model weights only; resume needs a pixelrnn_epoch_*.pth checkpoint")
+    model.load_state_dict(ckpt["model_state"])
+    optimizer.load_state_dict(ckpt["optimizer_state"])
+    if scheduler is not None and ckpt.get("scheduler_state") is not None:
+        scheduler.load_state_dict(ckpt["scheduler_state"])
+    occluder_state = _for_rank(ckpt.get("occluder_state"), rank)
+    if occluder is not None and occluder_state is not None:
+        occluder.load_state_dict(occluder_state)
+    if _for_rank(ckpt.get("rng_state"), rank) is not None:
+        set_rng_state(_for_rank(ckpt["rng_state"], rank), loader)
+    return ckpt
@@ -0,0 +1,203 @@
+"""Pre-decoded, memory-mapped image cache for the occlusion datasets.
+
+Opening, decoding and resizing two PNG/JPEG files in every ``__getitem__``
+dominates CPU time during training. The builders below do that work once and
+write the resized uint8 pixels into a single ``.npy`` shard next to a small
+JSON index. The cached datasets then read samples straight out of the
+memory-mapped shard.
+
+The index stores a fingerprint of IMAGE_SIZE and of every source file's name,
+size and mtime, so editing the dataset directory or changing IMAGE_SIZE
+rebuilds the cache automatically on next use.
+
+One-time preprocessing from the command line::
+
+    python -m pixelrnn_core.data_cache --root dataset_A2 --image-size 128 --cache-dir outputs/cache
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+from pixelrnn_core.image_io import load_resized
+
+INDEX_VERSION = 2
+
+
+def source_fingerprint(dirs, image_size):
+    """Hash IMAGE_SIZE together with the name, size and mtime of every source file."""
+    digest = hashlib.sha1(f"v{INDEX_VERSION}:{image_size}".encode())
+    for directory in dirs:
+        digest.update(os.path.abspath(directory).encode())
+        for name in sorted(os.listdir(directory)):
+            stat = os.stat(os.path.join(directory, name))
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def _shard_paths(dirs, image_size, cache_dir):
+    base = os.path.basename(os.path.normpath(dirs[0]))
+    key = hashlib.sha1("|".join(os.path.abspath(d) for d in dirs).encode()).hexdigest()[:8]
+    stem = os.path.join(cache_dir, f"{base}-{key}-{image_size}px")
+    return stem + ".npy", stem + ".json"
+
+
+def _read_index(index_path):
+    try:
+        with open(index_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _decode(path, image_size):
+    img, _ = load_resized(path, (image_size, image_size))
+    return np.asarray(img, dtype=np.uint8)
+
+
+def _build_shard(dirs, image_size, cache_dir, rebuild=False):
+    """Decode every image under ``dirs`` into one (N, len(dirs), S, S, 3) uint8 shard.
+
+    Files are paired by sorted position, matching how ``OccludedDataset``
+    pairs occluded and original images. Returns ``(shard_path, index)``.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    shard_path, index_path = _shard_paths(dirs, image_size, cache_dir)
+    fingerprint = source_fingerprint(dirs, image_size)
+
+    index = _read_index(index_path)
+    if not rebuild and index is not None and index.get("fingerprint") == fingerprint \
+            and os.path.exists(shard_path):
+        return shard_path, index
+
+    names = [sorted(os.listdir(d)) for d in dirs]
+    if len({len(n) for n in names}) != 1:
+        raise ValueError(f"Cannot pair images: {[len(n) for n in names]} files in {dirs}")
+
+    shape = (len(names[0]), len(dirs), image_size, image_size, 3)
+    tmp_path = shard_path + ".tmp"
+    shard = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=shape)
+    for i in range(shape[0]):
+        for j, directory in enumerate(dirs):
+            shard[i, j] = _decode(os.path.join(directory, names[j][i]), image_size)
+    shard.flush()
+    del shard
+    os.replace(tmp_path, shard_path)
+
+    index = {
+        "version": INDEX_VERSION,
+        "fingerprint": fingerprint,
+        "image_size": image_size,
+        "shape": list(shape),
+        "dirs": [os.path.abspath(d) for d in dirs],
+        "files": names,
+    }
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(index_path + ".tmp", index_path)
+    return shard_path, index
+
+
+def build_pair_cache(masked_dir, original_dir, image_size, cache_dir, rebuild=False):
+    """Cache resized (occluded, original) pairs. Returns ``(shard_path, index)``."""
+    return _build_shard([masked_dir, original_dir], image_size, cache_dir, rebuild)
+
+
+def build_image_cache(image_dir, image_size, cache_dir, rebuild=False):
+    """Cache resized single images (e.g. the occluded test set). Returns ``(shard_path, index)``."""
+    return _build_shard([image_dir], image_size, cache_dir, rebuild)
+
+
+class _MemmapDataset(Dataset):
+    """Lazily maps the shard so the dataset pickles cheaply into DataLoader workers."""
+    def __init__(self, shard_path, index, to_float=True):
+        self.shard_path = shard_path
+        self.index = index
+        self.to_float = to_float
+        self._shard = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shard"] = None
+        return state
+
+    @property
+    def shard(self):
+        if self._shard is None:
+            # Copy-on-write mapping: pages are shared with the page cache and
+            # torch.from_numpy gets a writable view without touching the file.
+            self._shard = np.load(self.shard_path, mmap_mode="c")
+        return self._shard
+
+    def __len__(self):
+        return self.index["shape"][0]
+
+    def _tensor(self, pixels):
+        # (S, S, 3) uint8 view -> (3, S, S), matching ToTensor's layout
+        img = torch.from_numpy(pixels).permute(2, 0, 1)
+        return img.float().div_(255) if self.to_float else img
+
+
+class CachedOccludedDataset(_MemmapDataset):
+    """Drop-in replacement for ``OccludedDataset`` that reads from a pair cache.
+
+    With ``to_float=False`` samples are zero-copy uint8 (3, S, S) views of the
+    shard; convert them with ``.float() / 255`` after moving to the device.
+    """
+    def __init__(self, root, split="train", image_size=128, cache_dir="cache", to_float=True):
+        masked_dir = os.path.join(root, split, "occluded_images")
+        original_dir = os.path.join(root, split, "original_images")
+        super().__init__(*build_pair_cache(masked_dir, original_dir, image_size, cache_dir), to_float)
+
+    def __getitem__(self, idx):
+        pair = self.shard[idx]
+        return self._tensor(pair[0]), self._tensor(pair[1])
+
+
+class CachedTestDataset(_MemmapDataset):
+    """Drop-in replacement for ``TestDataset`` that reads from an image cache."""
+    def __init__(self, root, image_size=128, cache_dir="cache", to_float=True):
+        super().__init__(*build_image_cache(root, image_size, cache_dir), to_float)
+        self.imgs = self.index["files"][0]
+
+    def __getitem__(self, idx):
+        return self._tensor(self.shard[idx, 0]), self.imgs[idx]
+
+
+class CachedOriginalDataset(_MemmapDataset):
+    """Originals-only cache of a training split, for on-the-fly occlusion."""
+    def __init__(self, root, split="train", image_size=128, cache_dir="cache", to_float=True):
+        original_dir = os.path.join(root, split, "original_images")
+        super().__init__(*build_image_cache(original_dir, image_size, cache_dir), to_float)
+
+    def __getitem__(self, idx):
+        return self._tensor(self.shard[idx, 0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-decode the occlusion dataset into memory-mapped shards.")
+    parser.add_argument("--root", default="dataset_A2")
+    parser.add_argument("--split", default="train")
+    parser.add_argument("--image-size", type=int, default=128)
+    parser.add_argument("--cache-dir", default=os.path.join("outputs", "cache"))
+    parser.add_argument("--rebuild", action="store_true", help="Ignore an up-to-date index and rebuild.")
+    args = parser.parse_args()
+
+    split_dir = os.path.join(args.root, args.split)
+    shard, index = build_pair_cache(os.path.join(split_dir, "occluded_images"),
+                                    os.path.join(split_dir, "original_images"),
+                                    args.image_size, args.cache_dir, args.rebuild)
+    print(f"{args.split}: {index['shape'][0]} pairs -> {shard}")
+
+    test_dir = os.path.join(args.root, "occluded_test")
+    if os.path.isdir(test_dir):
+        shard, index = build_image_cache(test_dir, args.image_size, args.cache_dir, args.rebuild)
+        print(f"occluded_test: {index['shape'][0]} images -> {shard}")
+
+
+if __name__ == "__main__":
+    main()
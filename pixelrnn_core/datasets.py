@@ -0,0 +1,61 @@
+"""Image-folder datasets for both training scripts.
+
+Each item is decoded with ``image_io.load_resized`` and converted like
+torchvision's ``Resize`` + ``ToTensor``. The ``Cached*`` variants in
+``pixelrnn_core.data_cache`` return the same tensors from a pre-decoded shard.
+"""
+import os
+
+from torch.utils.data import Dataset
+
+from pixelrnn_core.image_io import load_resized, to_tensor
+
+
+def _load(path, image_size):
+    return to_tensor(load_resized(path, (image_size, image_size))[0])
+
+
+class OccludedDataset(Dataset):
+    """Dataset for training: includes occluded and original image pairs."""
+    def __init__(self, root, split="train", image_size=128):
+        self.masked_dir = os.path.join(root, split, "occluded_images")
+        self.original_dir = os.path.join(root, split, "original_images")
+        self.masked_imgs = sorted(os.listdir(self.masked_dir))
+        self.original_imgs = sorted(os.listdir(self.original_dir))
+        self.image_size = image_size
+
+    def __len__(self):
+        return len(self.masked_imgs)
+
+    def __getitem__(self, idx):
+        masked = _load(os.path.join(self.masked_dir, self.masked_imgs[idx]), self.image_size)
+        original = _load(os.path.join(self.original_dir, self.original_imgs[idx]), self.image_size)
+        return masked, original
+
+
+class OriginalDataset(Dataset):
+    """Dataset for on-the-fly occlusion: original images only."""
+    def __init__(self, root, split="train", image_size=128):
+        self.original_dir = os.path.join(root, split, "original_images")
+        self.original_imgs = sorted(os.listdir(self.original_dir))
+        self.image_size = image_size
+
+    def __len__(self):
+        return len(self.original_imgs)
+
+    def __getitem__(self, idx):
+        return _load(os.path.join(self.original_dir, self.original_imgs[idx]), self.image_size)
+
+
+class TestDataset(Dataset):
+    """Dataset for testing on occluded images only."""
+    def __init__(self, root, image_size=128):
+        self.root = root
+        self.imgs = sorted(os.listdir(root))
+        self.image_size = image_size
+
+    def __len__(self):
+        return len(self.imgs)
+
+    def __getitem__(self, idx):
+        return _load(os.path.join(self.root, self.imgs[idx]), self.image_size), self.imgs[idx]
@@ -0,0 +1,96 @@
+"""Multi-process data-parallel training on CPUs with the gloo backend.
+
+Launch a training script with torchrun, on one machine or several:
+
+    torchrun --standalone --nproc-per-node 4 training1/pixelrnn_train.py
+    torchrun --nnodes 2 --node-rank 0 --nproc-per-node 8 --rdzv-backend c10d \\
+        --rdzv-endpoint head:29500 training2/pixelrnn.py
+
+``init_distributed`` reads the environment torchrun sets (RANK, WORLD_SIZE,
+LOCAL_WORLD_SIZE). It joins the process group and splits the machine's
+cores between the local processes. Started without torchrun, it returns
+rank 0 of a world of 1, and every helper below is then a no-op. The
+scripts wrap the model in ``DistributedDataParallel``, shard the training
+set with a ``DistributedSampler``, and average the epoch loss across
+ranks, so every rank takes the same scheduler and early-stopping decisions.
+Only rank 0 logs and writes checkpoints.
+"""
+import os
+from contextlib import contextmanager
+
+import torch
+import torch.distributed as dist
+
+
+def init_distributed(backend="gloo", threads=None):
+    """``(rank, world_size)``; joins the process group when started by torchrun.
+
+    ``threads`` is the torch thread count per process. It defaults to this
+    machine's cores divided by its number of processes. torchrun would
+    otherwise leave each process at a single thread.
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    if world_size == 1:
+        return 0, 1
+    if not dist.is_initialized():
+        dist.init_process_group(backend)
+    local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+    torch.set_num_threads(threads or max(1, (os.cpu_count() or 1) // local_world_size))
+    return dist.get_rank(), world_size
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+
+def is_main_process():
+    return not is_distributed() or dist.get_rank() == 0
+
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+
+@contextmanager
+def main_process_first():
+    """Run the block on rank 0 before the other ranks, e.g. to build a shared cache or download weights once."""
+    if not is_main_process():
+        barrier()
+    try:
+        yield
+    finally:
+        if is_main_process():
+            barrier()
+
+
+def mean_across_ranks(value):
+    """Average of a float over all ranks (the value itself when not distributed)."""
+    if not is_distributed():
+        return value
+    tensor = torch.tensor([value], dtype=torch.float64)
+    dist.all_reduce(tensor)
+    return tensor.item() / dist.get_world_size()
+
+
+def any_rank(flag):
+    """True on every rank if ``flag`` is true on any rank."""
+    if not is_distributed():
+        return bool(flag)
+    tensor = torch.tensor([int(bool(flag))])
+    dist.all_reduce(tensor, op=dist.ReduceOp.MAX)
+    return bool(tensor.item())
+
+
+def gather_objects(obj):
+    """``[obj of rank 0, obj of rank 1, ...]`` on every rank (``[obj]`` when not distributed)."""
+    if not is_distributed():
+        return [obj]
+    objects = [None] * dist.get_world_size()
+    dist.all_gather_object(objects, obj)
+    return objects
+
+
+def cleanup():
+    if is_distributed():
+        dist.destroy_process_group()
@@ -0,0 +1,196 @@
+"""Cache of frozen-VGG features for the perceptual-loss targets.
+
+The ``original`` targets are the same images every epoch, so running the
+frozen VGG on them more than once is wasted work. ``FeatureCache`` keeps
+the target features per dataset index, populated on first use and reused
+afterwards. Features are stored as fp16 either in memory, bounded by an LRU
+byte budget, or on disk in a memory-mapped file keyed by IMAGE_SIZE, a
+dataset fingerprint and the extractor's layers and weights, so changing
+``VGG_WEIGHTS_PATH`` or the number of VGG layers starts a new file. Under
+DDP the ranks share that file: rank 0 creates it and the other ranks map it
+once it exists.
+
+``IndexedDataset`` wraps a dataset so each batch carries the indices the
+cache is keyed by, and ``load_vgg16_features`` builds the frozen extractor,
+optionally from a local weights file for machines without network access.
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+from pixelrnn_core.distributed import barrier, is_main_process
+
+
+def load_vgg16_features(weights_path=None, num_layers=9):
+    """First ``num_layers`` of VGG16's feature extractor, in eval mode.
+
+    Without ``weights_path`` the ImageNet weights are downloaded by
+    torchvision. Otherwise the file may hold either a full VGG16 state dict
+    (e.g. torchvision's ``vgg16-397923af.pth``) or one for just the
+    truncated feature layers.
+    """
+    from torchvision import models
+
+    if weights_path is None:
+        return models.vgg16(weights=models.VGG16_Weights.DEFAULT).features[:num_layers].eval()
+
+    state = torch.load(weights_path, map_location="cpu", weights_only=True)
+    if any(k.startswith("features.") for k in state):
+        vgg = models.vgg16(weights=None)
+        vgg.load_state_dict(state)
+        return vgg.features[:num_layers].eval()
+    features = models.vgg16(weights=None).features[:num_layers]
+    features.load_state_dict(state)
+    return features.eval()
+
+
+def extractor_fingerprint(extractor):
+    """Hash of a feature extractor's layers and weights (module path and name for plain functions)."""
+    if not isinstance(extractor, torch.nn.Module):
+        return hashlib.sha1(f"{extractor.__module__}.{extractor.__qualname__}".encode()).hexdigest()
+    digest = hashlib.sha1(repr(extractor).encode())
+    for name, tensor in extractor.state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().flatten().view(torch.uint8).numpy().tobytes())
+    return digest.hexdigest()
+
+
+class IndexedDataset(Dataset):
+    """Return ``(idx, sample)`` so the training loop knows which items it got."""
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        return idx, self.dataset[idx]
+
+
+class FeatureCache:
+    """fp16 target features keyed by dataset index.
+
+    In-memory mode holds at most ``max_bytes`` and evicts the least recently
+    used entries. With ``cache_dir`` the features go to a memory-mapped
+    ``.f16`` file instead, which holds every item and survives restarts; it
+    is recreated if ``image_size`` or ``fingerprint`` (e.g.
+    ``data_cache.source_fingerprint``) no longer match. Each extractor
+    (``extractor_fingerprint``) gets its own file, opened on the first
+    ``lookup``.
+    """
+    def __init__(self, num_items, image_size, max_bytes=1 << 30, cache_dir=None, fingerprint=""):
+        self.num_items = num_items
+        self.image_size = image_size
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self.extractor_id = None
+        self._disk = None
+        self._filled = None
+
+    def _paths(self):
+        stem = os.path.join(self.cache_dir, f"vgg_targets-{self.image_size}px-{self.extractor_id[:12]}")
+        return stem + ".f16", stem + ".filled", stem + ".json"
+
+    def _open_disk(self, feature_shape=None):
+        """Map an existing matching file, or create one once the feature shape is known.
+
+        Creating happens on the first write, which every rank reaches in its
+        first step: rank 0 creates the files, and after a barrier the other
+        ranks map them. Creating with mode "w+" on every rank would truncate
+        the files the other ranks are already writing to.
+        """
+        data_path, filled_path, meta_path = self._paths()
+        expected = {"image_size": self.image_size, "fingerprint": self.fingerprint, "num_items": self.num_items,
+                    "extractor": self.extractor_id}
+        if feature_shape is None:
+            meta = None
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            if meta is not None and all(meta.get(k) == v for k, v in expected.items()):
+                self._map((self.num_items, *meta["feature_shape"]), "r+")
+            return
+        if is_main_process():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._map((self.num_items, *feature_shape), "w+")
+            with open(meta_path, "w") as f:
+                json.dump({**expected, "feature_shape": list(feature_shape)}, f)
+        barrier()
+        if self._disk is None:
+            self._map((self.num_items, *feature_shape), "r+")
+
+    def _map(self, shape, mode):
+        data_path, filled_path, _ = self._paths()
+        self._disk = np.memmap(data_path, dtype=np.float16, mode=mode, shape=shape)
+        self._filled = np.memmap(filled_path, dtype=np.uint8, mode=mode, shape=(self.num_items,))
+
+    def _get(self, idx):
+        if self.cache_dir is not None:
+            if self._filled is not None and self._filled[idx]:
+                return torch.from_numpy(np.array(self._disk[idx]))
+            return None
+        feats = self._memory.get(idx)
+        if feats is not None:
+            self._memory.move_to_end(idx)
+        return feats
+
+    def _put(self, idx, feats):
+        if self.cache_dir is not None:
+            if self._disk is None:
+                self._open_disk(tuple(feats.shape))
+            self._disk[idx] = feats.numpy()
+            self._filled[idx] = 1
+            return
+        if idx in self._memory:
+            return
+        self._memory[idx] = feats
+        self._memory_bytes += feats.numel() * feats.element_size()
+        while self._memory_bytes > self.max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.numel() * evicted.element_size()
+
+    def lookup(self, indices, targets, extractor):
+        """Features for ``targets``, running ``extractor`` only on cache misses."""
+        if self.cache_dir is not None and self.extractor_id is None:
+            self.extractor_id = extractor_fingerprint(extractor)
+            self._open_disk()
+        indices = [int(i) for i in indices]
+        cached = [self._get(i) for i in indices]
+        missing = [j for j, feats in enumerate(cached) if feats is None]
+        self.hits += len(indices) - len(missing)
+        self.misses += len(missing)
+
+        computed = None
+        if missing:
+            with torch.no_grad():
+                computed = extractor(targets[missing])
+            for j, feats in zip(missing, computed.detach().to("cpu", torch.float16)):
+                self._put(indices[j], feats.clone())
+            if len(missing) == len(indices):
+                return computed
+
+        out = torch.empty(len(indices), *(computed if computed is not None else cached[0]).shape[-3:],
+                          dtype=targets.dtype, device=targets.device)
+        for j, feats in enumerate(cached):
+            if feats is not None:
+                out[j] = feats.to(targets.device, non_blocking=True)
+        if computed is not None:
+            out[missing] = computed.to(out.dtype)
+        return out
+
+    def summary(self):
+        """Hit rate since the last call."""
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0
+        self.hits = self.misses = 0
+        return f"feature cache hit rate {rate:.0f}%"
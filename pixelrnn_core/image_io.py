@@ -0,0 +1,120 @@
+"""Bounded-memory image decoding for uploads, datasets and batch tooling.
+
+Most callers immediately resize what they decode to 64, 128 or 350 pixels,
+so fully decoding a 50 MP photo first wastes hundreds of MB and most of the
+time. ``decode`` asks for only the resolution the caller needs:
+
+- JPEGs are decoded at 1/2 or 1/4 scale through ``Image.draft`` (the DCT
+  does the downscaling, the full-size bitmap is never allocated),
+- other formats are shrunk by an integer factor with a box filter before
+  any mode conversion, so there is at most one full-size copy,
+- in both cases at least ``REDUCING_GAP`` times the requested size is kept,
+  so the caller's final resample looks the same as from the full image.
+
+Paths that need the image's own resolution (tiled and ROI inference) pass
+no ``min_size``; they are still limited to ``max_pixels`` (``MAX_PIXELS``,
+overridable with ``PIXELRNN_MAX_PIXELS``), beyond which the image is decoded
+scaled down to fit: a JPEG at the largest DCT scale that fits, anything else
+resized after decoding.
+
+``to_tensor``/``to_pil`` are the torchvision ``ToTensor``/``ToPILImage``
+conversions for RGB images, so the serving path does not import torchvision.
+"""
+import io
+import math
+import os
+
+import numpy as np
+from PIL import Image
+
+MAX_PIXELS = int(os.environ.get("PIXELRNN_MAX_PIXELS", 24_000_000))
+REDUCING_GAP = 4.0
+MAX_DRAFT_SCALE = 4  # libjpeg's 1/8 scale keeps only each 8x8 block's DC term, which is visibly blocky
+
+
+def open_image(source):
+    """Lazily open a path, bytes or file-like object; pixels are not decoded yet."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+
+def fit_pixels(size, max_pixels):
+    """Largest (width, height) with the aspect ratio of ``size`` and at most ``max_pixels`` pixels."""
+    width, height = size
+    if width * height <= max_pixels:
+        return size
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _draft_scale(size, keep, max_pixels):
+    """JPEG DCT downscale (1, 2 or 4) for an image of ``size``.
+
+    Halves while the image is over ``max_pixels``, or while the next scale
+    still has at least ``keep`` pixels in each dimension.
+    """
+    scale = 1
+    while scale < MAX_DRAFT_SCALE:
+        over = (size[0] / scale) * (size[1] / scale) > max_pixels
+        if not over and (size[0] / (2 * scale) < keep[0] or size[1] / (2 * scale) < keep[1]):
+            break
+        scale *= 2
+    return scale
+
+
+def decode(source, min_size=None, max_pixels=None):
+    """Decode ``source`` to RGB at no more resolution than needed.
+
+    ``min_size`` is the (width, height) the caller will resize to; the
+    result keeps at least ``REDUCING_GAP`` times that. Without it the image
+    is returned at full resolution, scaled down to fit ``max_pixels`` if
+    larger. Returns ``(image, original_size)``.
+    """
+    max_pixels = MAX_PIXELS if max_pixels is None else max_pixels
+    with open_image(source) as img:
+        original_size = img.size
+        fit = fit_pixels(original_size, max_pixels)
+        keep = fit
+        if min_size is not None:
+            keep = tuple(min(math.ceil(m * REDUCING_GAP), f) for m, f in zip(min_size, fit))
+
+        if img.format == "JPEG":
+            scale = _draft_scale(original_size, keep, max_pixels)
+            if scale > 1:
+                # draft picks the scale as original // requested, so request the floor
+                img.draft("RGB", (original_size[0] // scale, original_size[1] // scale))
+        factor = min(img.size[0] // keep[0], img.size[1] // keep[1])
+        if factor > 1:
+            if img.mode not in ("RGB", "RGBA", "L", "LA", "CMYK"):  # e.g. palette PNGs
+                img = img.convert("RGB")
+            # A box filter to the exact 1/factor size; Image.reduce rounds the size
+            # up and so shifts the content by up to one reduced pixel.
+            img = img.resize((round(img.size[0] / factor), round(img.size[1] / factor)), Image.Resampling.BOX)
+        img = img.convert("RGB")
+
+    if img.size[0] * img.size[1] > max_pixels:
+        img = img.resize(fit_pixels(img.size, max_pixels), Image.Resampling.LANCZOS)
+    return img, original_size
+
+
+def load_resized(source, size):
+    """``(image resized to size with BILINEAR, original_size)``, the datasets' ``transforms.Resize``."""
+    img, original_size = decode(source, min_size=size)
+    return img.resize(size, Image.BILINEAR), original_size
+
+
+def to_tensor(image):
+    """RGB/L PIL image or uint8 array -> (C, H, W) float tensor in [0, 1], as ``ToTensor``."""
+    import torch
+
+    pixels = np.array(image, dtype=np.uint8, copy=True)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    return torch.from_numpy(pixels).permute(2, 0, 1).float().div_(255)
+
+
+def to_pil(tensor):
+    """(3, H, W) float tensor in [0, 1] -> RGB PIL image, as ``ToPILImage`` (truncating to uint8)."""
+    pixels = tensor.detach().cpu().mul(255).byte().permute(1, 2, 0).numpy()
+    return Image.fromarray(pixels, "RGB")
@@ -0,0 +1,86 @@
+"""Model registry: build a model by name and load its training checkpoint.
+
+``MODEL_SPECS`` maps each name to the module and class that define it
+(``pixelrnn_core.unet`` and ``pixelrnn_core.pixelrnn``, which import only
+torch), its input size and its default checkpoint. The module is imported
+on first use, so serving a model never imports the other one or the
+training scripts. ``register_model`` adds further entries.
+"""
+import importlib
+import itertools
+import os
+
+import torch
+
+from pixelrnn_core.weights import WEIGHTS_SUFFIX, load_weights
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODEL_SPECS = {
+    "unet": {"module": "pixelrnn_core.unet", "class": "PixelRNNishUNet",
+             "image_size": 128, "checkpoint": os.path.join("training1", "outputs", "pixelrnn_best_model.pth")},
+    "pixelrnn": {"module": "pixelrnn_core.pixelrnn", "class": "PixelRNN",
+                 "image_size": 64, "checkpoint": os.path.join("training2", "outputs_new", "pixelrnn_best_model.pth")},
+}
+
+
+def register_model(kind, module, class_name, image_size, checkpoint=None):
+    """Make ``kind`` buildable by ``build_model``/``load_model``; ``module`` is imported lazily."""
+    MODEL_SPECS[kind] = {"module": module, "class": class_name, "image_size": image_size,
+                         "checkpoint": checkpoint}
+
+
+def model_module(kind):
+    """Import the module that defines ``kind``."""
+    if kind not in MODEL_SPECS:
+        raise ValueError(f"Unknown model {kind!r}, expected one of {sorted(MODEL_SPECS)}")
+    return importlib.import_module(MODEL_SPECS[kind]["module"])
+
+
+def build_model(kind, **kwargs):
+    return getattr(model_module(kind), MODEL_SPECS[kind]["class"])(**kwargs)
+
+
+def _load_weights_file(kind, checkpoint_path, **kwargs):
+    state, ckpt = load_weights(checkpoint_path)
+    if ckpt.get("model", kind) != kind:
+        raise ValueError(f"{checkpoint_path} holds a {ckpt['model']!r} model, not {kind!r}")
+    # The model is built on the meta device, so nothing is allocated or
+    # randomly initialised, and the file's tensors (views into its mapping)
+    # are assigned as its parameters. fp16 files are cast to the model's
+    # fp32 here, which does copy them.
+    with torch.device("meta"):
+        model = build_model(kind, **kwargs)
+    current = model.state_dict()
+    model.load_state_dict({name: t.to(current[name].dtype) if name in current else t
+                           for name, t in state.items()}, assign=True)
+    if any(t.is_meta for t in itertools.chain(model.parameters(), model.buffers())):
+        raise ValueError(f"{checkpoint_path} does not hold every tensor of {kind!r}")
+    return model, ckpt
+
+
+def load_model(kind, checkpoint_path=None, device="cpu", **kwargs):
+    """Model in eval mode with weights from ``checkpoint_path`` (random init if None).
+
+    Returns ``(model, checkpoint)`` where ``checkpoint`` is the loaded dict
+    (or ``{}``), so callers can read ``epoch``/``val_loss``. int8
+    checkpoints from ``pixelrnn_core.quantization`` are rebuilt as quantized
+    models and always run on the CPU. ``.safetensors`` files from
+    ``pixelrnn_core.weights`` are memory-mapped instead of unpickled, and
+    their header metadata is returned as the checkpoint dict.
+    """
+    if checkpoint_path is not None and checkpoint_path.endswith(WEIGHTS_SUFFIX):
+        model, ckpt = _load_weights_file(kind, checkpoint_path, **kwargs)
+        return model.to(device).eval(), ckpt
+
+    model = build_model(kind, **kwargs)
+    ckpt = {}
+    if checkpoint_path is not None:
+        ckpt = torch.load(checkpoint_path, map_location="cpu", weights_only=False)
+        if ckpt.get("quantization"):
+            from pixelrnn_core.quantization import quantized_skeleton
+
+            model = quantized_skeleton(kind, model, MODEL_SPECS[kind]["image_size"])
+            device = "cpu"
+        model.load_state_dict(ckpt["model_state"])
+    return model.to(device).eval(), ckpt
@@ -0,0 +1,29 @@
+"""Training losses shared by both models."""
+import torch.nn as nn
+
+from pixelrnn_core.feature_cache import load_vgg16_features
+
+
+class PerceptualLoss(nn.Module):
+    """Feature-level similarity using pretrained VGG16.
+
+    weights_path loads VGG16 from a local file instead of downloading it.
+    With a feature_cache, pass the targets' dataset indices to forward() to
+    reuse their features instead of running VGG on them again.
+    """
+    def __init__(self, weights_path=None, feature_cache=None):
+        super().__init__()
+        vgg = load_vgg16_features(weights_path)
+        for param in vgg.parameters():
+            param.requires_grad = False
+        self.vgg = vgg
+        self.feature_cache = feature_cache
+        self.mse = nn.MSELoss()
+
+    def forward(self, pred, target, indices=None):
+        if self.feature_cache is not None and indices is not None:
+            target_features = self.feature_cache.lookup(indices, target, self.vgg)
+        else:
+            target_features = self.vgg(target)
+        # Reduce in fp32 even when VGG ran under bf16 autocast.
+        return self.mse(self.vgg(pred).float(), target_features.float())
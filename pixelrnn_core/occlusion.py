@@ -0,0 +1,124 @@
+"""Batched, seeded synthetic occlusion masks.
+
+Instead of reading a stored ``occluded_images/`` file for every original,
+the training loops can load originals only and occlude each collated batch
+on the fly. ``BatchOccluder`` draws one mask per image from three families,
+all generated with whole-batch tensor ops on the batch's device:
+
+- ``rectangle``: one to ``max_rectangles`` axis-aligned boxes
+- ``stroke``: free-form brush strokes built from random-walk line segments
+- ``blocks``: a coarse grid of randomly dropped square blocks
+
+Masks come from a dedicated ``torch.Generator``, so a given seed and call
+sequence always produces the same masks, independently of the global RNG.
+"""
+import torch
+
+
+class BatchOccluder:
+    """Occlude a (B, C, H, W) batch in [0, 1]; returns ``(masked, mask)``.
+
+    ``mask`` is (B, 1, H, W) float with 1 where pixels were replaced by
+    ``fill``.
+    """
+    MASK_TYPES = ("rectangle", "stroke", "blocks")
+
+    def __init__(self, mask_types=MASK_TYPES, fill=0.0, seed=0, max_rectangles=3,
+                 rect_size=(0.1, 0.4), strokes=2, stroke_vertices=5, stroke_width=(0.03, 0.1),
+                 block_size=0.125, block_prob=0.25):
+        unknown = set(mask_types) - set(self.MASK_TYPES)
+        if unknown or not mask_types:
+            raise ValueError(f"mask_types must be a non-empty subset of {self.MASK_TYPES}, got {mask_types}")
+        self.mask_types = tuple(mask_types)
+        self.fill = fill
+        self.seed = seed
+        self.max_rectangles = max_rectangles
+        self.rect_size = rect_size
+        self.strokes = strokes
+        self.stroke_vertices = stroke_vertices
+        self.stroke_width = stroke_width
+        self.block_size = block_size
+        self.block_prob = block_prob
+        self._generator = None
+
+    def _rng(self, device):
+        if self._generator is None or self._generator.device != torch.device(device):
+            self._generator = torch.Generator(device=device)
+            self._generator.manual_seed(self.seed)
+        return self._generator
+
+    def state_dict(self):
+        """Generator state, so a resumed run continues the same mask sequence."""
+        if self._generator is None:
+            return {"seed": self.seed, "device": None, "generator": None}
+        return {"seed": self.seed, "device": str(self._generator.device),
+                "generator": self._generator.get_state()}
+
+    def load_state_dict(self, state):
+        self.seed = state["seed"]
+        self._generator = None
+        if state["generator"] is not None:
+            self._rng(state["device"]).set_state(state["generator"])
+
+    def _uniform(self, shape, low, high, device):
+        return torch.rand(shape, generator=self._rng(device), device=device) * (high - low) + low
+
+    def rectangles(self, B, H, W, device):
+        R = self.max_rectangles
+        h = self._uniform((B, R, 1, 1), *self.rect_size, device) * H
+        w = self._uniform((B, R, 1, 1), *self.rect_size, device) * W
+        y0 = self._uniform((B, R, 1, 1), 0, 1, device) * (H - h)
+        x0 = self._uniform((B, R, 1, 1), 0, 1, device) * (W - w)
+        # Always keep the first box, keep each extra one with probability 1/2.
+        keep = self._uniform((B, R, 1, 1), 0, 1, device) < 0.5
+        keep[:, 0] = True
+
+        ys = torch.arange(H, device=device).view(1, 1, H, 1)
+        xs = torch.arange(W, device=device).view(1, 1, 1, W)
+        inside = (ys >= y0) & (ys < y0 + h) & (xs >= x0) & (xs < x0 + w) & keep
+        return inside.any(dim=1, keepdim=True)
+
+    def strokes_mask(self, B, H, W, device):
+        S, V = self.strokes, self.stroke_vertices
+        scale = float(max(H, W))
+        # Random walk: a start point plus V - 1 steps of random angle and length.
+        start = self._uniform((B, S, 1, 2), 0, 1, device) * torch.tensor([H, W], device=device)
+        angle = self._uniform((B, S, V - 1), 0, 2 * torch.pi, device)
+        length = self._uniform((B, S, V - 1), 0.05, 0.25, device) * scale
+        steps = torch.stack([torch.sin(angle), torch.cos(angle)], dim=-1) * length.unsqueeze(-1)
+        points = torch.cat([start, start + steps.cumsum(dim=2)], dim=2)
+        points[..., 0].clamp_(0, H - 1)
+        points[..., 1].clamp_(0, W - 1)
+
+        a = points[:, :, :-1].reshape(B, -1, 1, 1, 2)  # segment starts, (B, S*(V-1), 1, 1, 2)
+        ab = points[:, :, 1:].reshape(B, -1, 1, 1, 2) - a
+        grid = torch.stack(torch.meshgrid(torch.arange(H, device=device), torch.arange(W, device=device),
+                                          indexing="ij"), dim=-1).float()  # (H, W, 2)
+        ap = grid - a
+        t = ((ap * ab).sum(-1) / (ab * ab).sum(-1).clamp_min(1e-6)).clamp(0, 1)
+        dist = (ap - t.unsqueeze(-1) * ab).norm(dim=-1)  # (B, S*(V-1), H, W)
+
+        width = self._uniform((B, S, 1), *self.stroke_width, device) * scale
+        width = width.expand(B, S, V - 1).reshape(B, -1, 1, 1)
+        return (dist <= width / 2).any(dim=1, keepdim=True)
+
+    def blocks(self, B, H, W, device):
+        size = max(1, round(self.block_size * min(H, W)))
+        gh, gw = -(-H // size), -(-W // size)
+        cells = self._uniform((B, 1, gh, gw), 0, 1, device) < self.block_prob
+        return cells.repeat_interleave(size, dim=2).repeat_interleave(size, dim=3)[:, :, :H, :W]
+
+    def masks(self, B, H, W, device):
+        """Draw one (B, 1, H, W) float mask, each image using a random mask type."""
+        generators = {"rectangle": self.rectangles, "stroke": self.strokes_mask, "blocks": self.blocks}
+        choice = torch.randint(len(self.mask_types), (B, 1, 1, 1), generator=self._rng(device), device=device)
+        mask = torch.zeros(B, 1, H, W, dtype=torch.bool, device=device)
+        for i, name in enumerate(self.mask_types):
+            mask |= generators[name](B, H, W, device) & (choice == i)
+        return mask.float()
+
+    def __call__(self, images):
+        B, _, H, W = images.shape
+        mask = self.masks(B, H, W, images.device).to(images.dtype)
+        masked = images * (1 - mask) + self.fill * mask
+        return masked, mask
@@ -0,0 +1,83 @@
+"""Inference-time graph cleanup: BatchNorm folding, Dropout removal, channels-last.
+
+``optimize_for_inference`` returns an eval-only copy of a model in which
+
+- every Conv2d directly followed by a BatchNorm2d in an ``nn.Sequential``
+  (the ConvBlock stacks) becomes one Conv2d with the BN scale and shift
+  folded into its weight and bias,
+- Dropout layers are replaced by ``nn.Identity`` so they are not dispatched,
+- weights and inputs use the channels-last memory format,
+
+and optionally compiles it with ``torch.compile`` or traces and freezes it
+with TorchScript. A warmup forward at ``example_shape`` is run before
+returning, so the first real request does not pay for compilation.
+"""
+import copy
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+MODES = ("eager", "compile", "freeze")
+
+
+def fold_batchnorm(module):
+    """Fold Conv2d -> BatchNorm2d pairs inside every nn.Sequential (in place, eval mode)."""
+    for child in module.children():
+        fold_batchnorm(child)
+    if isinstance(module, nn.Sequential):
+        layers = list(module)
+        for i in range(len(layers) - 1):
+            if isinstance(layers[i], nn.Conv2d) and isinstance(layers[i + 1], nn.BatchNorm2d):
+                module[i] = fuse_conv_bn_eval(layers[i], layers[i + 1])
+                module[i + 1] = nn.Identity()
+    return module
+
+
+def strip_dropout(module):
+    """Replace every Dropout layer with nn.Identity (in place)."""
+    for name, child in module.named_children():
+        if isinstance(child, nn.modules.dropout._DropoutNd):
+            setattr(module, name, nn.Identity())
+        else:
+            strip_dropout(child)
+    return module
+
+
+class ChannelsLast(nn.Module):
+    """Run ``model`` on a channels-last copy of the input."""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+
+def optimize_for_inference(model, channels_last=True, mode="eager", example_shape=None, warmup_iters=2):
+    """Folded, Dropout-free, optionally compiled/frozen copy of ``model`` for inference.
+
+    ``example_shape`` (e.g. ``(1, 3, 128, 128)``) is required for
+    ``mode="freeze"`` (tracing input) and enables the warmup in every mode.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+    device = next(model.parameters()).device
+    model = strip_dropout(fold_batchnorm(copy.deepcopy(model).eval()))
+    if channels_last:
+        model = ChannelsLast(model.to(memory_format=torch.channels_last)).eval()
+
+    example = None if example_shape is None else torch.rand(*example_shape, device=device)
+    if mode == "compile":
+        model = torch.compile(model)
+    elif mode == "freeze":
+        if example is None:
+            raise ValueError("mode='freeze' needs example_shape to trace the model")
+        with torch.no_grad():
+            model = torch.jit.freeze(torch.jit.trace(model, example))
+
+    if example is not None:
+        with torch.no_grad():
+            for _ in range(warmup_iters):
+                model(example)
+    return model
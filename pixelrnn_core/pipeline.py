@@ -0,0 +1,153 @@
+"""Parallel, prefetching input pipeline for the training loops.
+
+``build_loader`` configures DataLoader worker processes (persistent, pinned,
+with a prefetch depth) and caps each worker's torch thread pool so decoding
+does not oversubscribe the cores the model runs on. Given a ``seed``, it
+draws the shuffle order and the worker seeds from generators of its own,
+which checkpoints save and restore apart from the global RNG. ``BackgroundPrefetcher``
+pulls batches from the loader on a background thread, so collation and the
+host-to-device copy overlap the training step. ``PipelineTimer`` splits each
+epoch into time spent waiting on data and time spent computing.
+"""
+import queue
+import threading
+import time
+from functools import partial
+
+import torch
+from torch.utils.data import DataLoader, RandomSampler
+
+
+def _init_worker(num_threads, worker_id):
+    torch.set_num_threads(num_threads)
+
+
+def build_loader(dataset, batch_size, shuffle=False, num_workers=0, pin_memory=False,
+                 persistent_workers=True, prefetch_factor=2, worker_threads=1, seed=None, **kwargs):
+    """DataLoader with the worker settings above; extra kwargs go to DataLoader."""
+    if seed is not None:
+        kwargs["generator"] = torch.Generator().manual_seed(seed)
+        if shuffle:
+            # Persistent workers draw their base seed from the loader's generator only on the first
+            # epoch, so the shuffle gets its own generator to stay in step across a resume
+            kwargs["sampler"] = RandomSampler(dataset, generator=torch.Generator().manual_seed(seed + 1))
+            shuffle = False
+    if num_workers > 0:
+        kwargs.update(
+            persistent_workers=persistent_workers,
+            prefetch_factor=prefetch_factor,
+            worker_init_fn=partial(_init_worker, worker_threads),
+        )
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
+                      pin_memory=pin_memory, **kwargs)
+
+
+def _to_device(batch, device, non_blocking):
+    if isinstance(batch, torch.Tensor):
+        return batch.to(device, non_blocking=non_blocking)
+    if isinstance(batch, (list, tuple)):
+        return type(batch)(_to_device(b, device, non_blocking) for b in batch)
+    return batch
+
+
+class BackgroundPrefetcher:
+    """Iterate ``loader`` on a daemon thread, keeping up to ``depth`` batches ready.
+
+    Tensors are moved to ``device`` on the background thread (non-blocking
+    when the loader pins memory). Exceptions raised while loading are
+    re-raised from the consuming loop.
+    """
+    _DONE = object()
+
+    def __init__(self, loader, device=None, depth=2):
+        self.loader = loader
+        self.device = device
+        self.depth = depth
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=self.depth)
+        stop = threading.Event()
+        non_blocking = getattr(self.loader, "pin_memory", False)
+
+        def put(item):
+            # Give up once the consumer has gone away instead of blocking forever.
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for batch in self.loader:
+                    if self.device is not None:
+                        batch = _to_device(batch, self.device, non_blocking)
+                    if not put(batch):
+                        return
+                put(self._DONE)
+            except Exception as e:  # surfaced on the training thread
+                put(e)
+
+        thread = threading.Thread(target=produce, name="batch-prefetcher", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is self._DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            thread.join()
+
+
+class PipelineTimer:
+    """Accumulate per-epoch data-wait and compute time around a batch iterator.
+
+    Wrap the iterator with ``wrap``; time spent inside ``next()`` counts as
+    data wait, the rest of each iteration as compute. On CUDA the device is
+    synchronised at each boundary so queued kernels are not billed to data.
+    """
+    def __init__(self, device=None):
+        self.sync = device is not None and torch.device(device).type == "cuda"
+        self.reset()
+
+    def reset(self):
+        self.data_time = 0.0
+        self.compute_time = 0.0
+        self.steps = 0
+
+    def _now(self):
+        if self.sync:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def wrap(self, batches):
+        iterator = iter(batches)
+        while True:
+            start = self._now()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            fetched = time.perf_counter()
+            self.data_time += fetched - start
+            yield batch
+            self.compute_time += self._now() - fetched
+            self.steps += 1
+
+    @property
+    def data_fraction(self):
+        total = self.data_time + self.compute_time
+        return self.data_time / total if total else 0.0
+
+    def summary(self):
+        return (f"data wait {self.data_time:.1f}s ({100 * self.data_fraction:.0f}%) | "
+                f"compute {self.compute_time:.1f}s")
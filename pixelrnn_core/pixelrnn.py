@@ -0,0 +1,201 @@
+"""The RowLSTM PixelRNN trained by ``training2/pixelrnn.py``.
+
+Imports only torch, so apps and tools can build the model without pulling
+in the training script's dependencies.
+"""
+import torch
+import torch.nn as nn
+from torch.utils.checkpoint import checkpoint
+
+
+class FusedLSTMCell(torch.autograd.Function):
+    """LSTM cell update with a hand-written backward.
+
+    Takes the pre-activation gates (B, 4 * hidden, ...) laid out as
+    [i, f, o, g] and the previous cell state, and returns (h, c). The three
+    sigmoid gates are contiguous, so the forward is one sigmoid and one tanh
+    over the gates plus the cell update, and backward only keeps the
+    activated gates, the previous cell state and tanh(c) alive.
+    """
+    @staticmethod
+    def forward(ctx, gates, c_prev):
+        hidden = c_prev.shape[1]
+        sig = torch.sigmoid(gates[:, :3 * hidden])
+        g_gate = torch.tanh(gates[:, 3 * hidden:])
+        i_gate, f_gate, o_gate = sig.chunk(3, dim=1)
+
+        c_t = torch.addcmul(f_gate * c_prev, i_gate, g_gate)
+        tanh_c = torch.tanh(c_t)
+        h_t = o_gate * tanh_c
+
+        ctx.save_for_backward(sig, g_gate, c_prev, tanh_c)
+        return h_t, c_t
+
+    @staticmethod
+    @torch.autograd.function.once_differentiable
+    def backward(ctx, grad_h, grad_c):
+        sig, g_gate, c_prev, tanh_c = ctx.saved_tensors
+        hidden = c_prev.shape[1]
+        i_gate, f_gate, o_gate = sig.chunk(3, dim=1)
+
+        # dL/dc_t collects the direct cell-state gradient and the path through h_t.
+        grad_c = grad_c + torch.ops.aten.tanh_backward(grad_h * o_gate, tanh_c)
+
+        grad_gates = grad_c.new_empty(sig.shape[0], 4 * hidden, *sig.shape[2:])
+        grad_sig = grad_gates[:, :3 * hidden]
+        torch.mul(grad_c, g_gate, out=grad_gates[:, :hidden])
+        torch.mul(grad_c, c_prev, out=grad_gates[:, hidden:2 * hidden])
+        torch.mul(grad_h, tanh_c, out=grad_gates[:, 2 * hidden:3 * hidden])
+        torch.ops.aten.sigmoid_backward.grad_input(grad_sig, sig, grad_input=grad_sig)
+        torch.ops.aten.tanh_backward.grad_input(grad_c * i_gate, g_gate,
+                                                grad_input=grad_gates[:, 3 * hidden:])
+
+        return grad_gates, grad_c * f_gate
+
+
+class RowLSTM(nn.Module):
+    """RowLSTM used in PixelRNN to model pixel dependencies across rows.
+
+    This implementation processes the feature map row-by-row (height dimension).
+    Shapes:
+      x: (B, C, H, W)
+      returns: (B, hidden_dim, H, W)
+
+    engine="fast" computes the input-to-state gates for the whole feature map
+    in a single convolution and only runs the hidden-to-state recurrence per
+    row, writing into a preallocated output when gradients are off.
+    engine="reference" is the original row-at-a-time loop. Both use the same
+    parameters, so checkpoints load into either.
+
+    fused_cell=True runs the gate activations and cell update through
+    FusedLSTMCell, which dispatches fewer ops per row and keeps fewer
+    tensors alive for backward.
+
+    checkpoint_chunk=N (fast engine only) splits the rows into chunks of N
+    during training and stores only the (h, c) states at chunk boundaries.
+    Each chunk is recomputed during backward, so activation memory grows
+    with N instead of H at the cost of roughly one extra forward pass.
+    """
+    ENGINES = ("fast", "reference")
+
+    def __init__(self, input_dim, hidden_dim, engine="fast", fused_cell=False, checkpoint_chunk=None):
+        super().__init__()
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown RowLSTM engine {engine!r}, expected one of {self.ENGINES}")
+        self.input_conv = nn.Conv2d(input_dim, 4 * hidden_dim, kernel_size=1)
+        self.hidden_conv = nn.Conv2d(hidden_dim, 4 * hidden_dim, kernel_size=1)
+        self.hidden_dim = hidden_dim
+        self.engine = engine
+        self.fused_cell = fused_cell
+        self.checkpoint_chunk = checkpoint_chunk
+
+    def forward(self, x):
+        if self.engine == "reference":
+            return self._forward_reference(x)
+        return self._forward_fast(x)
+
+    def _cell(self, gates, c_t):
+        # Gates may come out of the convolutions in bf16; the cell update
+        # runs in the cell state's precision.
+        gates = gates.to(c_t.dtype)
+        if self.fused_cell:
+            return FusedLSTMCell.apply(gates, c_t)
+
+        i_gate, f_gate, o_gate, g_gate = gates.chunk(4, dim=1)
+
+        i_gate = torch.sigmoid(i_gate)
+        f_gate = torch.sigmoid(f_gate)
+        o_gate = torch.sigmoid(o_gate)
+        g_gate = torch.tanh(g_gate)
+
+        c_t = f_gate * c_t + i_gate * g_gate
+        h_t = o_gate * torch.tanh(c_t)
+        return h_t, c_t
+
+    def _forward_fast(self, x):
+        B, C, H, W = x.shape
+
+        # Under bf16 autocast x is bf16, but the recurrent state stays fp32.
+        state_dtype = torch.promote_types(x.dtype, torch.float32)
+        h_t = x.new_zeros(B, self.hidden_dim, 1, W, dtype=state_dtype)
+        c_t = x.new_zeros(B, self.hidden_dim, 1, W, dtype=state_dtype)
+
+        if self.checkpoint_chunk and torch.is_grad_enabled():
+            # Only the (h, c) states at chunk boundaries are kept for
+            # backward; each chunk's gates and states are recomputed.
+            outputs = []
+            for x_chunk in x.split(self.checkpoint_chunk, dim=2):
+                out, h_t, c_t = checkpoint(self._run_rows, x_chunk, h_t, c_t, use_reentrant=False)
+                outputs.append(out)
+            return torch.cat(outputs, dim=2)
+
+        return self._run_rows(x, h_t, c_t)[0]
+
+    def _run_rows(self, x, h_t, c_t):
+        """Run the recurrence over every row of x from state (h_t, c_t)."""
+        B, C, H, W = x.shape
+
+        # The input projection does not depend on the recurrent state.
+        x_gates = self.input_conv(x).split(1, dim=2)
+
+        # Under autograd, writing rows into a shared buffer (or slicing rows
+        # out of x_gates) makes backward copy the whole map once per row, so
+        # the buffer is only used for eager inference. ONNX export traces
+        # each row write as a full-map scatter, so it takes the cat path too.
+        use_buffer = not torch.is_grad_enabled() and not torch.onnx.is_in_onnx_export()
+        out = c_t.new_empty(B, self.hidden_dim, H, W) if use_buffer else None
+        outputs = []
+        for i, x_t in enumerate(x_gates):
+            gates = x_t + self.hidden_conv(h_t)
+            h_t, c_t = self._cell(gates, c_t)
+            if out is None:
+                outputs.append(h_t)
+            else:
+                out[:, :, i:i + 1, :] = h_t
+
+        return (torch.cat(outputs, dim=2) if out is None else out), h_t, c_t
+
+    def _forward_reference(self, x):
+        B, C, H, W = x.shape
+
+        state_dtype = torch.promote_types(x.dtype, torch.float32)
+        h_t = torch.zeros(B, self.hidden_dim, 1, W, device=x.device, dtype=state_dtype)
+        c_t = torch.zeros(B, self.hidden_dim, 1, W, device=x.device, dtype=state_dtype)
+
+        outputs = []
+        for i in range(H):
+            x_t = x[:, :, i, :].unsqueeze(2)
+
+            gates = self.input_conv(x_t) + self.hidden_conv(h_t)
+            h_t, c_t = self._cell(gates, c_t)
+
+            outputs.append(h_t)
+
+        return torch.cat(outputs, dim=2)
+
+
+class PixelRNN(nn.Module):
+    def __init__(self, input_channels=3, hidden_dim=128, n_layers=2, engine="fast", fused_cell=False,
+                 checkpoint_chunk=None):
+        super().__init__()
+
+        self.input_conv = nn.Conv2d(input_channels, hidden_dim, kernel_size=7, padding=3)
+
+        self.rnn_layers = nn.ModuleList([RowLSTM(hidden_dim, hidden_dim, engine, fused_cell, checkpoint_chunk)
+                                         for _ in range(n_layers)])
+
+        self.output_conv = nn.Sequential(
+            nn.ReLU(inplace=True),
+            nn.Conv2d(hidden_dim, 3, kernel_size=1),
+            nn.Sigmoid()
+        )
+
+    def forward(self, x):
+        out = self.input_conv(x)
+        for rnn in self.rnn_layers:
+            out = rnn(out)
+        out = self.output_conv[:-1](out)
+        # Sigmoid in fp32 so bf16 autocast does not quantise the reconstruction.
+        out = self.output_conv[-1](out.float())
+        return out
+
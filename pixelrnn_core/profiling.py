@@ -0,0 +1,249 @@
+"""Opt-in per-module forward/backward timing with Chrome trace export.
+
+``ModuleProfiler`` hooks every named submodule of the models it is given
+(``enc1``, ``center``, ``up``, ``rnn_layers.0.hidden_conv``, the VGG layers
+of ``PerceptualLoss`` ...). It times each forward and backward call and
+records the size of each forward output. Totals are aggregated per module
+across steps; call ``step()`` once per training step or inference batch.
+Times include submodules, so ``enc1`` contains ``enc1.conv.0``. A module
+that is called several times per step, such as the shared ``pool``/``up``
+or RowLSTM's per-row ``hidden_conv``, sums all of its calls.
+
+Steps ``[start, stop)`` of ``window`` are also written to ``trace_path`` as
+a Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev). The
+trace has one complete event per module call, nested by module, with
+forward and backward calls on separate threads.
+
+While attached, ``inplace`` is switched off on modules that have it
+(ReLU, Dropout), because full backward hooks cannot wrap tensors that are
+then modified in place. ``detach`` restores it. Under ConvBlock
+checkpointing the recomputed forward shows up as a second forward call of
+the block's layers. Backward time is measured from a module's output
+gradient to its input gradient, so a module whose inputs need no gradient
+(the model itself, its first layer) shows almost none.
+
+The training scripts and ``TorchBackend`` (apps, server, batch_infer) build
+one with ``profiler_from_env``, so profiling needs no code changes:
+
+- ``PIXELRNN_PROFILE=1`` turns it on,
+- ``PIXELRNN_PROFILE_TRACE=trace.json`` also writes a trace,
+- ``PIXELRNN_PROFILE_WINDOW=5:10`` picks the traced steps (default ``2:5``),
+- ``PIXELRNN_PROFILE_TOP=20`` sets how many modules the summary lists.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import warnings
+from collections import defaultdict
+
+import torch
+
+DEFAULT_WINDOW = (2, 5)
+DEFAULT_TOP = 20
+
+
+def _tensor_bytes(value):
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (list, tuple)):
+        return sum(_tensor_bytes(v) for v in value)
+    return 0
+
+
+class _Stats:
+    __slots__ = ("calls", "forward", "backward", "out_bytes", "alloc_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.forward = 0.0
+        self.backward = 0.0
+        self.out_bytes = 0
+        self.alloc_bytes = 0
+
+
+class ModuleProfiler:
+    """Forward/backward hooks on every submodule of the attached models.
+
+    ``device`` only matters on CUDA, where each hook synchronises so kernel
+    time is billed to the module that launched it, and where the allocator's
+    growth over each forward is recorded as well.
+    """
+    def __init__(self, device=None, trace_path=None, window=DEFAULT_WINDOW, top=DEFAULT_TOP):
+        self.cuda = device is not None and torch.device(device).type == "cuda"
+        self.trace_path = trace_path
+        self.window = window
+        self.top = top
+        self.stats = defaultdict(_Stats)
+        self.steps = 0  # since construction; the trace window counts these
+        self.counted = 0  # since the last reset; the totals cover these
+        self.step_time = 0.0
+        self._step_start = time.perf_counter()
+        self._handles = []
+        self._inplace = []
+        self._open = {}
+        self._events = []
+        self._threads = {}
+        self._closed = False
+        self._epoch = time.perf_counter()
+
+    # Hooks
+    def _now(self):
+        if self.cuda:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def _tracing(self):
+        return self.trace_path is not None and self.window[0] <= self.steps < self.window[1]
+
+    def _begin(self, key, name, phase):
+        alloc = torch.cuda.memory_allocated() if self.cuda and phase == "forward" else 0
+        self._open.setdefault(key, []).append((self._now(), alloc))
+
+    def _end(self, key, name, phase, output=None):
+        end = self._now()
+        if not self._open.get(key):
+            return  # a backward hook whose pre-hook never fired (no input needed a gradient)
+        start, alloc = self._open[key].pop()
+        stats = self.stats[name]
+        if phase == "forward":
+            stats.calls += 1
+            stats.forward += end - start
+            stats.out_bytes += _tensor_bytes(output)
+            if self.cuda:
+                stats.alloc_bytes += torch.cuda.memory_allocated() - alloc
+        else:
+            stats.backward += end - start
+        if self._tracing():
+            tid = self._threads.setdefault((threading.get_ident(), phase), len(self._threads) + 1)
+            self._events.append({
+                "name": name, "cat": phase, "ph": "X", "pid": os.getpid(), "tid": tid,
+                "ts": (start - self._epoch) * 1e6, "dur": (end - start) * 1e6,
+                "args": {"step": self.steps, **({"out_mb": _tensor_bytes(output) / 2**20} if output is not None else {})},
+            })
+
+    def attach(self, model, prefix=""):
+        """Hook ``model`` and all of its submodules; names are prefixed with ``prefix``."""
+        if isinstance(model, torch.jit.ScriptModule):
+            raise TypeError("TorchScript modules cannot be hooked; profile the eager model")
+        # Expected for modules whose inputs need no gradient; see the module docstring.
+        warnings.filterwarnings("ignore", message="Full backward hook is firing when gradients are computed with "
+                                "respect to module outputs")
+        for name, module in model.named_modules():
+            name = ".".join(p for p in (prefix, name) if p) or type(model).__name__
+            if getattr(module, "inplace", False) is True:
+                module.inplace = False
+                self._inplace.append(module)
+            fwd, bwd = (id(module), "forward"), (id(module), "backward")
+            self._handles += [
+                module.register_forward_pre_hook(lambda m, args, k=fwd, n=name: self._begin(k, n, "forward")),
+                module.register_forward_hook(lambda m, args, out, k=fwd, n=name: self._end(k, n, "forward", out)),
+                module.register_full_backward_pre_hook(
+                    lambda m, grad_out, k=bwd, n=name: self._begin(k, n, "backward")),
+                module.register_full_backward_hook(
+                    lambda m, grad_in, grad_out, k=bwd, n=name: self._end(k, n, "backward")),
+            ]
+        return model
+
+    def detach(self):
+        """Remove every hook and restore ``inplace``."""
+        for handle in self._handles:
+            handle.remove()
+        for module in self._inplace:
+            module.inplace = True
+        self._handles, self._inplace = [], []
+
+    # Steps and reporting
+    def begin(self):
+        """Mark the start of a step; otherwise a step starts where the previous one ended."""
+        self._step_start = self._now()
+
+    def step(self):
+        """Mark the end of a training step or inference batch."""
+        now = self._now()
+        if self._tracing():
+            self._events.append({"name": f"step {self.steps}", "cat": "step", "ph": "X", "pid": os.getpid(),
+                                 "tid": 0, "ts": (self._step_start - self._epoch) * 1e6,
+                                 "dur": (now - self._step_start) * 1e6})
+        self.step_time += now - self._step_start
+        self.steps += 1
+        self.counted += 1
+        # Checkpoint recomputation stops as soon as it has what backward needs,
+        # leaving the remaining forward hooks of the block unfired.
+        self._open.clear()
+        if self.trace_path is not None and self.steps == self.window[1]:
+            self.write_trace()
+        self._step_start = self._now()
+
+    def write_trace(self):
+        """Write the events recorded so far to ``trace_path``."""
+        if not self._events:
+            return
+        main = threading.main_thread().ident
+        names = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                  "args": {"name": phase if ident == main else f"{phase} (thread {ident})"}}
+                 for (ident, phase), tid in self._threads.items()]
+        names.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": 0, "args": {"name": "steps"}})
+        with open(self.trace_path, "w") as f:
+            json.dump({"traceEvents": names + self._events, "displayTimeUnit": "ms"}, f)
+        print(f"Wrote profiler trace of steps {self.window[0]}-{self.window[1] - 1} to {self.trace_path}")
+        self._events = []
+
+    def report(self):
+        """Per-module totals per step, most expensive first."""
+        steps = max(self.counted, 1)
+        rows = [{"module": name, "calls": s.calls / steps, "forward_ms": 1000 * s.forward / steps,
+                 "backward_ms": 1000 * s.backward / steps, "out_mb": s.out_bytes / steps / 2**20,
+                 **({"alloc_mb": s.alloc_bytes / steps / 2**20} if self.cuda else {})}
+                for name, s in self.stats.items()]
+        return sorted(rows, key=lambda r: r["forward_ms"] + r["backward_ms"], reverse=True)
+
+    def summary(self, top=None):
+        top = self.top if top is None else top
+        step_ms = 1000 * self.step_time / max(self.counted, 1)
+        lines = [f"Module profile over {self.counted} steps ({step_ms:.1f} ms/step, times include submodules):",
+                 f"{'module':<40} {'calls':>6} {'fwd ms':>9} {'bwd ms':>9} {'% step':>7} {'out MB':>8}"]
+        for r in self.report()[:top]:
+            share = 100 * (r["forward_ms"] + r["backward_ms"]) / step_ms if step_ms else 0.0
+            lines.append(f"{r['module']:<40} {r['calls']:>6.0f} {r['forward_ms']:>9.2f} {r['backward_ms']:>9.2f} "
+                         f"{share:>6.1f}% {r['out_mb']:>8.1f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        """Clear the totals, e.g. after warm-up or to report each epoch separately."""
+        self.stats.clear()
+        self.counted = 0
+        self.step_time = 0.0
+        self._step_start = self._now()
+
+    def close(self):
+        """Write any pending trace, print the summary of unreported steps and remove the hooks (once)."""
+        if self._closed:
+            return
+        self._closed = True
+        self.write_trace()
+        if self.counted:
+            print(self.summary())
+        self.detach()
+
+
+def profiler_from_env(device=None, **models):
+    """A ``ModuleProfiler`` attached to ``models`` (name -> module) if ``PIXELRNN_PROFILE=1``, else None.
+
+    The profiler closes itself at exit, so short-lived processes still get
+    their summary and trace.
+    """
+    if os.environ.get("PIXELRNN_PROFILE", "0") != "1":
+        return None
+    start, stop = (int(v) for v in os.environ.get("PIXELRNN_PROFILE_WINDOW",
+                                                  "%d:%d" % DEFAULT_WINDOW).split(":"))
+    profiler = ModuleProfiler(device, os.environ.get("PIXELRNN_PROFILE_TRACE"), (start, stop),
+                              int(os.environ.get("PIXELRNN_PROFILE_TOP", DEFAULT_TOP)))
+    for prefix, model in models.items():
+        if isinstance(model, torch.jit.ScriptModule):
+            print(f"Profiler: {prefix} is a TorchScript module and is not profiled; run it eagerly (optimize off)")
+            continue
+        profiler.attach(model, prefix)
+    atexit.register(profiler.close)
+    return profiler
@@ -0,0 +1,12 @@
+"""Reconstruction quality metrics for images in [0, 1]."""
+import torch
+
+
+def mse(pred, target):
+    """Per-image mean squared error, shape (B,)."""
+    return (pred.float() - target.float()).square().flatten(1).mean(dim=1)
+
+
+def psnr(pred, target, max_val=1.0, eps=1e-10):
+    """Per-image PSNR in dB, shape (B,)."""
+    return 10 * torch.log10(max_val ** 2 / (mse(pred, target) + eps))
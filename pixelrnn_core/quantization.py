@@ -0,0 +1,141 @@
+"""Post-training int8 quantization for CPU serving.
+
+    python -m pixelrnn_core.quantization --model unet --data-root dataset_A2 --calibration-images 64
+    python -m pixelrnn_core.quantization --model pixelrnn
+
+- U-Net: static int8. Each ConvBlock's Conv-BN-ReLU pairs are fused (BN
+  folded into the conv) and run as quantized ConvReLU2d between a
+  quantize/dequantize pair; activation ranges come from calibration images
+  out of ``<data-root>/train/occluded_images``. Pooling, upsampling, skip
+  concatenation and the final 1x1 conv + sigmoid stay fp32.
+- PixelRNN: dynamic int8 for RowLSTM's 1x1 gate convolutions. They are
+  re-expressed as ``nn.Linear`` over channels (``Conv1x1Linear``), which is
+  what ``quantize_dynamic`` supports; weights are int8 and activations are
+  quantized per call.
+
+The saved checkpoint is a normal ``{"model_state", "epoch", "val_loss"}``
+dict plus a ``"quantization"`` entry; ``pixelrnn_core.loading.load_model``
+recognises it and rebuilds the quantized modules before loading, so the apps
+can point at an ``*_int8.pth`` file directly. Quantized models run on CPU.
+"""
+import argparse
+import os
+
+import torch
+import torch.nn as nn
+from torch.ao import quantization as tq
+
+
+class Conv1x1Linear(nn.Module):
+    """A 1x1 Conv2d computed as ``nn.Linear`` over the channel dimension."""
+    def __init__(self, in_channels, out_channels):
+        super().__init__()
+        self.linear = nn.Linear(in_channels, out_channels)
+
+    @classmethod
+    def from_conv(cls, conv):
+        module = cls(conv.in_channels, conv.out_channels)
+        module.linear.weight.data.copy_(conv.weight.data.flatten(1))
+        module.linear.bias.data.copy_(conv.bias.data)
+        return module
+
+    def forward(self, x):
+        return self.linear(x.permute(0, 2, 3, 1)).permute(0, 3, 1, 2)
+
+
+def _engine():
+    engines = torch.backends.quantized.supported_engines
+    engine = "x86" if "x86" in engines else "fbgemm" if "fbgemm" in engines else "qnnpack"
+    torch.backends.quantized.engine = engine
+    return engine
+
+
+def _prepare_unet(model):
+    """Fuse and wrap every ConvBlock stack, then insert observers (in place)."""
+    from pixelrnn_core.unet import ConvBlock
+
+    qconfig = tq.get_default_qconfig(_engine())
+    model.eval()
+    for block in model.modules():
+        if isinstance(block, ConvBlock):
+            tq.fuse_modules(block.conv, [["0", "1", "2"], ["3", "4", "5"]], inplace=True)
+            block.conv = nn.Sequential(tq.QuantStub(), block.conv, tq.DeQuantStub())
+            block.conv.qconfig = qconfig
+    return tq.prepare(model, inplace=True)
+
+
+def quantize_unet(model, calibration_batches):
+    """Static int8 PixelRNNishUNet calibrated on an iterable of input batches."""
+    model = _prepare_unet(model)
+    with torch.no_grad():
+        for batch in calibration_batches:
+            model(batch)
+    return tq.convert(model, inplace=True)
+
+
+def quantize_pixelrnn(model):
+    """Dynamic int8 for the RowLSTM gate convolutions of a PixelRNN."""
+    _engine()
+    model.eval()
+    for rnn in model.rnn_layers:
+        rnn.input_conv = Conv1x1Linear.from_conv(rnn.input_conv)
+        rnn.hidden_conv = Conv1x1Linear.from_conv(rnn.hidden_conv)
+    return tq.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def quantized_skeleton(kind, model, image_size):
+    """Apply the quantization transforms to a freshly built model so a
+    quantized ``model_state`` can be loaded into it."""
+    if kind == "unet":
+        # One dummy batch gives the observers finite ranges; the real
+        # scales and zero points come from the loaded state dict.
+        return quantize_unet(model, [torch.rand(1, 3, image_size, image_size)])
+    return quantize_pixelrnn(model)
+
+
+def _calibration_batches(data_root, image_size, num_images, batch_size):
+    from pixelrnn_core.image_io import load_resized, to_tensor
+
+    image_dir = os.path.join(data_root, "train", "occluded_images")
+    names = sorted(os.listdir(image_dir))
+    step = max(1, len(names) // num_images)
+    paths = [os.path.join(image_dir, n) for n in names[::step][:num_images]]
+    images = torch.stack([to_tensor(load_resized(p, (image_size, image_size))[0]) for p in paths])
+    return list(images.split(batch_size))
+
+
+def main():
+    from pixelrnn_core.loading import MODEL_SPECS, ROOT, load_model
+
+    parser = argparse.ArgumentParser(description="Quantize a pixelrnn_best_model.pth checkpoint to int8.")
+    parser.add_argument("--model", choices=sorted(MODEL_SPECS), default="unet")
+    parser.add_argument("--checkpoint", default=None, help="Defaults to the model's pixelrnn_best_model.pth.")
+    parser.add_argument("--output", default=None, help="Defaults to <checkpoint>_int8.pth.")
+    parser.add_argument("--data-root", default="dataset_A2", help="Calibration images for the U-Net.")
+    parser.add_argument("--calibration-images", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    spec = MODEL_SPECS[args.model]
+    checkpoint = args.checkpoint or os.path.join(ROOT, spec["checkpoint"])
+    output = args.output or os.path.splitext(checkpoint)[0] + "_int8.pth"
+    model, ckpt = load_model(args.model, checkpoint)
+
+    if args.model == "unet":
+        batches = _calibration_batches(args.data_root, spec["image_size"], args.calibration_images,
+                                       args.batch_size)
+        model = quantize_unet(model, batches)
+        scheme = {"scheme": "static", "engine": torch.backends.quantized.engine,
+                  "calibration_images": sum(len(b) for b in batches)}
+    else:
+        model = quantize_pixelrnn(model)
+        scheme = {"scheme": "dynamic", "engine": torch.backends.quantized.engine}
+
+    torch.save({"model_state": model.state_dict(), "epoch": ckpt.get("epoch"), "val_loss": ckpt.get("val_loss"),
+                "quantization": scheme}, output)
+    print(f"Saved {scheme['scheme']} int8 {args.model} to {output} "
+          f"({os.path.getsize(output) / 2**20:.1f} MB, fp32 {os.path.getsize(checkpoint) / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
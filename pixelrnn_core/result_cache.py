@@ -0,0 +1,156 @@
+"""Per-upload result cache for the Streamlit apps.
+
+Streamlit reruns the whole script on every widget interaction, including
+each click on a download button. ``ResultCache`` keeps the reconstruction of
+recent uploads keyed by the SHA-256 of the uploaded bytes plus the model's
+identity (checkpoint path, size and mtime, or the inference server's
+checkpoint), so a rerun on the same image skips decoding and inference.
+``Reconstruction`` encodes each download PNG the first time it is asked for
+and reuses the bytes afterwards. Where Streamlit takes a callable for a
+download button's data, that first time is the click, so an upload whose
+downloads are never clicked never pays for the full-resolution encode. The
+cache is bounded by entry count and by the approximate bytes its images and
+PNGs hold.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from PIL import Image
+
+
+def upload_key(data, model_identity, mask=None):
+    """Cache key for an upload (and optional mask upload) under a given model."""
+    mask_digest = None if mask is None else hashlib.sha256(mask).hexdigest()
+    return hashlib.sha256(data).hexdigest(), mask_digest, model_identity
+
+
+def checkpoint_identity(path, *extra):
+    """Identity of a checkpoint file that changes when the file is rewritten."""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, *extra)
+
+
+DEFERRED_DOWNLOADS_VERSION = (1, 50)  # st.download_button takes a callable for ``data`` from here on
+
+
+def supports_deferred_downloads(version):
+    """True if Streamlit ``version`` (e.g. ``st.__version__``) can encode downloads on click."""
+    parts = []
+    for part in version.split(".")[:2]:
+        digits = ""
+        for char in part:
+            if not char.isdigit():
+                break
+            digits += char
+        parts.append(int(digits or 0))
+    return tuple(parts) >= DEFERRED_DOWNLOADS_VERSION
+
+
+def display_size_for(size, max_size=350):
+    """Fit ``size`` (width, height) inside ``max_size`` keeping the aspect ratio."""
+    width, height = size
+    if width > height:
+        display_width = min(max_size, width)
+        return display_width, int(display_width * height / width)
+    display_height = min(max_size, height)
+    return int(display_height * width / height), display_height
+
+
+class Reconstruction:
+    """An upload and its reconstruction, with memoized download encodings."""
+    KINDS = ("full", "preview", "comparison")
+
+    def __init__(self, image, output, display_size, original_size=None):
+        # ``image`` may be a reduced-resolution decode of the upload (see image_io.decode)
+        self.original_size = original_size or image.size
+        self.display_size = display_size
+        self.display_image = image.resize(display_size, Image.Resampling.LANCZOS)
+        self.output = output
+        self.reconstructed = output.resize(display_size, Image.Resampling.LANCZOS)
+        self._png = {}
+        self._lock = threading.Lock()
+
+    def _render(self, kind):
+        if kind == "full":
+            return self.output.resize(self.original_size, Image.Resampling.LANCZOS)
+        if kind == "preview":
+            return self.reconstructed
+        comparison = Image.new("RGB", (self.display_size[0] * 2, self.display_size[1]))
+        comparison.paste(self.display_image, (0, 0))
+        comparison.paste(self.reconstructed, (self.display_size[0], 0))
+        return comparison
+
+    def png(self, kind):
+        """PNG bytes for ``kind`` (one of KINDS), encoded on first use."""
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown download {kind!r}, expected one of {self.KINDS}")
+        with self._lock:
+            if kind not in self._png:
+                buf = io.BytesIO()
+                self._render(kind).save(buf, format="PNG")
+                self._png[kind] = buf.getvalue()
+            return self._png[kind]
+
+    def has_png(self, kind):
+        return kind in self._png
+
+    def download_data(self, kind, deferred):
+        """``data`` for ``st.download_button``: a callable that encodes on click if ``deferred``, else the PNG."""
+        return partial(self.png, kind) if deferred else self.png(kind)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held: decoded images plus the PNGs encoded so far."""
+        images = (self.display_image, self.output, self.reconstructed)
+        return sum(im.width * im.height * len(im.getbands()) for im in images) + sum(map(len, self._png.values()))
+
+
+class ResultCache:
+    """Thread-safe LRU of at most ``max_entries`` results and about ``max_bytes`` (``Reconstruction.nbytes``).
+
+    The newest result is always kept, even if it alone exceeds ``max_bytes``.
+    Results grow as their PNGs are encoded, so the bound is checked on every
+    ``get`` and ``put``.
+    """
+    def __init__(self, max_entries=16, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._trim()
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            self._trim()
+        return result
+
+    def nbytes(self):
+        return sum(getattr(result, "nbytes", 0) for result in self._entries.values())
+
+    def _trim(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self.max_bytes is not None:
+            while len(self._entries) > 1 and self.nbytes() > self.max_bytes:
+                self._entries.popitem(last=False)
@@ -0,0 +1,112 @@
+"""Occlusion-aware region-of-interest (ROI) inference.
+
+Instead of resizing the whole upload to IMAGE_SIZE and reconstructing every
+pixel, ``reconstruct_roi``:
+
+1. takes the occlusion mask, either given explicitly or found by
+   ``detect_fill_mask`` (solid-colour fills, as in the dataset and
+   ``BatchOccluder``),
+2. crops the mask's bounding box plus ``context`` padding from the
+   full-resolution image,
+3. runs the model on that crop at the scale the full image would have had
+   at IMAGE_SIZE, so a small hole means a small model input,
+4. upsamples the result to the crop's full resolution and writes it back
+   only where the (slightly dilated) mask is set.
+
+Unoccluded pixels are returned untouched at the input resolution. Crop sizes
+vary per image, so this needs a backend that accepts any input size (eager
+PyTorch, not the fixed-size ONNX export).
+"""
+import math
+
+import torch
+import torch.nn.functional as F
+
+DEFAULT_FILLS = ((0.0, 0.0, 0.0), (1.0, 1.0, 1.0))
+
+
+def _dilate(mask, radius):
+    if radius <= 0:
+        return mask
+    k = 2 * radius + 1
+    return F.max_pool2d(mask.float()[None], k, stride=1, padding=radius)[0] > 0
+
+
+def _erode(mask, radius):
+    return ~_dilate(~mask, radius)
+
+
+def detect_fill_mask(image, fills=DEFAULT_FILLS, tol=4 / 255, min_radius=2):
+    """(1, H, W) bool mask of solid-fill occlusion in a (3, H, W) image in [0, 1].
+
+    A pixel matches if every channel is within ``tol`` of one of ``fills``.
+    A morphological opening with radius ``min_radius`` then drops thin or
+    isolated matches (e.g. dark image detail) while keeping filled regions.
+    """
+    mask = torch.zeros(1, *image.shape[-2:], dtype=torch.bool, device=image.device)
+    for fill in fills:
+        color = torch.tensor(fill, dtype=image.dtype, device=image.device).view(3, 1, 1)
+        mask |= ((image - color).abs() <= tol).all(dim=0, keepdim=True)
+    return _dilate(_erode(mask, min_radius), min_radius) & mask
+
+
+def roi_box(mask, context=0.25, min_context=8):
+    """Bounding box ``(top, left, bottom, right)`` of ``mask`` padded by ``context``.
+
+    Padding is ``context`` times the box size on each side (at least
+    ``min_context`` pixels), clipped to the image. Returns None for an empty mask.
+    """
+    H, W = mask.shape[-2:]
+    mask = mask.reshape(H, W)
+    rows, cols = mask.any(dim=1).nonzero(), mask.any(dim=0).nonzero()
+    if len(rows) == 0:
+        return None
+    top, bottom = rows[0].item(), rows[-1].item() + 1
+    left, right = cols[0].item(), cols[-1].item() + 1
+    pad_y = max(min_context, round(context * (bottom - top)))
+    pad_x = max(min_context, round(context * (right - left)))
+    return max(0, top - pad_y), max(0, left - pad_x), min(H, bottom + pad_y), min(W, right + pad_x)
+
+
+def model_input_size(crop_size, image_shape, image_size, multiple=8):
+    """Crop size in pixels at the scale the full image has when resized to ``image_size``.
+
+    Rounded up to ``multiple`` (the U-Net pools three times) and capped at
+    ``image_size``.
+    """
+    size = []
+    for crop, full in zip(crop_size, image_shape):
+        scaled = math.ceil(crop * image_size / full / multiple) * multiple
+        size.append(min(image_size, max(multiple, scaled)))
+    return tuple(size)
+
+
+def reconstruct_roi(model_fn, image, image_size, mask=None, context=0.25, dilate=1, multiple=8, **detect_kwargs):
+    """Reconstruct only the occluded region of a full-resolution (3, H, W) image.
+
+    ``model_fn`` maps a (B, 3, h, w) batch in [0, 1] to the same shape (e.g.
+    a ``TorchBackend``). ``mask`` is a (1, H, W) or (H, W) bool tensor; if
+    None it is detected with ``detect_fill_mask(image, **detect_kwargs)``.
+    Returns ``(output, info)`` where ``output`` is the (3, H, W) composite
+    and ``info`` holds the mask, the crop box and the model input size.
+    """
+    if mask is None:
+        mask = detect_fill_mask(image, **detect_kwargs)
+    mask = mask.reshape(1, *image.shape[-2:]).bool()
+    box = roi_box(mask, context)
+    info = {"mask": mask, "box": box, "input_size": None}
+    if box is None:
+        return image.clone(), info
+
+    top, left, bottom, right = box
+    crop = image[:, top:bottom, left:right]
+    info["input_size"] = model_input_size((bottom - top, right - left), image.shape[-2:], image_size, multiple)
+    x = F.interpolate(crop[None], size=info["input_size"], mode="bilinear", align_corners=False, antialias=True)
+    y = model_fn(x).float().clamp(0, 1).to(image.device)
+    y = F.interpolate(y, size=crop.shape[-2:], mode="bilinear", align_corners=False)[0]
+
+    # Dilate so the fill's anti-aliased border is replaced as well.
+    region = _dilate(mask, dilate)[:, top:bottom, left:right]
+    output = image.clone()
+    output[:, top:bottom, left:right] = torch.where(region, y, crop)
+    return output, info
@@ -0,0 +1,240 @@
+"""Local HTTP inference server with dynamic micro-batching.
+
+    python -m pixelrnn_core.server --model unet --port 8000 --max-batch 8 --max-wait-ms 10
+
+Loads one model and serves it from a stdlib ``ThreadingHTTPServer``:
+
+- ``POST /infer``: request body is an encoded image (PNG/JPEG/...); the
+  response is the reconstruction as a PNG at the model's resolution. Add
+  ``?restore_size=1`` to get it resized back to the upload's size.
+- ``GET /health``: model name, checkpoint and epoch.
+- ``GET /metrics``: queue depth, batch-size histogram and p50/p95/p99
+  latency (ms, enqueue to result) over the most recent requests.
+
+Handler threads decode and encode images; a single ``MicroBatcher`` thread
+owns the model and runs whatever is queued as one batch, waiting at most
+``max_wait_ms`` after the first request for up to ``max_batch`` requests.
+``InferenceClient`` is the matching client used by the Streamlit apps when
+``PIXELRNN_SERVER_URL`` is set.
+"""
+import argparse
+import io
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import Counter, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import torch
+from PIL import Image
+
+from pixelrnn_core.backends import BACKENDS, load_backend
+from pixelrnn_core.image_io import load_resized
+from pixelrnn_core.loading import MODEL_SPECS
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-image requests into model batches.
+
+    ``backend`` is a ``pixelrnn_core.backends`` backend. ``submit`` takes a
+    (3, S, S) float tensor and returns a Future resolving to the (3, S, S)
+    float output on the CPU.
+    """
+    def __init__(self, backend, max_batch=8, max_wait_ms=10.0, latency_window=1000):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._latencies = deque(maxlen=latency_window)
+        self._requests = 0
+        self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        future = Future()
+        self._queue.put((image, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            try:
+                output = self.backend(torch.stack([item[0] for item in batch])).clamp_(0, 1)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._requests += len(batch)
+                self._latencies.extend(done - item[2] for item in batch)
+            for (_, future, _), out in zip(batch, output):
+                future.set_result(out)
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            histogram = dict(sorted(self._batch_sizes.items()))
+            requests = self._requests
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(1000 * latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))], 2)
+
+        return {
+            "queue_depth": self._queue.qsize(),
+            "requests": requests,
+            "batch_size_histogram": {str(k): v for k, v in histogram.items()},
+            "latency_ms": {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99),
+                           "window": len(latencies)},
+        }
+
+
+def _decode(data, image_size):
+    img, size = load_resized(data, (image_size, image_size))
+    return torch.from_numpy(np.array(img)).permute(2, 0, 1).float().div_(255), size
+
+
+def _encode(output, size=None):
+    img = Image.fromarray(output.mul(255).round_().to(torch.uint8).permute(1, 2, 0).numpy())
+    if size is not None and size != img.size:
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class InferenceServer(ThreadingHTTPServer):
+    # The stdlib default backlog of 5 resets connections under bursts of
+    # concurrent uploads, which is exactly the load micro-batching is for.
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def make_handler(batcher, image_size, info, timeout=60.0):
+    """BaseHTTPRequestHandler subclass bound to ``batcher``."""
+    class InferenceHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, body, content_type="application/json"):
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/health":
+                self._send(200, {"status": "ok", **info})
+            elif path == "/metrics":
+                self._send(200, batcher.metrics())
+            else:
+                self._send(404, {"error": f"unknown path {path}"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/infer":
+                self._send(404, {"error": f"unknown path {url.path}"})
+                return
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                image, size = _decode(data, image_size)
+            except Exception as e:
+                self._send(400, {"error": f"could not decode image: {e}"})
+                return
+            try:
+                output = batcher.submit(image).result(timeout=timeout)
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+                return
+            restore = parse_qs(url.query).get("restore_size", ["0"])[0] == "1"
+            self._send(200, _encode(output, size if restore else None), "image/png")
+
+        def log_message(self, format, *args):
+            pass
+
+    return InferenceHandler
+
+
+class InferenceClient:
+    """Client for a running server; ``reconstruct`` returns a PIL image."""
+    def __init__(self, url, timeout=60.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _get(self, path):
+        with urllib.request.urlopen(self.url + path, timeout=self.timeout) as resp:
+            return json.load(resp)
+
+    def health(self):
+        return self._get("/health")
+
+    def metrics(self):
+        return self._get("/metrics")
+
+    def reconstruct(self, image_bytes, restore_size=False):
+        request = urllib.request.Request(self.url + "/infer" + ("?restore_size=1" if restore_size else ""),
+                                         data=image_bytes, headers={"Content-Type": "application/octet-stream"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+            return Image.open(io.BytesIO(resp.read())).convert("RGB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a reconstruction model over HTTP with micro-batching.")
+    parser.add_argument("--model", choices=sorted(MODEL_SPECS), default="unet")
+    parser.add_argument("--checkpoint", default=None, help="Defaults to the model's pixelrnn_best_model.pth.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--backend", choices=BACKENDS, default="torch")
+    parser.add_argument("--onnx", default=None, help="ONNX file for --backend onnx (default: checkpoint with .onnx).")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--bf16", action="store_true", help="Run the model under bfloat16 autocast (torch backend).")
+    args = parser.parse_args()
+
+    backend = load_backend(args.model, args.backend, args.checkpoint, args.onnx, args.device, args.bf16)
+    info = {"model": args.model, "backend": backend.name, "checkpoint": backend.metadata.get("checkpoint"),
+            "epoch": backend.metadata.get("epoch"), "image_size": MODEL_SPECS[args.model]["image_size"]}
+    if backend.name == "onnx":
+        info["onnx"] = os.path.abspath(backend.path)
+    batcher = MicroBatcher(backend, args.max_batch, args.max_wait_ms)
+    server = InferenceServer((args.host, args.port),
+                             make_handler(batcher, MODEL_SPECS[args.model]["image_size"], info))
+    print(f"Serving {args.model} ({backend.name}, {info['checkpoint']}) on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
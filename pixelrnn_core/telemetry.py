@@ -0,0 +1,197 @@
+"""Per-step and per-epoch training metrics written to an append-only file.
+
+    python -m pixelrnn_core.telemetry outputs/metrics.jsonl [--output figures/loss_curve.png]
+
+``TrainingTelemetry`` records, for every step, the total, pixel and
+perceptual loss, the gradient norm returned by ``clip_grad_norm_``, the
+learning rate, data-wait and compute time and images/sec. At the end of
+each epoch it records the same values averaged over the epoch. The losses
+and the gradient norm stay on the device: each step's values are stacked
+into one tensor and copied to the host every ``flush_every`` steps and at
+the end of the epoch, so the training loop no longer waits for the device
+after every step, as ``loss.item()`` did.
+
+Records are appended as JSON lines, or as CSV rows if ``path`` ends in
+``.csv``. Each record has ``kind`` set to ``step`` or ``epoch``. Running
+the module plots the loss and throughput curves of such a file.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+import torch
+
+FIELDS = ("kind", "epoch", "step", "time", "loss", "pixel_loss", "perceptual_loss", "grad_norm", "lr",
+          "data_s", "compute_s", "images_per_s")
+DEVICE_FIELDS = ("loss", "pixel_loss", "perceptual_loss", "grad_norm")  # accumulated on the device
+
+
+class MetricsWriter:
+    """Append-only JSONL or CSV writer; a CSV header is written only to a new file."""
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.csv = path.endswith(".csv")
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="" if self.csv else None)
+        if self.csv:
+            self.writer = csv.DictWriter(self.file, FIELDS, extrasaction="ignore")
+            if new:
+                self.writer.writeheader()
+
+    def write(self, record):
+        if self.csv:
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class TrainingTelemetry:
+    """Collects step metrics without a host sync per step and appends them to ``path``.
+
+    Call ``begin_epoch`` before an epoch's first step, ``step`` once per
+    optimizer step with the loss tensors, the gradient norm, the batch size
+    and the optimizer, and ``end_epoch`` after the last step. ``end_epoch``
+    returns the epoch record, whose plain float ``loss`` feeds the scheduler
+    and checkpoints. ``timer`` is the epoch's
+    ``PipelineTimer``: data-wait time comes from it, compute time is the
+    rest of the time since the previous step. With ``path=None`` nothing is
+    written but the epoch averages are still returned. In data-parallel
+    training every rank passes its own batch size, and ``world_size`` scales
+    images/sec to the whole job.
+    """
+    def __init__(self, path=None, flush_every=50, world_size=1):
+        self.writer = MetricsWriter(path) if path else None
+        self.flush_every = flush_every
+        self.world_size = world_size
+        self.epoch = 0
+        self.global_step = 0
+        self._start = time.time()
+        self.begin_epoch()
+
+    def begin_epoch(self):
+        """Start timing an epoch; call it right after resetting the epoch's ``PipelineTimer``."""
+        self._pending = []  # (device tensor of DEVICE_FIELDS, host-side record)
+        self._sums = None
+        self._steps = 0
+        self._images = 0
+        self._data_seen = 0.0
+        self._epoch_start = self._last = time.perf_counter()
+
+    def step(self, loss, pixel_loss, perceptual_loss, grad_norm, batch_size, optimizer, timer):
+        now = time.perf_counter()
+        duration, data = now - self._last, timer.data_time - self._data_seen
+        self._last, self._data_seen = now, timer.data_time
+        values = torch.stack([v.detach().float() for v in (loss, pixel_loss, perceptual_loss, grad_norm)])
+        self._sums = values if self._sums is None else self._sums + values
+        self._steps += 1
+        batch_size *= self.world_size
+        self._images += batch_size
+        self.global_step += 1
+        if self.writer is None:
+            return
+        self._pending.append((values, {
+            "kind": "step", "epoch": self.epoch + 1, "step": self.global_step, "time": time.time() - self._start,
+            "lr": optimizer.param_groups[0]["lr"], "data_s": data, "compute_s": duration - data,
+            "images_per_s": batch_size / duration if duration else 0.0,
+        }))
+        if len(self._pending) >= self.flush_every:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        values = torch.stack([v for v, _ in self._pending]).cpu().tolist()  # the only sync
+        for row, (_, record) in zip(values, self._pending):
+            record.update(zip(DEVICE_FIELDS, row))
+            self.writer.write(record)
+        self._pending = []
+
+    def end_epoch(self, optimizer, timer):
+        """Write the pending steps and the epoch record, and return the record."""
+        elapsed = time.perf_counter() - self._epoch_start
+        means = (self._sums / max(self._steps, 1)).tolist() if self._sums is not None else [float("nan")] * 4
+        self.epoch += 1
+        record = {
+            "kind": "epoch", "epoch": self.epoch, "step": self.global_step, "time": time.time() - self._start,
+            **dict(zip(DEVICE_FIELDS, means)), "lr": optimizer.param_groups[0]["lr"],
+            "data_s": timer.data_time, "compute_s": timer.compute_time,
+            "images_per_s": self._images / elapsed if elapsed else 0.0,
+        }
+        if self.writer is not None:
+            self._flush()
+            self.writer.write(record)
+            self.writer.flush()
+        return record
+
+    def close(self):
+        if self.writer is not None:
+            self._flush()
+            self.writer.close()
+
+
+def read_metrics(path):
+    """All records of a JSONL or CSV metrics file, with CSV numbers parsed back."""
+    with open(path, newline="") as f:
+        if not path.endswith(".csv"):
+            return [json.loads(line) for line in f if line.strip()]
+        return [{k: (v if k == "kind" else float(v)) for k, v in row.items() if v != ""} for row in csv.DictReader(f)]
+
+
+def plot_metrics(records, output, smooth=20):
+    """Loss (per step, smoothed, and per epoch) and images/sec curves, saved to ``output``."""
+    from matplotlib.figure import Figure
+
+    steps = [r for r in records if r["kind"] == "step"]
+    epochs = [r for r in records if r["kind"] == "epoch"]
+    fig = Figure(figsize=(12, 4))
+    ax_loss, ax_speed = fig.subplots(1, 2)
+
+    def smoothed(values):
+        return [sum(values[max(0, i - smooth + 1):i + 1]) / len(values[max(0, i - smooth + 1):i + 1])
+                for i in range(len(values))]
+
+    if steps:
+        x = [r["step"] for r in steps]
+        ax_loss.plot(x, [r["loss"] for r in steps], color="tab:blue", alpha=0.25, label="step loss")
+        ax_loss.plot(x, smoothed([r["loss"] for r in steps]), color="tab:blue", label=f"mean of {smooth} steps")
+        ax_speed.plot(x, smoothed([r["images_per_s"] for r in steps]), color="tab:green",
+                      label=f"images/sec (mean of {smooth} steps)")
+    if epochs:
+        x = [r["step"] for r in epochs]
+        ax_loss.plot(x, [r["loss"] for r in epochs], "o-", color="tab:red", label="epoch loss")
+        ax_loss.plot(x, [r["pixel_loss"] for r in epochs], "s--", color="tab:orange", label="epoch pixel loss")
+        ax_speed.plot(x, [r["images_per_s"] for r in epochs], "o-", color="tab:purple", label="epoch images/sec")
+    ax_loss.set(xlabel="step", ylabel="loss", title="Training loss")
+    ax_speed.set(xlabel="step", ylabel="images/sec", title="Throughput")
+    for ax in (ax_loss, ax_speed):
+        ax.grid(alpha=0.3)
+        ax.legend()
+    fig.tight_layout()
+    fig.savefig(output, dpi=120)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plot the loss and throughput curves of a training metrics file.")
+    parser.add_argument("metrics", help="metrics.jsonl or .csv written during training")
+    parser.add_argument("--output", default="loss_curve.png")
+    parser.add_argument("--smooth", type=int, default=20, help="Steps in the moving average.")
+    args = parser.parse_args()
+
+    records = read_metrics(args.metrics)
+    plot_metrics(records, args.output, args.smooth)
+    epochs = [r for r in records if r["kind"] == "epoch"]
+    print(f"Plotted {len(records) - len(epochs)} steps and {len(epochs)} epochs to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
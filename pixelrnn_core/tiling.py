@@ -0,0 +1,149 @@
+"""Tiled full-resolution inference with overlap blending.
+
+Both models are trained on small fixed-size images (128x128 U-Net, 64x64
+PixelRNN). Instead of resizing a large upload down to that size and the
+output back up, ``TiledInference`` runs the model on overlapping tiles of
+exactly that size at the image's own resolution and blends the tiles
+together with a weight that ramps linearly across each overlap, so seams
+do not show.
+
+Tiles from consecutive images share batches. Images are reconstructed one
+band of tile rows at a time: the float accumulator holds a single band
+(``tile_size`` rows) per image in flight, and rows are converted back to
+uint8 as soon as no later tile can touch them. Apart from the uint8 input
+and output arrays themselves, memory therefore depends on the batch size,
+the tile size and the image width, not on the image height or the number
+of images.
+"""
+from collections import deque
+
+import numpy as np
+import torch
+
+
+def tile_origins(length, tile, overlap):
+    """Start offsets of tiles of size ``tile`` covering ``length`` with at least ``overlap`` overlap.
+
+    The last tile is aligned with the end, so it may overlap its neighbour by more.
+    """
+    if length <= tile:
+        return [0]
+    stride = tile - overlap
+    origins = list(range(0, length - tile, stride))
+    return origins + [length - tile]
+
+
+def blend_weights(tile, overlap):
+    """(1, tile, tile) weights ramping linearly from the edges over ``overlap`` pixels."""
+    ramp = torch.ones(tile)
+    if overlap > 0:
+        rise = torch.arange(1, overlap + 1, dtype=torch.float32) / (overlap + 1)
+        ramp[:overlap] = rise
+        ramp[-overlap:] = torch.minimum(ramp[-overlap:], rise.flip(0))
+    return (ramp[:, None] * ramp[None, :])[None]
+
+
+class _Canvas:
+    """Blending state of one image: the band of rows currently being accumulated."""
+    def __init__(self, image, tile, overlap, weights):
+        self.height, self.width = image.shape[:2]
+        pad = ((0, max(0, tile - self.height)), (0, max(0, tile - self.width)), (0, 0))
+        self.image = np.pad(image, pad, mode="symmetric") if any(p[1] for p in pad) else image
+        self.tile = tile
+        self.weights = weights
+        self.ys = tile_origins(self.image.shape[0], tile, overlap)
+        self.xs = tile_origins(self.image.shape[1], tile, overlap)
+        self.output = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.band = 0
+        self.pending = len(self.xs)
+        self.acc = torch.zeros(3, tile, self.image.shape[1])
+        self.weight_sum = torch.zeros(1, tile, self.image.shape[1])
+
+    @property
+    def done(self):
+        return self.band == len(self.ys)
+
+    def tiles(self):
+        """``(y, x, (tile, tile, 3) uint8 view)`` in band order."""
+        T = self.tile
+        for y in self.ys:
+            for x in self.xs:
+                yield y, x, self.image[y:y + T, x:x + T]
+
+    def add(self, x, output):
+        """Accumulate the next tile of the current band (tiles arrive in ``tiles()`` order)."""
+        T = self.tile
+        self.acc[:, :, x:x + T] += output * self.weights
+        self.weight_sum[:, :, x:x + T] += self.weights
+        self.pending -= 1
+        if self.pending == 0:
+            self._flush()
+
+    def _flush(self):
+        # Rows above the next band's origin receive no further tiles.
+        y = self.ys[self.band]
+        next_y = self.ys[self.band + 1] if self.band + 1 < len(self.ys) else y + self.tile
+        rows = min(next_y, self.height) - y
+        if rows > 0:
+            blended = self.acc[:, :rows] / self.weight_sum[:, :rows]
+            pixels = blended.mul_(255).round_().to(torch.uint8).permute(1, 2, 0).numpy()
+            self.output[y:y + rows] = pixels[:, :self.width]
+
+        shift = next_y - y
+        self.acc = torch.cat([self.acc[:, shift:], torch.zeros_like(self.acc[:, :shift])], dim=1)
+        self.weight_sum = torch.cat([self.weight_sum[:, shift:], torch.zeros_like(self.weight_sum[:, :shift])],
+                                    dim=1)
+        self.band += 1
+        self.pending = len(self.xs)
+
+
+class TiledInference:
+    """Run ``model_fn`` over overlapping ``tile_size`` tiles of full-resolution images.
+
+    ``model_fn`` maps a float (B, 3, tile_size, tile_size) batch in [0, 1] to
+    a batch of the same shape on the CPU (any ``pixelrnn_core.backends``
+    backend). ``overlap`` defaults to a quarter of the tile.
+    """
+    def __init__(self, model_fn, tile_size, overlap=None, batch_size=16):
+        self.model_fn = model_fn
+        self.tile_size = tile_size
+        self.overlap = tile_size // 4 if overlap is None else overlap
+        if not 0 <= self.overlap < tile_size:
+            raise ValueError(f"overlap must be in [0, {tile_size}), got {self.overlap}")
+        self.batch_size = batch_size
+        self.weights = blend_weights(tile_size, self.overlap)
+
+    def __call__(self, image):
+        """Reconstruct a single (H, W, 3) uint8 image."""
+        return next(self.run([image]))
+
+    def run(self, images):
+        """Yield the (H, W, 3) uint8 reconstruction of each (H, W, 3) uint8 image, in order.
+
+        ``images`` may be a lazy iterable; it is consumed only as far as the
+        tiles of the current batch require.
+        """
+        canvases = deque()
+        batch = []
+
+        def process():
+            pixels = torch.from_numpy(np.stack([tile for _, _, tile in batch]))
+            x = pixels.permute(0, 3, 1, 2).float().div_(255)
+            output = self.model_fn(x).float().clamp_(0, 1)
+            for (canvas, x0, _), tile_output in zip(batch, output):
+                canvas.add(x0, tile_output)
+            batch.clear()
+
+        for image in images:
+            canvas = _Canvas(np.asarray(image), self.tile_size, self.overlap, self.weights)
+            canvases.append(canvas)
+            for _, x0, tile in canvas.tiles():
+                batch.append((canvas, x0, tile))
+                if len(batch) == self.batch_size:
+                    process()
+                    while canvases and canvases[0].done:
+                        yield canvases.popleft().output
+        if batch:
+            process()
+        while canvases:
+            yield canvases.popleft().output
@@ -0,0 +1,112 @@
+"""The U-Net reconstruction model trained by ``training1/pixelrnn_train.py``.
+
+Imports only torch, so apps and tools can build the model without pulling
+in the training script's dependencies.
+"""
+from contextlib import contextmanager, nullcontext
+
+import torch
+import torch.nn as nn
+from torch.utils.checkpoint import checkpoint
+
+
+@contextmanager
+def _frozen_batchnorm_stats(module):
+    """Stop BatchNorm running-stat updates while a checkpointed block is recomputed."""
+    norms = [m for m in module.modules() if isinstance(m, nn.modules.batchnorm._BatchNorm)]
+    momenta = [m.momentum for m in norms]
+    for m in norms:
+        m.momentum = 0.0
+    try:
+        yield
+    finally:
+        for m, momentum in zip(norms, momenta):
+            m.momentum = momentum
+
+
+class ConvBlock(nn.Module):
+    """Basic convolutional block with batch normalization and dropout.
+
+    With use_checkpoint=True the block's activations are not kept for backward
+    during training; they are recomputed from the block input instead.
+    """
+    def __init__(self, in_c, out_c, dropout=0.1, use_checkpoint=False):
+        super().__init__()
+        self.conv = nn.Sequential(
+            nn.Conv2d(in_c, out_c, 3, padding=1),
+            nn.BatchNorm2d(out_c),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(out_c, out_c, 3, padding=1),
+            nn.BatchNorm2d(out_c),
+            nn.ReLU(inplace=True),
+            nn.Dropout(dropout)
+        )
+        self.use_checkpoint = use_checkpoint
+
+    def forward(self, x):
+        if self.use_checkpoint and self.training and torch.is_grad_enabled():
+            # Recomputation replays the same dropout mask (RNG state is
+            # restored) and must not update BatchNorm running stats twice.
+            return checkpoint(self.conv, x, use_reentrant=False,
+                              context_fn=lambda: (nullcontext(), _frozen_batchnorm_stats(self.conv)))
+        return self.conv(x)
+
+
+class PixelRNNishUNet(nn.Module):
+    """Modified U-Net inspired by PixelRNN for image reconstruction.
+
+    checkpoint_levels selects which resolution levels recompute their
+    ConvBlock activations in backward instead of storing them: level 1 is
+    enc1/dec1 at full resolution, 2 and 3 are the next encoder/decoder
+    pairs and 4 is the center block.
+    """
+    LEVELS = {1: ("enc1", "dec1"), 2: ("enc2", "dec2"), 3: ("enc3", "dec3"), 4: ("center",)}
+
+    def __init__(self, checkpoint_levels=()):
+        super().__init__()
+        self.enc1 = ConvBlock(3, 64)
+        self.enc2 = ConvBlock(64, 128)
+        self.enc3 = ConvBlock(128, 256)
+        self.center = ConvBlock(256, 512)
+
+        self.dec3 = ConvBlock(512 + 256, 256)
+        self.dec2 = ConvBlock(256 + 128, 128)
+        self.dec1 = ConvBlock(128 + 64, 64)
+        self.final = nn.Conv2d(64, 3, 1)
+
+        self.pool = nn.MaxPool2d(2)
+        self.up = nn.Upsample(scale_factor=2, mode='bilinear', align_corners=True)
+
+        self._init_weights()
+        self.set_checkpointing(checkpoint_levels)
+
+    def set_checkpointing(self, levels):
+        """Enable activation checkpointing for the given levels and disable it elsewhere."""
+        unknown = set(levels) - set(self.LEVELS)
+        if unknown:
+            raise ValueError(f"Unknown checkpoint levels {sorted(unknown)}, expected a subset of {sorted(self.LEVELS)}")
+        for level, names in self.LEVELS.items():
+            for name in names:
+                getattr(self, name).use_checkpoint = level in levels
+
+    def _init_weights(self):
+        for m in self.modules():
+            # Meta tensors (a model about to be loaded from a weights file) have no values to set.
+            if isinstance(m, nn.Conv2d) and not m.weight.is_meta:
+                nn.init.kaiming_normal_(m.weight)
+                if m.bias is not None:
+                    nn.init.zeros_(m.bias)
+
+    def forward(self, x):
+        e1 = self.enc1(x)
+        e2 = self.enc2(self.pool(e1))
+        e3 = self.enc3(self.pool(e2))
+        c = self.center(self.pool(e3))
+
+        d3 = self.dec3(torch.cat([self.up(c), e3], dim=1))
+        d2 = self.dec2(torch.cat([self.up(d3), e2], dim=1))
+        d1 = self.dec1(torch.cat([self.up(d2), e1], dim=1))
+        # Sigmoid in fp32 so bf16 autocast does not quantise the reconstruction.
+        out = torch.sigmoid(self.final(d1).float())
+        return out
+
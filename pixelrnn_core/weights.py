@@ -0,0 +1,196 @@
+"""Weights-only, memory-mapped checkpoint format for fast cold starts.
+
+    python -m pixelrnn_core.weights --model unet [--checkpoint PATH] [--output PATH] [--fp16]
+
+Training checkpoints are pickles: ``torch.load(weights_only=False)`` runs
+arbitrary code from the file and deserializes every tensor into fresh
+memory. ``export_checkpoint`` writes the model state instead as a
+``.safetensors`` file (the layout of the safetensors library, which can read
+it): an 8-byte header length, a JSON header with each tensor's dtype, shape
+and byte range plus a string ``__metadata__`` map (model, class, image_size,
+epoch, val_loss, dtype), then the raw little-endian tensor data.
+
+``load_weights`` maps the file copy-on-write and returns tensors that are
+views into the mapping, so nothing is parsed or copied until a page is
+touched. ``load_model`` assigns fp32 tensors straight into the model;
+``--fp16`` files are half the size on disk but are cast back to fp32 on load.
+Quantized (int8) checkpoints hold packed parameters and cannot be exported.
+"""
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+
+import torch
+
+WEIGHTS_SUFFIX = ".safetensors"
+HEADER_ALIGNMENT = 8  # tensors follow the header at an 8-byte boundary, so every offset stays aligned
+
+DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+DTYPE_NAMES = {dtype: name for name, dtype in DTYPES.items()}
+
+
+def weights_path_for(checkpoint_path):
+    """``pixelrnn_best_model.pth`` -> ``pixelrnn_best_model.safetensors``."""
+    return os.path.splitext(checkpoint_path)[0] + WEIGHTS_SUFFIX
+
+
+def preferred_checkpoint(checkpoint_path):
+    """The exported weights next to ``checkpoint_path`` if they are at least as new, else the path itself."""
+    weights = weights_path_for(checkpoint_path)
+    if checkpoint_path.endswith(WEIGHTS_SUFFIX) or not os.path.exists(weights):
+        return checkpoint_path
+    if os.path.exists(checkpoint_path) and os.path.getmtime(weights) < os.path.getmtime(checkpoint_path):
+        return checkpoint_path
+    return weights
+
+
+def save_weights(state_dict, path, metadata=None, fp16=False):
+    """Write ``state_dict`` to ``path``; ``fp16`` stores floating-point tensors as float16."""
+    tensors = {}
+    for name, tensor in state_dict.items():
+        if not isinstance(tensor, torch.Tensor) or tensor.is_quantized:
+            raise ValueError(f"{name} is not a plain tensor; quantized checkpoints cannot be exported")
+        tensor = tensor.detach().cpu()
+        if fp16 and tensor.is_floating_point():
+            tensor = tensor.half()
+        tensors[name] = tensor.contiguous()
+
+    # Largest elements first: with no gaps between tensors, every offset is
+    # then a multiple of its own element size.
+    names = sorted(tensors, key=lambda n: (-tensors[n].element_size(), n))
+    header, offset = {}, 0
+    for name in names:
+        tensor = tensors[name]
+        nbytes = tensor.numel() * tensor.element_size()
+        header[name] = {"dtype": DTYPE_NAMES[tensor.dtype], "shape": list(tensor.shape),
+                        "data_offsets": [offset, offset + nbytes]}
+        offset += nbytes
+    if metadata:
+        header["__metadata__"] = {k: str(v) for k, v in metadata.items() if v is not None}
+    header = json.dumps(header, separators=(",", ":")).encode()
+    header += b" " * (-(8 + len(header)) % HEADER_ALIGNMENT)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name in names:
+            f.write(tensors[name].reshape(-1).view(torch.uint8).numpy())
+    os.replace(tmp_path, path)
+
+
+def _read_header(f):
+    """``(header, data_start)``; ValueError if the file is too short or the header is not valid JSON."""
+    size = os.fstat(f.fileno()).st_size
+    prefix = f.read(8)
+    if len(prefix) < 8:
+        raise ValueError(f"{f.name}: too short for a .safetensors file")
+    (length,) = struct.unpack("<Q", prefix)
+    if length > size - 8:
+        raise ValueError(f"{f.name}: header length {length} exceeds the file size {size}")
+    try:
+        header = json.loads(f.read(length))
+    except ValueError as e:
+        raise ValueError(f"{f.name}: corrupt header ({e})") from None
+    if not isinstance(header, dict):
+        raise ValueError(f"{f.name}: corrupt header (not a JSON object)")
+    return header, 8 + length
+
+
+def _parse(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def read_metadata(path):
+    """The header's metadata with numbers parsed back (epoch, val_loss, image_size)."""
+    with open(path, "rb") as f:
+        header, _ = _read_header(f)
+    return {k: _parse(v) for k, v in header.get("__metadata__", {}).items()}
+
+
+def load_weights(path):
+    """``(state_dict, metadata)`` with every tensor a view into a copy-on-write mapping of ``path``.
+
+    The mapping stays alive as long as any of the tensors does. Writing to a
+    tensor only copies the touched pages; the file is never modified. Raises
+    ValueError for a truncated file or a corrupt header.
+    """
+    with open(path, "rb") as f:
+        header, data_start = _read_header(f)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    metadata = {k: _parse(v) for k, v in header.pop("__metadata__", {}).items()}
+    state = {}
+    for name, info in header.items():
+        try:
+            dtype, shape = DTYPES[info["dtype"]], info["shape"]
+            begin, end = info["data_offsets"]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{path}: corrupt header entry for {name!r}") from None
+        element_size = torch.empty((), dtype=dtype).element_size()
+        nbytes = math.prod(shape) * element_size
+        if end - begin != nbytes or begin < 0 or data_start + end > len(mapped):
+            raise ValueError(f"{path}: {name!r} bytes [{begin}, {end}) do not fit its shape or the file "
+                             "(truncated?)")
+        if begin == end:
+            state[name] = torch.empty(shape, dtype=dtype)
+            continue
+        state[name] = torch.frombuffer(mapped, dtype=dtype, count=nbytes // element_size,
+                                       offset=data_start + begin).view(shape)
+    return state, metadata
+
+
+def export_checkpoint(kind, checkpoint, path, fp16=False, source=None):
+    """Write a training checkpoint dict's ``model_state`` for model ``kind`` with its metadata."""
+    from pixelrnn_core.loading import MODEL_SPECS
+
+    if checkpoint.get("quantization"):
+        raise ValueError("int8 checkpoints hold packed parameters and cannot be exported")
+    spec = MODEL_SPECS[kind]
+    save_weights(checkpoint["model_state"], path, fp16=fp16, metadata={
+        "format": "pixelrnn", "model": kind, "class": spec["class"], "image_size": spec["image_size"],
+        "epoch": checkpoint.get("epoch"), "val_loss": checkpoint.get("val_loss"),
+        "dtype": "float16" if fp16 else "float32", "source": source,
+    })
+
+
+def main():
+    from pixelrnn_core.loading import MODEL_SPECS, ROOT, load_model
+
+    parser = argparse.ArgumentParser(description="Export a pixelrnn_best_model.pth checkpoint to .safetensors.")
+    parser.add_argument("--model", choices=sorted(MODEL_SPECS), default="unet")
+    parser.add_argument("--checkpoint", default=None, help="Defaults to the model's pixelrnn_best_model.pth.")
+    parser.add_argument("--output", default=None, help="Defaults to the checkpoint path with a .safetensors suffix.")
+    parser.add_argument("--fp16", action="store_true", help="Store floating-point weights as float16.")
+    parser.add_argument("--no-check", action="store_true", help="Skip comparing outputs against the checkpoint.")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or os.path.join(ROOT, MODEL_SPECS[args.model]["checkpoint"])
+    output = args.output or weights_path_for(checkpoint)
+    ckpt = torch.load(checkpoint, map_location="cpu", weights_only=False)
+    export_checkpoint(args.model, ckpt, output, args.fp16, source=os.path.abspath(checkpoint))
+    print(f"Exported {args.model} (epoch {ckpt.get('epoch', '?')}) to {output} "
+          f"({os.path.getsize(checkpoint) / 2**20:.1f} MB -> {os.path.getsize(output) / 2**20:.1f} MB)")
+
+    if not args.no_check:
+        size = MODEL_SPECS[args.model]["image_size"]
+        x = torch.rand(2, 3, size, size, generator=torch.Generator().manual_seed(0))
+        with torch.no_grad():
+            diff = (load_model(args.model, checkpoint)[0](x) - load_model(args.model, output)[0](x)).abs().max().item()
+        tolerance = 1e-2 if args.fp16 else 0.0
+        print(f"Exported vs checkpoint: max |diff| = {diff:.2e}")
+        if diff > tolerance:
+            raise SystemExit(f"Parity check failed: {diff:.2e} > {tolerance:.0e}")
+
+
+if __name__ == "__main__":
+    main()
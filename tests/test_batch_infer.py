@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from pixelrnn_core.batch_infer import output_names, run, run_tiled
+
+
+def _write_image(path, size=(20, 16)):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (size[1], size[0], 3), np.uint8)).save(path)
+
+
+def test_output_names_keep_paths_below_common_directory(tmp_path):
+    paths = [str(tmp_path / "a" / "x.jpg"), str(tmp_path / "b" / "x.jpg"), str(tmp_path / "a" / "y.png")]
+    assert output_names(paths) == [os.path.join("a", "x.png"), os.path.join("b", "x.png"), os.path.join("a", "y.png")]
+    assert output_names([str(tmp_path / "a" / "x.jpg")]) == ["x.png"]
+
+
+def test_output_names_reject_collisions(tmp_path):
+    with pytest.raises(ValueError, match="x.png"):
+        output_names([str(tmp_path / "x.jpg"), str(tmp_path / "x.png")])
+
+
+@pytest.mark.parametrize("tiled", [False, True])
+def test_undecodable_files_are_skipped(tmp_path, tiled):
+    good = [str(tmp_path / "in" / "a" / "x.png"), str(tmp_path / "in" / "b" / "x.png")]
+    for path in good:
+        _write_image(path)
+    bad = str(tmp_path / "in" / "a" / "broken.png")
+    with open(bad, "wb") as f:
+        f.write(b"not an image")
+    out = tmp_path / "out"
+
+    def backend(x):
+        return x
+
+    paths = [good[0], bad, good[1]]
+    if tiled:
+        count, _, _ = run_tiled(backend, paths, str(out), tile_size=8, batch_size=4, workers=1)
+    else:
+        count, _, _ = run(backend, paths, str(out), image_size=8, batch_size=2, workers=1)
+    assert count == 2
+    assert sorted(os.path.relpath(os.path.join(d, f), out) for d, _, files in os.walk(out) for f in files) == \
+        [os.path.join("a", "x.png"), os.path.join("b", "x.png")]
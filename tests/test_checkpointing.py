@@ -0,0 +1,48 @@
+import torch
+import torch.nn as nn
+from torch.utils.data import TensorDataset
+
+from pixelrnn_core.checkpointing import restore_training_state, rng_state
+from pixelrnn_core.pipeline import build_loader
+
+EPOCHS = 4
+
+
+def _train(dataset, start, stop, num_workers, persistent_workers, resume=None, save=None):
+    """Train a small dropout model for epochs ``start..stop`` the way the training scripts do."""
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Linear(8, 16), nn.Dropout(0.5), nn.Linear(16, 1))
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-2)
+    loader = build_loader(dataset, 4, shuffle=True, num_workers=num_workers,
+                          persistent_workers=persistent_workers, seed=0)
+    if resume is not None:
+        restore_training_state(resume, model, optimizer, loader=loader)
+    for epoch in range(start, stop):
+        for x, y in loader:
+            optimizer.zero_grad()
+            nn.functional.mse_loss(model(x), y).backward()
+            optimizer.step()
+    if save is not None:
+        torch.save({"model_state": model.state_dict(), "optimizer_state": optimizer.state_dict(),
+                    "rng_state": [rng_state(loader)], "epoch": stop}, save)
+    return model.state_dict()
+
+
+def _check_resume_matches(tmp_path, num_workers, persistent_workers):
+    generator = torch.Generator().manual_seed(1)
+    dataset = TensorDataset(torch.randn(32, 8, generator=generator), torch.randn(32, 1, generator=generator))
+    path = str(tmp_path / "pixelrnn_epoch_2.pth")
+
+    uninterrupted = _train(dataset, 0, EPOCHS, num_workers, persistent_workers)
+    _train(dataset, 0, 2, num_workers, persistent_workers, save=path)
+    resumed = _train(dataset, 2, EPOCHS, num_workers, persistent_workers, resume=path)
+    for name, value in uninterrupted.items():
+        assert torch.equal(value, resumed[name]), name
+
+
+def test_resume_matches_uninterrupted_run(tmp_path):
+    _check_resume_matches(tmp_path, num_workers=0, persistent_workers=False)
+
+
+def test_resume_matches_uninterrupted_run_with_persistent_workers(tmp_path):
+    _check_resume_matches(tmp_path, num_workers=2, persistent_workers=True)
@@ -0,0 +1,66 @@
+import os
+import socket
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+import torch.nn as nn
+
+from pixelrnn_core.feature_cache import FeatureCache
+
+NUM_ITEMS = 8
+
+
+def _targets(indices):
+    return torch.tensor(indices, dtype=torch.float32).view(-1, 1, 1, 1).expand(-1, 2, 1, 1).contiguous()
+
+
+def _extractor(targets):
+    return targets * 2
+
+
+def _rank(rank, world_size, port, cache_dir):
+    os.environ.update(MASTER_ADDR="127.0.0.1", MASTER_PORT=str(port))
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    cache = FeatureCache(NUM_ITEMS, 4, cache_dir=cache_dir)
+    dist.barrier()  # both ranks reach their first write, which creates the file, together
+    indices = list(range(rank, NUM_ITEMS, world_size))
+    cache.lookup(indices, _targets(indices), _extractor)
+    dist.barrier()
+    dist.destroy_process_group()
+
+
+def test_ranks_share_disk_cache(tmp_path):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    mp.spawn(_rank, args=(2, port, str(tmp_path)), nprocs=2)
+
+    cache = FeatureCache(NUM_ITEMS, 4, cache_dir=str(tmp_path))
+    indices = list(range(NUM_ITEMS))
+    features = cache.lookup(indices, _targets(indices), _extractor)
+    assert cache.misses == 0
+    torch.testing.assert_close(features, _extractor(_targets(indices)))
+
+
+def test_changing_the_extractor_invalidates_disk_cache(tmp_path):
+    torch.manual_seed(0)
+    extractors = {"a": nn.Conv2d(2, 3, 1), "b": nn.Conv2d(2, 3, 1),
+                  "deeper": nn.Sequential(nn.Conv2d(2, 3, 1), nn.ReLU())}
+    extractors["deeper"][0].load_state_dict(extractors["a"].state_dict())
+    indices = list(range(NUM_ITEMS))
+    targets = _targets(indices)
+    with torch.no_grad():
+        FeatureCache(NUM_ITEMS, 4, cache_dir=str(tmp_path)).lookup(indices, targets, extractors["a"])
+
+        for name in ("b", "deeper"):  # other weights, other layers
+            cache = FeatureCache(NUM_ITEMS, 4, cache_dir=str(tmp_path))
+            features = cache.lookup(indices, targets, extractors[name])
+            assert cache.hits == 0
+            torch.testing.assert_close(features, extractors[name](targets))
+
+        cache = FeatureCache(NUM_ITEMS, 4, cache_dir=str(tmp_path))
+        features = cache.lookup(indices, targets, extractors["a"])
+        assert cache.misses == 0
+        torch.testing.assert_close(features, extractors["a"](targets), rtol=1e-3, atol=1e-3)  # stored as fp16
@@ -0,0 +1,34 @@
+import pytest
+import torch
+
+from pixelrnn_core.pixelrnn import FusedLSTMCell, PixelRNN, RowLSTM
+
+
+def test_fused_cell_gradcheck():
+    torch.manual_seed(0)
+    gates = torch.randn(2, 4 * 3, 1, 5, dtype=torch.double, requires_grad=True)
+    c_prev = torch.randn(2, 3, 1, 5, dtype=torch.double, requires_grad=True)
+    assert torch.autograd.gradcheck(FusedLSTMCell.apply, (gates, c_prev))
+
+
+def _forward_backward(model, x):
+    inp = x.clone().requires_grad_(True)
+    output = model(inp)
+    output.square().mean().backward()
+    return output.detach(), [inp.grad] + [p.grad for p in model.parameters()]
+
+
+@pytest.mark.parametrize("engine", RowLSTM.ENGINES)
+def test_fused_cell_matches_reference(engine):
+    torch.manual_seed(0)
+    reference = PixelRNN(hidden_dim=16, engine="reference")
+    fused = PixelRNN(hidden_dim=16, engine=engine, fused_cell=True)
+    fused.load_state_dict(reference.state_dict())
+    x = torch.rand(2, 3, 12, 12)
+
+    ref_out, ref_grads = _forward_backward(reference, x)
+    out, grads = _forward_backward(fused, x)
+    torch.testing.assert_close(out, ref_out, rtol=1e-5, atol=1e-6)
+    assert len(grads) == len(ref_grads)
+    for grad, ref_grad in zip(grads, ref_grads):
+        torch.testing.assert_close(grad, ref_grad, rtol=1e-4, atol=1e-6)
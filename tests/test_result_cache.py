@@ -0,0 +1,36 @@
+from PIL import Image
+
+from pixelrnn_core.result_cache import Reconstruction, ResultCache, supports_deferred_downloads
+
+
+def _reconstruction(size=(400, 300)):
+    return Reconstruction(Image.new("RGB", size), Image.new("RGB", (128, 128), "red"), (200, 150))
+
+
+def test_download_encodes_only_when_called():
+    result = _reconstruction()
+    data = result.download_data("full", deferred=True)
+    assert not result.has_png("full")
+    png = data()
+    assert result.has_png("full") and png.startswith(b"\x89PNG")
+    assert result.download_data("full", deferred=False) is png
+
+
+def test_cache_bounded_by_bytes():
+    results = [_reconstruction() for _ in range(3)]
+    cache = ResultCache(max_entries=16, max_bytes=2 * results[0].nbytes + 1)
+    for i, result in enumerate(results):
+        cache.put(i, result)
+    assert cache.get(0) is None and cache.get(2) is results[2]
+
+    results[2].png("full")  # encoded PNGs count too
+    results[2].png("comparison")
+    cache.get(2)
+    assert len(cache) == 1
+
+
+def test_supports_deferred_downloads():
+    assert supports_deferred_downloads("1.50.0")
+    assert supports_deferred_downloads("2.0.1")
+    assert not supports_deferred_downloads("1.28.0")
+    assert not supports_deferred_downloads("1.49.1rc1")
@@ -0,0 +1,97 @@
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from pixelrnn_core.server import InferenceClient, InferenceServer, MicroBatcher, make_handler
+
+SIZE = 8
+
+
+class StubBackend:
+    """Identity model that records the size of every batch it runs."""
+    def __init__(self, fail=False):
+        self.batch_sizes = []
+        self.fail = fail
+
+    def __call__(self, x):
+        self.batch_sizes.append(len(x))
+        if self.fail:
+            raise RuntimeError("backend failed")
+        return x.clone()
+
+
+def _images(n):
+    return [torch.full((3, SIZE, SIZE), i / n) for i in range(n)]
+
+
+def test_concurrent_requests_are_coalesced():
+    backend = StubBackend()
+    batcher = MicroBatcher(backend, max_batch=4, max_wait_ms=2000)
+    images = _images(4)
+    futures = [batcher.submit(image) for image in images]
+    for future, image in zip(futures, images):
+        torch.testing.assert_close(future.result(timeout=10), image)
+    assert backend.batch_sizes == [4]  # the full batch ran without waiting out the deadline
+    assert batcher.metrics()["batch_size_histogram"] == {"4": 1}
+
+
+def test_partial_batch_runs_after_max_wait():
+    backend = StubBackend()
+    batcher = MicroBatcher(backend, max_batch=8, max_wait_ms=100)
+    start = time.perf_counter()
+    batcher.submit(_images(1)[0]).result(timeout=10)
+    elapsed = time.perf_counter() - start
+    assert backend.batch_sizes == [1]
+    assert 0.09 <= elapsed < 5
+
+
+def test_backend_error_fails_every_request_in_the_batch():
+    batcher = MicroBatcher(StubBackend(fail=True), max_batch=3, max_wait_ms=2000)
+    futures = [batcher.submit(image) for image in _images(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="backend failed"):
+            future.result(timeout=10)
+
+
+@pytest.fixture
+def server():
+    backend = StubBackend()
+    batcher = MicroBatcher(backend, max_batch=4, max_wait_ms=5)
+    httpd = InferenceServer(("127.0.0.1", 0), make_handler(batcher, SIZE, {"model": "stub"}))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", backend
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_http_infer_and_metrics(server):
+    url, backend = server
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (20, 30, 3), np.uint8)).save(buf, format="PNG")
+    client = InferenceClient(url, timeout=10)
+
+    assert client.reconstruct(buf.getvalue()).size == (SIZE, SIZE)
+    assert client.reconstruct(buf.getvalue(), restore_size=True).size == (30, 20)
+    metrics = client.metrics()
+    assert metrics["requests"] == 2
+    assert sum(metrics["batch_size_histogram"].values()) == len(backend.batch_sizes)
+    assert metrics["latency_ms"]["window"] == 2
+
+
+def test_http_undecodable_body_is_400(server):
+    url, backend = server
+    request = urllib.request.Request(url + "/infer", data=b"not an image")
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request, timeout=10)
+    assert error.value.code == 400
+    assert "could not decode image" in json.load(error.value)["error"]
+    assert backend.batch_sizes == []
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from pixelrnn_core.tiling import TiledInference, tile_origins
+
+
+@pytest.mark.parametrize("overlap", [0, None])  # None = a quarter of the tile
+def test_identity_model_reproduces_images_across_seams(overlap):
+    rng = np.random.default_rng(0)
+    # Sizes that are not multiples of the stride, plus one smaller than a tile
+    images = [rng.integers(0, 256, shape, np.uint8) for shape in ((70, 53, 3), (37, 91, 3), (10, 7, 3))]
+    tiler = TiledInference(lambda x: x.clone(), tile_size=16, overlap=overlap, batch_size=5)
+
+    outputs = list(tiler.run(iter(images)))
+    assert len(outputs) == len(images)
+    for image, output in zip(images, outputs):
+        assert output.shape == image.shape
+        np.testing.assert_array_equal(output, image)
+
+
+def test_tile_origins_cover_length():
+    assert tile_origins(16, 16, 4) == [0]
+    origins = tile_origins(53, 16, 4)
+    assert origins[0] == 0 and origins[-1] == 53 - 16
+    assert all(b - a <= 16 - 4 for a, b in zip(origins, origins[1:]))
@@ -0,0 +1,60 @@
+import struct
+
+import pytest
+import torch
+
+from pixelrnn_core.loading import MODEL_SPECS, build_model, load_model
+from pixelrnn_core.weights import export_checkpoint, load_weights, read_metadata
+
+
+def _checkpoint(tmp_path, kind):
+    torch.manual_seed(0)
+    checkpoint = {"model_state": build_model(kind).state_dict(), "epoch": 7, "val_loss": 0.0123}
+    path = str(tmp_path / f"{kind}.pth")
+    torch.save(checkpoint, path)
+    return checkpoint, path
+
+
+@pytest.mark.parametrize("kind", sorted(MODEL_SPECS))
+@pytest.mark.parametrize("fp16", [False, True])
+def test_round_trip_matches_pth_model(tmp_path, kind, fp16):
+    checkpoint, pth = _checkpoint(tmp_path, kind)
+    weights = str(tmp_path / f"{kind}.safetensors")
+    export_checkpoint(kind, checkpoint, weights, fp16=fp16)
+
+    metadata = read_metadata(weights)
+    assert metadata["model"] == kind and metadata["epoch"] == 7 and metadata["val_loss"] == 0.0123
+    assert metadata["image_size"] == MODEL_SPECS[kind]["image_size"]
+    assert metadata["dtype"] == ("float16" if fp16 else "float32")
+
+    reference, _ = load_model(kind, pth)
+    model, ckpt = load_model(kind, weights)
+    assert ckpt["epoch"] == 7
+    assert all(p.dtype == torch.float32 for p in model.parameters())  # fp16 files are cast back on load
+    size = MODEL_SPECS[kind]["image_size"]
+    x = torch.rand(2, 3, size, size, generator=torch.Generator().manual_seed(0))
+    with torch.no_grad():
+        if fp16:
+            torch.testing.assert_close(model(x), reference(x), rtol=0, atol=1e-2)
+        else:
+            assert torch.equal(model(x), reference(x))
+
+
+CORRUPTIONS = {
+    "too short": lambda data, n: data[:4],
+    "truncated header": lambda data, n: data[:8 + n // 2],
+    "truncated data": lambda data, n: data[:-100],
+    "header length past the end": lambda data, n: struct.pack("<Q", len(data)) + data[8:],
+    "header not JSON": lambda data, n: data[:8] + b"x" * n + data[8 + n:],
+}
+
+
+@pytest.mark.parametrize("corruption", CORRUPTIONS)
+def test_truncated_or_corrupt_files_are_rejected(tmp_path, corruption):
+    weights = tmp_path / "unet.safetensors"
+    export_checkpoint("unet", _checkpoint(tmp_path, "unet")[0], str(weights))
+    data = weights.read_bytes()
+    (header_length,) = struct.unpack("<Q", data[:8])
+    weights.write_bytes(CORRUPTIONS[corruption](data, header_length))
+    with pytest.raises(ValueError):
+        load_weights(str(weights))
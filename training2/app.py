@@ -1,14 +1,39 @@
 import streamlit as st
 import torch
-from torchvision import transforms
 from PIL import Image
-import io
+import numpy as np
 import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pixelrnn_core.backends import OnnxBackend, TorchBackend
+from pixelrnn_core.image_io import decode, to_pil, to_tensor
+from pixelrnn_core.loading import load_model as load_checkpoint
+from pixelrnn_core.roi import reconstruct_roi
+from pixelrnn_core.tiling import TiledInference
+from pixelrnn_core.result_cache import (Reconstruction, ResultCache, checkpoint_identity, display_size_for,
+                                        supports_deferred_downloads, upload_key)
+from pixelrnn_core.server import InferenceClient
+from pixelrnn_core.weights import preferred_checkpoint
 
 MODEL_FILENAME = "pixelrnn_best_model.pth"
 MODEL_DIR = "outputs_new"
+# Checkpoint to serve; point at an *_int8.pth from pixelrnn_core.quantization to run int8.
+# By default an up-to-date .safetensors export (pixelrnn_core.weights) is mmap-loaded instead of the .pth.
+CKPT_PATH = os.environ.get("PIXELRNN_CHECKPOINT") or preferred_checkpoint(os.path.join(MODEL_DIR, MODEL_FILENAME))
 IMAGE_MIME_TYPE = "image/png"
 IMAGE_SIZE = 64
+USE_BF16 = os.environ.get("PIXELRNN_BF16", "0") == "1"  # bfloat16 autocast for inference
+SERVER_URL = os.environ.get("PIXELRNN_SERVER_URL")  # e.g. http://127.0.0.1:8000 for pixelrnn_core.server
+BACKEND = os.environ.get("PIXELRNN_BACKEND", "torch")  # "torch" or "onnx" (see pixelrnn_core.onnx_export)
+ONNX_PATH = os.environ.get("PIXELRNN_ONNX_PATH", os.path.splitext(CKPT_PATH)[0] + ".onnx")
+ROI_MODE = os.environ.get("PIXELRNN_ROI", "0") == "1"  # reconstruct only the occluded region (torch backend)
+TILED = os.environ.get("PIXELRNN_TILED", "0") == "1"  # full-resolution output from overlapping 64x64 tiles
+TILE_BATCH_SIZE = 16  # tiles per forward pass in tiled mode
+RESULT_CACHE_SIZE = 16  # Uploads whose reconstructions are kept across reruns
+RESULT_CACHE_MB = 512  # Approximate memory cap for those reconstructions (images and encoded PNGs)
+# Newer Streamlit encodes a download on click; older versions get the full-resolution PNG behind a button
+DEFERRED_DOWNLOADS = supports_deferred_downloads(st.__version__)
 
 st.set_page_config(
     page_title="PixelRNN Image Completion",
@@ -63,17 +88,22 @@ div[data-testid="stFileUploader"] {
 @st.cache_resource
 def load_model():
     try:
-        from pixelrnn import PixelRNN
+        if BACKEND == "onnx":
+            if os.path.exists(ONNX_PATH):
+                st.success(f"✅ ONNX model loaded successfully ({ONNX_PATH})")
+                return OnnxBackend(ONNX_PATH), torch.device("cpu"), True
+            st.error(f"❌ ONNX model not found: {ONNX_PATH}")
+            return None, torch.device("cpu"), False
+
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        model = PixelRNN().to(device)
 
-        ckpt_path = os.path.join(MODEL_DIR, MODEL_FILENAME)
+        ckpt_path = CKPT_PATH
         if os.path.exists(ckpt_path):
-            ckpt = torch.load(ckpt_path, map_location=device)
-            model.load_state_dict(ckpt["model_state"])
-            model.eval()
+            model, ckpt = load_checkpoint("pixelrnn", ckpt_path, device)
+            if ckpt.get("quantization"):  # int8 checkpoints run on the CPU
+                device = torch.device("cpu")
             st.success(f"✅ Model loaded successfully ({ckpt_path})")
-            return model, device, True
+            return TorchBackend(model, device, USE_BF16), device, True
         else:
             st.error(f"❌ Model file not found: {ckpt_path}")
             return None, device, False
@@ -82,13 +112,44 @@ def load_model():
         return None, torch.device("cpu"), False
 
 
-model, device, model_loaded = load_model()
+@st.cache_resource
+def load_client():
+    client = InferenceClient(SERVER_URL)
+    try:
+        info = client.health()
+        st.success(f"✅ Using inference server {SERVER_URL} ({info['checkpoint']})")
+        return client, info
+    except Exception as e:
+        st.error(f"❌ Inference server not reachable at {SERVER_URL}: {e}")
+        return None, None
+
+
+@st.cache_resource
+def load_result_cache():
+    return ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_MB << 20)
+
+
+client = None
+model_identity = None
+if SERVER_URL:
+    client, server_info = load_client()
+    model, device, model_loaded = None, torch.device("cpu"), server_info is not None
+    if model_loaded:
+        model_identity = (SERVER_URL, server_info["checkpoint"], server_info["epoch"])
+else:
+    model, device, model_loaded = load_model()
+    if model_loaded:
+        model_identity = (checkpoint_identity(ONNX_PATH, BACKEND) if BACKEND == "onnx"
+                          else checkpoint_identity(CKPT_PATH, USE_BF16))
+results = load_result_cache()
+# ROI crops vary in size, so they need in-process PyTorch rather than the fixed-size ONNX graph or the server
+use_roi = ROI_MODE and client is None and BACKEND == "torch"
+tiler = TiledInference(model, IMAGE_SIZE, batch_size=TILE_BATCH_SIZE) if TILED and model is not None else None
+
+
+def transform(image):
+    return to_tensor(image.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR))
 
-transform = transforms.Compose([
-    transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
-    transforms.ToTensor(),
-])
-to_pil = transforms.ToPILImage()
 
 st.markdown("<h1>🧠 PixelRNN Image Completion</h1>", unsafe_allow_html=True)
 st.markdown("""
@@ -100,71 +161,78 @@ Compare the input and output side by side.
 st.markdown("<hr>", unsafe_allow_html=True)
 
 uploaded_file = st.file_uploader("Upload Occluded Image", type=["jpg", "jpeg", "png"])
+mask_file = None
+if use_roi:
+    mask_file = st.file_uploader("Occlusion Mask (optional, white = missing; detected automatically if omitted)",
+                                 type=["png", "jpg", "jpeg"])
 
-if uploaded_file and model_loaded and model is not None:
-    image = Image.open(uploaded_file).convert("RGB")
-    original_size = image.size
+if uploaded_file and model_loaded and (model is not None or client is not None):
+    # Reruns (e.g. download clicks) on the same upload reuse the cached result
+    upload = uploaded_file.getvalue()
+    mask_upload = mask_file.getvalue() if mask_file else None
+    key = upload_key(upload, (model_identity, use_roi, tiler is not None), mask_upload)
+    result = results.get(key)
 
-    max_size = 350
-    if original_size[0] > original_size[1]:
-        display_width = min(max_size, original_size[0])
-        display_height = int(display_width * original_size[1] / original_size[0])
-    else:
-        display_height = min(max_size, original_size[1])
-        display_width = int(display_height * original_size[0] / original_size[1])
-    display_size = (display_width, display_height)
-    display_image = image.resize(display_size, Image.Resampling.LANCZOS)
+    if result is None:
+        # Only ROI and tiled mode need full resolution; otherwise decode just enough for the preview
+        image, original_size = decode(upload, min_size=None if use_roi or tiler is not None else (350, 350))
+        display_size = display_size_for(original_size, max_size=350)
+        input_tensor = transform(image).unsqueeze(0).to(device)
 
-    input_tensor = transform(image).unsqueeze(0).to(device)
+        with st.spinner("✨ Reconstructing image... Please wait."):
+            if client is not None:
+                output = to_tensor(client.reconstruct(upload)).unsqueeze(0)
+            elif use_roi:
+                mask = None
+                if mask_upload:
+                    mask_image = decode(mask_upload, min_size=image.size)[0].convert("L")
+                    mask_image = mask_image.resize(image.size, Image.NEAREST)
+                    mask = (to_tensor(mask_image) > 0.5).to(device)
+                full = to_tensor(image).to(device)
+                output, _ = reconstruct_roi(model, full, IMAGE_SIZE, mask=mask)
+            elif tiler is not None:
+                output = to_tensor(tiler(np.asarray(image)))
+            else:
+                output = torch.clamp(model(input_tensor), 0, 1)
 
-    with st.spinner("✨ Reconstructing image... Please wait."):
-        with torch.no_grad():
-            output = model(input_tensor)
-            output = torch.clamp(output, 0, 1)
+        result = results.put(key, Reconstruction(image, to_pil(output.squeeze().float().cpu()), display_size,
+                                                 original_size))
 
-    reconstructed = to_pil(output.squeeze().cpu()).resize(display_size, Image.Resampling.LANCZOS)
+    original_size = result.original_size
 
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("<h3 style='text-align:center;'>Original Input</h3>", unsafe_allow_html=True)
-        st.image(display_image)
+        st.image(result.display_image)
     with col2:
         st.markdown("<h3 style='text-align:center;'>AI Reconstructed</h3>", unsafe_allow_html=True)
-        st.image(reconstructed)
+        st.image(result.reconstructed)
 
     st.markdown("### 📥 Download Results")
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        full_res = to_pil(output.squeeze().cpu()).resize(original_size, Image.Resampling.LANCZOS)
-        buf_full = io.BytesIO()
-        full_res.save(buf_full, format="PNG")
-        st.download_button(
-            label="Full Resolution",
-            data=buf_full.getvalue(),
-            file_name=f"pixelrnn_full_{original_size[0]}x{original_size[1]}.png",
-            mime=IMAGE_MIME_TYPE,
-        )
+        # Full resolution: the costly encode (large for ROI/tiled uploads) runs only when asked for
+        if DEFERRED_DOWNLOADS or result.has_png("full") or st.button("Prepare Full Resolution"):
+            st.download_button(
+                label="Full Resolution",
+                data=result.download_data("full", DEFERRED_DOWNLOADS),
+                file_name=f"pixelrnn_full_{original_size[0]}x{original_size[1]}.png",
+                mime=IMAGE_MIME_TYPE,
+            )
 
     with col2:
-        buf_disp = io.BytesIO()
-        reconstructed.save(buf_disp, format="PNG")
         st.download_button(
             label="Preview Size",
-            data=buf_disp.getvalue(),
+            data=result.download_data("preview", DEFERRED_DOWNLOADS),
             file_name="pixelrnn_preview.png",
             mime=IMAGE_MIME_TYPE,
         )
 
     with col3:
-        comparison = Image.new("RGB", (display_size[0] * 2, display_size[1]))
-        comparison.paste(display_image, (0, 0))
-        comparison.paste(reconstructed, (display_size[0], 0))
-        buf_comp = io.BytesIO()
-        comparison.save(buf_comp, format="PNG")
         st.download_button(
             label="Before & After",
-            data=buf_comp.getvalue(),
+            data=result.download_data("comparison", DEFERRED_DOWNLOADS),
             file_name="pixelrnn_comparison.png",
             mime=IMAGE_MIME_TYPE,
         )
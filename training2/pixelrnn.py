@@ -1,141 +1,70 @@
+import argparse
 import os
+import sys
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
-from torchvision import transforms, models
-from PIL import Image
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader
+from torch.utils.data.distributed import DistributedSampler
 from tqdm import tqdm
 import matplotlib.pyplot as plt
 import numpy as np
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pixelrnn_core.checkpointing import CheckpointWriter, latest_checkpoint, restore_training_state, rng_state
+from pixelrnn_core.data_cache import (CachedOccludedDataset, CachedOriginalDataset, CachedTestDataset,
+                                     source_fingerprint)
+from pixelrnn_core.datasets import OccludedDataset, OriginalDataset, TestDataset
+from pixelrnn_core.distributed import (any_rank, cleanup, gather_objects, init_distributed, is_main_process,
+                                      main_process_first, mean_across_ranks)
+from pixelrnn_core.feature_cache import FeatureCache, IndexedDataset
+from pixelrnn_core.losses import PerceptualLoss
+from pixelrnn_core.occlusion import BatchOccluder
+from pixelrnn_core.pipeline import BackgroundPrefetcher, PipelineTimer, build_loader
+from pixelrnn_core.profiling import profiler_from_env
+from pixelrnn_core.telemetry import TrainingTelemetry
+from pixelrnn_core.pixelrnn import PixelRNN
+from pixelrnn_core.weights import export_checkpoint, weights_path_for
+
 DATA_ROOT = "dataset_A2"
 SAVE_DIR = "outputs_new"
 MODEL_FILENAME = "pixelrnn_best_model.pth"
-os.makedirs(SAVE_DIR, exist_ok=True)
 
 IMAGE_SIZE = 64
 BATCH_SIZE = 4
 EPOCHS = 20
 LR = 1e-4
 EARLY_STOPPING_PATIENCE = 5
+USE_DATA_CACHE = True  # Decode/resize images once into a memory-mapped shard
+CACHE_DIR = os.path.join(SAVE_DIR, "cache")
+FUSED_CELL = False  # Use FusedLSTMCell (hand-written backward) inside RowLSTM
+ROW_CHECKPOINT_CHUNK = None  # Rows per recomputed chunk in RowLSTM backward (None = store all rows)
+SYNTHETIC_OCCLUSION = False  # Load originals only and occlude each batch on the fly
+OCCLUSION_SEED = 0
+OCCLUSION_FILL = 0.0  # Pixel value written into occluded regions
+CACHE_TARGET_FEATURES = True  # Reuse the VGG features of the (fixed) targets across epochs
+FEATURE_CACHE_MAX_MB = 1024  # In-memory budget for cached fp16 target features
+FEATURE_CACHE_DIR = None  # e.g. CACHE_DIR to keep target features on disk across runs
+VGG_WEIGHTS_PATH = None  # Local VGG16 weights file for machines without network access
+USE_BF16 = False  # bfloat16 autocast for the forward pass and losses (cell state, output and loss stay fp32)
+EXPORT_WEIGHTS = True  # Also write the best model as .safetensors, which the apps mmap instead of unpickling
+METRICS_PATH = os.path.join(SAVE_DIR, "metrics.jsonl")  # Per-step/epoch telemetry, .jsonl or .csv (None = off)
+METRICS_FLUSH_EVERY = 50  # Steps between copies of the step losses to the host
+KEEP_LAST_CHECKPOINTS = 2  # Epoch checkpoints (full training state, for --resume) kept besides the best model
+DIST_BACKEND = "gloo"  # Process group backend when launched with torchrun (see pixelrnn_core/distributed.py)
+DIST_THREADS = None  # torch threads per process under torchrun (None = cores / local processes)
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print("Using device:", device)
-
-class OccludedDataset(Dataset):
-    """Dataset for training: includes occluded and original image pairs."""
-    def __init__(self, root, split="train"):
-        self.masked_dir = os.path.join(root, split, "occluded_images")
-        self.original_dir = os.path.join(root, split, "original_images")
-        self.masked_imgs = sorted(os.listdir(self.masked_dir))
-        self.original_imgs = sorted(os.listdir(self.original_dir))
-        self.transform = transforms.Compose([
-            transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
-            transforms.ToTensor()
-        ])
-
-    def __len__(self):
-        return len(self.masked_imgs)
-
-    def __getitem__(self, idx):
-        masked = Image.open(os.path.join(self.masked_dir, self.masked_imgs[idx])).convert("RGB")
-        original = Image.open(os.path.join(self.original_dir, self.original_imgs[idx])).convert("RGB")
-        return self.transform(masked), self.transform(original)
-
-
-class TestDataset(Dataset):
-    """Dataset for testing on occluded images only."""
-    def __init__(self, root):
-        self.root = root
-        self.imgs = sorted(os.listdir(root))
-        self.transform = transforms.Compose([
-            transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
-            transforms.ToTensor()
-        ])
-
-    def __len__(self):
-        return len(self.imgs)
-
-    def __getitem__(self, idx):
-        img = Image.open(os.path.join(self.root, self.imgs[idx])).convert("RGB")
-        return self.transform(img), self.imgs[idx]
-
-# PixelRNN Core: RowLSTM block
-class RowLSTM(nn.Module):
-    """RowLSTM used in PixelRNN to model pixel dependencies across rows.
-
-    This implementation processes the feature map row-by-row (height dimension).
-    Shapes:
-      x: (B, C, H, W)
-      returns: (B, hidden_dim, H, W)
-    """
-    def __init__(self, input_dim, hidden_dim):
-        super().__init__()
-        self.input_conv = nn.Conv2d(input_dim, 4 * hidden_dim, kernel_size=1)
-        self.hidden_conv = nn.Conv2d(hidden_dim, 4 * hidden_dim, kernel_size=1)
-        self.hidden_dim = hidden_dim
-
-    def forward(self, x):
-        B, C, H, W = x.shape
-
-        h_t = torch.zeros(B, self.hidden_dim, 1, W, device=x.device)
-        c_t = torch.zeros(B, self.hidden_dim, 1, W, device=x.device)
-
-        outputs = []
-        for i in range(H):
-            x_t = x[:, :, i, :].unsqueeze(2)
-
-            gates = self.input_conv(x_t) + self.hidden_conv(h_t)
-
-            i_gate, f_gate, o_gate, g_gate = gates.chunk(4, dim=1)
-
-            i_gate = torch.sigmoid(i_gate)
-            f_gate = torch.sigmoid(f_gate)
-            o_gate = torch.sigmoid(o_gate)
-            g_gate = torch.tanh(g_gate)
-
-            c_t = f_gate * c_t + i_gate * g_gate
-            h_t = o_gate * torch.tanh(c_t)
-
-            outputs.append(h_t)
-
-        return torch.cat(outputs, dim=2)
-
-# PixelRNN Model
-class PixelRNN(nn.Module):
-    def __init__(self, input_channels=3, hidden_dim=128, n_layers=2):
-        super().__init__()
-
-        self.input_conv = nn.Conv2d(input_channels, hidden_dim, kernel_size=7, padding=3)
-
-        self.rnn_layers = nn.ModuleList([RowLSTM(hidden_dim, hidden_dim) for _ in range(n_layers)])
-
-        self.output_conv = nn.Sequential(
-            nn.ReLU(inplace=True),
-            nn.Conv2d(hidden_dim, 3, kernel_size=1),
-            nn.Sigmoid()
-        )
-
-    def forward(self, x):
-        out = self.input_conv(x)
-        for rnn in self.rnn_layers:
-            out = rnn(out)
-        out = self.output_conv(out)
-        return out
-
-
-# Perceptual Loss
-class PerceptualLoss(nn.Module):
-    def __init__(self):
-        super().__init__()
-        vgg = models.vgg16(weights=models.VGG16_Weights.DEFAULT).features[:9].eval()
-        for param in vgg.parameters():
-            param.requires_grad = False
-        self.vgg = vgg
-        self.mse = nn.MSELoss()
 
-    def forward(self, pred, target):
-        return self.mse(self.vgg(pred), self.vgg(target))
+# Input pipeline
+NUM_WORKERS = min(4, os.cpu_count() or 1)  # DataLoader worker processes (0 = load on the training thread)
+WORKER_THREADS = 1  # torch threads per worker, so workers don't compete with the model for cores
+PERSISTENT_WORKERS = True
+PIN_MEMORY = device.type == "cuda"
+PREFETCH_FACTOR = 2  # Batches queued per worker
+PREFETCH_BATCHES = 2  # Batches staged on the device by a background thread (0 = off)
+LOADER_SEED = 0  # Shuffle order and worker seeds; saved in checkpoints so --resume replays the same batches
+
 
 # Visualization
 def visualize_results(model, loader, num_images=5):
@@ -143,7 +72,8 @@ def visualize_results(model, loader, num_images=5):
     with torch.no_grad():
         for i, (masked, names) in enumerate(loader):
             masked = masked.to(device)
-            output = model(masked).clamp(0, 1)
+            with torch.autocast(device.type, dtype=torch.bfloat16, enabled=USE_BF16):
+                output = model(masked).clamp(0, 1)
 
             plt.figure(figsize=(10, 4))
             plt.subplot(1, 2, 1)
@@ -162,72 +92,182 @@ def visualize_results(model, loader, num_images=5):
                 break
 
 # Training Loop
-def train_pixelrnn():
-    train_dataset = OccludedDataset(DATA_ROOT, "train")
-    val_dataset = TestDataset(os.path.join(DATA_ROOT, "occluded_test"))
-    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True, num_workers=0)
+def export_best_weights(ckpt, path):
+    """Write the best model next to its .pth as .safetensors (runs on the checkpoint thread)."""
+    export_checkpoint("pixelrnn", ckpt, weights_path_for(path))
+
+
+def train_pixelrnn(resume=None):
+    rank, world_size = init_distributed(DIST_BACKEND, DIST_THREADS)
+    os.makedirs(SAVE_DIR, exist_ok=True)
+    main = rank == 0  # only rank 0 logs and writes checkpoints
+    # Rank 0 builds the data cache (and downloads VGG) before the other ranks read it
+    with main_process_first():
+        occluder = None
+        if SYNTHETIC_OCCLUSION:
+            occluder = BatchOccluder(fill=OCCLUSION_FILL, seed=OCCLUSION_SEED + rank)
+            train_dataset = (CachedOriginalDataset(DATA_ROOT, "train", IMAGE_SIZE, CACHE_DIR) if USE_DATA_CACHE
+                             else OriginalDataset(DATA_ROOT, "train", IMAGE_SIZE))
+        elif USE_DATA_CACHE:
+            train_dataset = CachedOccludedDataset(DATA_ROOT, "train", IMAGE_SIZE, CACHE_DIR)
+        else:
+            train_dataset = OccludedDataset(DATA_ROOT, "train", IMAGE_SIZE)
+        if USE_DATA_CACHE:
+            val_dataset = CachedTestDataset(os.path.join(DATA_ROOT, "occluded_test"), IMAGE_SIZE, CACHE_DIR)
+        else:
+            val_dataset = TestDataset(os.path.join(DATA_ROOT, "occluded_test"), IMAGE_SIZE)
+        feature_cache = None
+        if CACHE_TARGET_FEATURES:
+            fingerprint = ""
+            if FEATURE_CACHE_DIR is not None:
+                fingerprint = source_fingerprint([os.path.join(DATA_ROOT, "train", "original_images")], IMAGE_SIZE)
+            feature_cache = FeatureCache(len(train_dataset), IMAGE_SIZE, FEATURE_CACHE_MAX_MB << 20,
+                                         FEATURE_CACHE_DIR, fingerprint)
+            train_dataset = IndexedDataset(train_dataset)
+    # Each rank trains on its own 1/world_size of every epoch, BATCH_SIZE images per step
+    sampler = DistributedSampler(train_dataset, world_size, rank) if world_size > 1 else None
+    train_loader = build_loader(train_dataset, BATCH_SIZE, shuffle=sampler is None, sampler=sampler,
+                                num_workers=NUM_WORKERS, pin_memory=PIN_MEMORY,
+                                persistent_workers=PERSISTENT_WORKERS, prefetch_factor=PREFETCH_FACTOR,
+                                worker_threads=WORKER_THREADS, seed=LOADER_SEED)
     val_loader = DataLoader(val_dataset, batch_size=1, shuffle=False, num_workers=0)
 
-    model = PixelRNN().to(device)
+    model = PixelRNN(fused_cell=FUSED_CELL, checkpoint_chunk=ROW_CHECKPOINT_CHUNK).to(device)
     mse_loss = nn.MSELoss()
-    perceptual_loss = PerceptualLoss().to(device)
+    with main_process_first():
+        perceptual_loss = PerceptualLoss(VGG_WEIGHTS_PATH, feature_cache).to(device)
     optimizer = optim.Adam(model.parameters(), lr=LR, weight_decay=1e-5)
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, "min", patience=2, factor=0.5, verbose=True)
 
     best_loss = float("inf")
     patience_counter = 0
-
-    for epoch in range(EPOCHS):
+    start_epoch = 0
+    global_step = 0
+    if resume is not None:
+        ckpt = restore_training_state(resume, model, optimizer, scheduler, occluder, rank, train_loader)
+        start_epoch, best_loss, patience_counter = ckpt["epoch"], ckpt["best_loss"], ckpt["patience_counter"]
+        global_step = ckpt["global_step"]
+        if main:
+            print(f"Resumed from {resume} at epoch {start_epoch} (best loss {best_loss:.4f})")
+    # Gradients are averaged across ranks in backward; DDP broadcasts rank 0's weights at construction
+    train_model = DistributedDataParallel(model) if world_size > 1 else model
+    timer = PipelineTimer(device)
+    telemetry = TrainingTelemetry(METRICS_PATH if main else None, METRICS_FLUSH_EVERY, world_size)
+    telemetry.epoch, telemetry.global_step = start_epoch, global_step
+    checkpoints = None
+    if main:
+        checkpoints = CheckpointWriter(SAVE_DIR, MODEL_FILENAME, KEEP_LAST_CHECKPOINTS,
+                                       on_best=export_best_weights if EXPORT_WEIGHTS else None)
+    # Per-module timings with PIXELRNN_PROFILE=1 (see pixelrnn_core/profiling.py)
+    profiler = profiler_from_env(device, pixelrnn=model, perceptual=perceptual_loss) if main else None
+
+    for epoch in range(start_epoch, EPOCHS):
         model.train()
-        running_loss = 0.0
-        for masked, original in tqdm(train_loader, desc=f"Epoch {epoch+1}/{EPOCHS}"):
-            masked, original = masked.to(device), original.to(device)
+        if sampler is not None:
+            sampler.set_epoch(epoch)
+        timer.reset()
+        telemetry.begin_epoch()
+        batches = BackgroundPrefetcher(train_loader, device, PREFETCH_BATCHES) if PREFETCH_BATCHES else train_loader
+        for batch in tqdm(timer.wrap(batches), total=len(train_loader), desc=f"Epoch {epoch+1}/{EPOCHS}",
+                          disable=not main):
+            indices = None
+            if feature_cache is not None:
+                indices, batch = batch
+            if occluder is not None:
+                original = batch.to(device, non_blocking=True)
+                masked, _ = occluder(original)
+            else:
+                masked = batch[0].to(device, non_blocking=True)
+                original = batch[1].to(device, non_blocking=True)
             optimizer.zero_grad()
 
-            output = model(masked)
-            loss_pixel = mse_loss(output, original)
-            loss_perc = perceptual_loss(output, original)
-            loss = loss_pixel + 0.1 * loss_perc
+            with torch.autocast(device.type, dtype=torch.bfloat16, enabled=USE_BF16):
+                output = train_model(masked)
+                loss_pixel = mse_loss(output, original)
+                loss_perc = perceptual_loss(output, original, indices)
+                loss = loss_pixel + 0.1 * loss_perc
 
             loss.backward()
-            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            grad_norm = torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
             optimizer.step()
-            running_loss += loss.item()
+            telemetry.step(loss, loss_pixel, loss_perc, grad_norm, original.size(0), optimizer, timer)
+            if profiler is not None:
+                profiler.step()
 
-        avg_loss = running_loss / len(train_loader)
+        stats = telemetry.end_epoch(optimizer, timer)
+        avg_loss = mean_across_ranks(stats["loss"])  # the same on every rank, so are the decisions below
         scheduler.step(avg_loss)
-        print(f"Epoch [{epoch+1}/{EPOCHS}] - Loss: {avg_loss:.4f}")
-
-        ckpt = {"model_state": model.state_dict(), "val_loss": avg_loss, "epoch": epoch + 1}
-        torch.save(ckpt, os.path.join(SAVE_DIR, f"pixelrnn_epoch_{epoch+1}.pth"))
-
-        if avg_loss < best_loss:
+        if main:
+            print(f"Epoch [{epoch+1}/{EPOCHS}] - Loss: {avg_loss:.4f} | grad norm {stats['grad_norm']:.3f} | "
+                  f"{stats['images_per_s']:.1f} img/s | {timer.summary()}"
+                  + (f" | {feature_cache.summary()}" if feature_cache is not None else ""))
+        if profiler is not None:
+            print(profiler.summary())
+            profiler.reset()
+
+        is_best = avg_loss < best_loss
+        if is_best:
             best_loss = avg_loss
             patience_counter = 0
-            torch.save(ckpt, os.path.join(SAVE_DIR, MODEL_FILENAME))
-            print("✅ Saved new best model.")
         else:
             patience_counter += 1
+        occluder_state = gather_objects(occluder.state_dict()) if occluder is not None else None
+        rng_states = gather_objects(rng_state(train_loader))
+        if main:
+            # Written on a background thread; only the copy to the CPU happens here
+            checkpoints.save({
+                "model_state": model.state_dict(), "val_loss": avg_loss, "epoch": epoch + 1,
+                "optimizer_state": optimizer.state_dict(), "scheduler_state": scheduler.state_dict(),
+                "best_loss": best_loss, "patience_counter": patience_counter, "global_step": telemetry.global_step,
+                "occluder_state": occluder_state, "rng_state": rng_states, "world_size": world_size,
+            }, epoch + 1, is_best)
+        if main and is_best:
+            print("✅ Saved new best model.")
 
-        if patience_counter >= EARLY_STOPPING_PATIENCE:
-            print("⛔ Early stopping.")
+        if any_rank(patience_counter >= EARLY_STOPPING_PATIENCE):
+            if main:
+                print("⛔ Early stopping.")
             break
 
+    if checkpoints is not None:
+        checkpoints.close()
+    telemetry.close()
+    if profiler is not None:
+        profiler.close()
     return model, val_loader
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the PixelRNN, or evaluate the best model if one exists.")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="CHECKPOINT",
+                        help="Continue training from a pixelrnn_epoch_*.pth (default: the newest in SAVE_DIR).")
+    args = parser.parse_args()
+    # Under torchrun (WORLD_SIZE > 1) this always trains, data-parallel across the launched processes
+    distributed = int(os.environ.get("WORLD_SIZE", 1)) > 1
+    if int(os.environ.get("RANK", 0)) == 0:
+        print("Using device:", device)
     ckpt_path = os.path.join(SAVE_DIR, MODEL_FILENAME)
 
-    if os.path.exists(ckpt_path):
+    if args.resume:
+        resume = latest_checkpoint(SAVE_DIR) if args.resume == "latest" else args.resume
+        if resume is None:
+            raise SystemExit(f"No pixelrnn_epoch_*.pth checkpoint in {SAVE_DIR} to resume from.")
+        model, val_loader = train_pixelrnn(resume)
+        if is_main_process():
+            visualize_results(model, val_loader)
+        cleanup()
+    elif os.path.exists(ckpt_path) and not distributed:
         print("Found checkpoint. Loading model...")
         model = PixelRNN().to(device)
         ckpt = torch.load(ckpt_path, map_location=device)
         model.load_state_dict(ckpt["model_state"])
         print(f"Loaded model from epoch {ckpt['epoch']} | val_loss={ckpt['val_loss']:.4f}")
-        val_loader = DataLoader(TestDataset(os.path.join(DATA_ROOT, "occluded_test")),
+        val_loader = DataLoader(TestDataset(os.path.join(DATA_ROOT, "occluded_test"), IMAGE_SIZE),
                                 batch_size=1, shuffle=False, num_workers=0)
         visualize_results(model, val_loader)
     else:
-        print("No checkpoint found. Starting new training session...")
+        if not distributed:
+            print("No checkpoint found. Starting new training session...")
         model, val_loader = train_pixelrnn()
-        visualize_results(model, val_loader)
+        if is_main_process():
+            visualize_results(model, val_loader)
+        cleanup()